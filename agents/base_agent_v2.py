@@ -4,7 +4,6 @@ from abc import ABC, abstractmethod
 import pickle
 import numpy as np
 import os
-import torch
 
 
 class AbstractAgent(ABC):
@@ -21,10 +20,12 @@ class AbstractAgent(ABC):
         self.nickname = nickname
         self.model = {}
         self.modelType = "None"
-        if device == "cuda" and torch.cuda.is_available():
-            self.device = torch.device("cuda")
-        else:
-            self.device = torch.device("cpu")
+        if device == "cuda":
+            # torch is only imported by agents that can run on a GPU
+            import torch
+
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
         print(f"Agent {self.nickname} is running on device: {self.device}")
 
     @abstractmethod
@@ -53,6 +54,31 @@ class AbstractAgent(ABC):
         Update the Q-Table based on the previous state, action, reward, and new state.
         """
 
+    def learn_batch(self, batch):
+        """
+        Learn from many transitions at once, i.e. all moves of the last few episodes.
+
+        Agents can override this with vectorized updates, by default every transition is passed to learn.
+
+        :param batch: dict of arrays with a row per transition, see training.transitions.TransitionBuffer.
+        """
+        for prev_state, action, reward, next_state, game_over, winner in zip(
+            batch["prev_states"].tolist(),
+            batch["actions"].tolist(),
+            batch["rewards"].tolist(),
+            batch["next_states"].tolist(),
+            batch["game_overs"].tolist(),
+            batch["winners"].tolist(),
+        ):
+            self.learn(
+                prev_state=prev_state,
+                action=action,
+                reward=reward,
+                next_state=next_state,
+                game_over=game_over,
+                winner=None if winner == -2 else winner,
+            )
+
     def convert_state(self, board_state, dice_value):
         """
         Converts the current board state and dice value into a string for Q-Table.
@@ -76,6 +102,9 @@ class AbstractAgent(ABC):
 
         with open(path, "rb") as file:
             self.model = pickle.load(file)
+        if getattr(self.model, "quantized", False):
+            # int8 networks from agents.inference only run on the CPU
+            self.device = "cpu"
 
     def save_model(self, path):
         """Save the Model to a file."""
@@ -0,0 +1,83 @@
+"""
+Column-structured states and network for the neural agents.
+
+A column holds three dice that are kept sorted, so with dice up to 6 it's
+one of only 84 multisets (C(6 + 3, 3), empty cells included). Instead of 19
+raw cell values ColumnEncoder turns a board into the ids of the own and the
+opponent's columns plus the dice.
+
+ColumnNetwork embeds every column id with the same weights, whatever
+column it's in, and scores each column (the move into it) from that column,
+the same column of the opponent, a summary of all columns and the dice.
+It has about 7.7k parameters, the MLPs on raw cells about 19.5k.
+Swapping two columns of the board swaps their scores, so the network doesn't
+have to learn that column order doesn't matter.
+"""
+
+from itertools import combinations_with_replacement, permutations
+from math import comb
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+class ColumnEncoder:
+    """Converts a board into [own column ids, opponent column ids, dice value]."""
+
+    def __init__(self, max_dice_value=6):
+        values = range(max_dice_value + 1)
+        self.column_count = comb(max_dice_value + 3, 3)
+        # every order of the dice of a column maps to the same id
+        self.ids = np.zeros((max_dice_value + 1,) * 3, dtype=np.int64)
+        for column_id, column in enumerate(combinations_with_replacement(values, 3)):
+            for order in permutations(column):
+                self.ids[order] = column_id
+
+    def encode(self, board_state, dice_value):
+        ids = self.ids
+        own, opponent = board_state
+        return [
+            int(ids[own[0][0], own[0][1], own[0][2]]),
+            int(ids[own[1][0], own[1][1], own[1][2]]),
+            int(ids[own[2][0], own[2][1], own[2][2]]),
+            int(ids[opponent[0][0], opponent[0][1], opponent[0][2]]),
+            int(ids[opponent[1][0], opponent[1][1], opponent[1][2]]),
+            int(ids[opponent[2][0], opponent[2][1], opponent[2][2]]),
+            dice_value,
+        ]
+
+
+class ColumnNetwork(nn.Module):
+    """
+    Scores the three columns of an encoded state, permutation equivariant over the columns.
+
+    Takes (batch, 7) states from ColumnEncoder, as floats like the other
+    networks, and returns (batch, 3) Q-values, or move probabilities with
+    softmax. The first layer of a column is folded into the embeddings: the
+    own and the opponent's column ids have their own rows in one table and
+    their embeddings are added.
+    """
+
+    def __init__(self, max_dice_value=6, hidden_size=32, softmax: bool = False):
+        super(ColumnNetwork, self).__init__()
+        column_count = comb(max_dice_value + 3, 3)
+        self.embedding = nn.Embedding(2 * column_count + max_dice_value + 1, hidden_size)
+        # rows of the opponent's columns and the dice follow the rows of the own columns
+        self.register_buffer(
+            "offsets", torch.tensor([0, 0, 0] + [column_count] * 3 + [2 * column_count])
+        )
+        self.column_layer = nn.Linear(hidden_size, hidden_size)
+        self.summary_layer = nn.Linear(hidden_size, hidden_size, bias=False)
+        self.output_layer = nn.Linear(hidden_size, 1)
+        self.softmax = softmax
+
+    def forward(self, x):
+        embedded = self.embedding(x.long() + self.offsets)
+        columns = torch.relu(embedded[:, 0:3] + embedded[:, 3:6])
+        # every column sees itself, the mean of all columns and the dice
+        summary = self.summary_layer(columns.mean(dim=1, keepdim=True))
+        hidden = torch.relu(self.column_layer(columns) + summary + embedded[:, 6:7])
+        scores = self.output_layer(hidden).squeeze(2)
+        if self.softmax:
+            return torch.softmax(scores, dim=1)
+        return scores
@@ -4,8 +4,19 @@ import torch.nn as nn
 import torch.optim as optim
 import random
 import numpy as np
-from collections import deque
 from agents.base_agent_v2 import AbstractAgent
+from agents.replay_buffers import (
+    ReplayBuffer,
+    PrioritizedReplayBuffer,
+    ColumnPermutations,
+)
+from agents.inference import InferenceCache
+from agents.column_network import ColumnEncoder, ColumnNetwork
+from agents.neural_checkpoints import (
+    save_checkpoint,
+    load_checkpoint,
+    tensors_to_arrays,
+)
 import game.player_actions_v2 as pa
 
 
@@ -52,30 +63,93 @@ class DeepQLearningAgent(AbstractAgent):
         batch_size=64,
         target_update=10,
         device="cuda",
+        gradient_steps=1,
+        prioritized_replay=False,
+        priority_alpha=0.6,
+        priority_beta=0.4,
+        priority_beta_increment=1e-5,
+        train_every=None,
+        target_update_tau=None,
+        compiled_inference=False,
+        save_replay=False,
+        column_network=False,
+        max_dice_value=6,
+        permute_columns=False,
+        expected_dice_target=False,
     ):
+        """
+        :param memory_size: number of transitions kept in the replay memory, see agents.replay_buffers.
+        :param gradient_steps: minibatch steps taken for every learn_batch call, or every train_every transitions.
+        :param train_every: train gradient_steps times for every train_every stored transitions,
+            by default one step is taken for every learn call.
+        :param target_update: copy the model to the target network every target_update steps.
+        :param target_update_tau: move the target network this far towards the model after every step instead.
+        :param compiled_inference: pick moves with a compiled copy of the model, see agents.inference.
+            It's rebuilt after every gradient step, so it pays off once the agent stops learning.
+        :param prioritized_replay: sample transitions by TD error instead of uniformly,
+            priority_alpha, priority_beta and priority_beta_increment are passed to PrioritizedReplayBuffer.
+        :param save_replay: include the replay memory in saved models, see agents.neural_checkpoints.
+        :param column_network: states are column ids and the network a ColumnNetwork, see agents.column_network.
+            state_size is 7 then.
+        :param max_dice_value: highest dice value of the game, for the column network and expected_dice_target.
+        :param permute_columns: train on sampled transitions with their columns in a random order,
+            see agents.replay_buffers.ColumnPermutations.
+        :param expected_dice_target: bootstrap from the mean over every dice value of the next turn
+            instead of the one it rolled, see next_state_values.
+        """
         super().__init__(nickname, should_save_model, device)
         self.modelType = "DQ"
+        self.column_encoder = ColumnEncoder(max_dice_value) if column_network else None
+        if column_network:
+            state_size = 7
         self.state_size = state_size
         self.action_size = action_size
-        self.memory = deque(maxlen=memory_size)
+        if prioritized_replay:
+            self.memory = PrioritizedReplayBuffer(
+                memory_size,
+                state_size,
+                alpha=priority_alpha,
+                beta=priority_beta,
+                beta_increment=priority_beta_increment,
+            )
+        else:
+            self.memory = ReplayBuffer(memory_size, state_size)
+        self.column_permutations = (
+            ColumnPermutations(state_size) if permute_columns else None
+        )
         self.batch_size = batch_size
         self.exploration_rate = exploration_rate
         self.exploration_decay = exploration_decay
         self.min_exploration_rate = min_exploration_rate
         self.discount_factor = discount_factor
         self.target_update = target_update
+        self.gradient_steps = gradient_steps
+        self.train_every = train_every
+        self.target_update_tau = target_update_tau
+        self.max_dice_value = max_dice_value
+        self.expected_dice_target = expected_dice_target
         self.update_count = 0
-
-        self.model = DQN(state_size, action_size).to(device)
-        self.target_model = DQN(state_size, action_size).to(device)
+        # transitions stored since the last training, when training every train_every transitions
+        self.new_transitions = 0
+        # minibatch tensors reused by every gradient step, created on the first one
+        self.staging = None
+        self.compiled_inference = compiled_inference
+        self.inference_cache = InferenceCache()
+        self.save_replay = save_replay
+        # kept as a tensor, so reading the loss doesn't sync the device on every step
+        self.last_loss = None
+
+        if column_network:
+            self.model = ColumnNetwork(max_dice_value).to(device)
+            self.target_model = ColumnNetwork(max_dice_value).to(device)
+        else:
+            self.model = DQN(state_size, action_size).to(device)
+            self.target_model = DQN(state_size, action_size).to(device)
         self.optimizer = optim.Adam(self.model.parameters(), lr=learning_rate)
         self.criterion = nn.MSELoss()
 
         self.update_target_model()
 
-    def update_target_model(self):
-        self.target_model.load_state_dict(self.model.state_dict())
-
     def select_move(self, game_engine):
         available_moves = pa.get_available_moves(game_engine)
         state = self.convert_state(
@@ -88,12 +162,9 @@ class DeepQLearningAgent(AbstractAgent):
             state = (
                 torch.FloatTensor(state).unsqueeze(0).to(self.device)
             )  # Convert state to tensor and add batch dimension
-            self.model.eval()  # Set the model to evaluation mode
-            with torch.no_grad():
-                action_values = self.model(state).squeeze(
-                    0
-                )  # Predict Q-values for all actions and remove batch dimension
-            self.model.train()  # Set the model back to train mode
+            action_values = self.predict(state).squeeze(
+                0
+            )  # Predict Q-values for all actions and remove batch dimension
 
             # Filter the Q-values for only those actions that are available
             q_values_of_available_moves = action_values[available_moves]
@@ -105,6 +176,39 @@ class DeepQLearningAgent(AbstractAgent):
 
         return action
 
+    def select_moves(self, observations, legal_masks):
+        """
+        Moves of a batch of games, exploiting games share one forward pass.
+
+        :param observations: (games, state_size) states from convert_state.
+        :param legal_masks: (games, action_size) bool, True for available moves.
+        :return: array of actions
+        """
+        legal_masks = np.asarray(legal_masks, dtype=bool)
+        # a random available move: the one with the largest random key
+        keys = np.where(legal_masks, np.random.random_sample(legal_masks.shape), -1.0)
+        actions = np.argmax(keys, axis=1)
+        exploit = np.random.random_sample(len(actions)) >= self.exploration_rate
+        if exploit.any():
+            states = torch.as_tensor(
+                np.asarray(observations)[exploit], dtype=torch.float32, device=self.device
+            )
+            action_values = self.predict(states)
+            masks = torch.as_tensor(legal_masks[exploit], device=self.device)
+            action_values = action_values.masked_fill(~masks, float("-inf"))
+            actions[exploit] = action_values.argmax(dim=1).cpu().numpy()
+        return actions
+
+    def predict(self, states):
+        """Q-values of a batch of states, without dropout and gradients."""
+        with torch.no_grad():
+            if self.compiled_inference:
+                return self.inference_cache.get(self.model, self.update_count)(states)
+            self.model.eval()  # Set the model to evaluation mode
+            action_values = self.model(states)
+            self.model.train()  # Set the model back to train mode
+        return action_values
+
     def learn(
         self,
         prev_state: str,
@@ -114,35 +218,93 @@ class DeepQLearningAgent(AbstractAgent):
         game_over: bool,
         winner=None,
     ):
+        self.memorize(prev_state, action, reward, next_state, game_over)
+        self.train_new_transitions(1, 1)
+
+    def learn_batch(self, batch):
+        """
+        Store the transitions of the batch and take gradient_steps minibatch steps
+        from the replay memory, instead of one step per transition.
+        """
+        self.memory.add_batch(
+            batch["prev_states"],
+            batch["actions"],
+            batch["rewards"],
+            batch["next_states"],
+            batch["game_overs"],
+        )
+        self.train_new_transitions(len(batch["actions"]), self.gradient_steps)
+
+    def train_new_transitions(self, count, steps):
+        """
+        Take the minibatch steps due after storing count transitions.
+
+        :param steps: taken when there's no train_every schedule.
+        """
+        if self.train_every is not None:
+            self.new_transitions += count
+            steps = self.new_transitions // self.train_every * self.gradient_steps
+            self.new_transitions %= self.train_every
         if len(self.memory) < self.batch_size:
-            self.memorize_all_possible_transitions(
-                prev_state,
-                action,
-                reward,
-                next_state,
-                game_over,
-            )
             return
-        mini_batch = random.sample(self.memory, self.batch_size)
-        states, actions, rewards, next_state, dones = zip(*mini_batch)
-
-        states = torch.FloatTensor(states).to(self.device)
-        next_state = torch.FloatTensor(next_state).to(self.device)
-        actions = torch.LongTensor(actions).to(self.device)
-        rewards = torch.FloatTensor(rewards).to(self.device)
+        for _ in range(steps):
+            self.gradient_step()
+
+    def staging_tensors(self):
+        """Tensors a minibatch is copied into, allocated once instead of on every step."""
+        if self.staging is None:
+            size = (self.batch_size,)
+            self.staging = {
+                "states": torch.empty(size + (self.state_size,), device=self.device),
+                "next_states": torch.empty(size + (self.state_size,), device=self.device),
+                "actions": torch.empty(size, dtype=torch.long, device=self.device),
+                "rewards": torch.empty(size, device=self.device),
+                "dones": torch.empty(size, device=self.device),
+                "weights": torch.empty(size, device=self.device),
+            }
+            if self.expected_dice_target:
+                # every next state once for every dice value, the dice value is its last value
+                dice_states = torch.empty(
+                    size + (self.max_dice_value, self.state_size), device=self.device
+                )
+                dice_states[:, :, -1] = torch.arange(1, self.max_dice_value + 1)
+                self.staging["dice_states"] = dice_states
+        return self.staging
+
+    def gradient_step(self):
+        """Train on a minibatch sampled from the replay memory."""
+        indices = self.memory.sample_indices(self.batch_size)
+        mini_batch = self.memory.get(indices)
+        if self.column_permutations is not None:
+            mini_batch = self.column_permutations.apply(mini_batch)
+        weights = self.memory.importance_weights(indices)
+
+        # copy_ decodes the stored uint8 states, int8 actions and bool dones on the way
+        staging = self.staging_tensors()
+        for name, values in mini_batch.items():
+            staging[name].copy_(torch.from_numpy(values))
+        states = staging["states"]
+        next_state = staging["next_states"]
+        actions = staging["actions"]
+        rewards = staging["rewards"]
         normalized_rewards = self.z_score_normalize_rewards(rewards)
-        dones = torch.FloatTensor(dones).to(self.device)
+        dones = staging["dones"]
 
         curr_q_values = self.model(states).gather(1, actions.unsqueeze(1)).squeeze(1)
 
-        next_q_values = self.target_model(next_state).max(1)[0].detach()
-        next_q_values = next_q_values.mean()
+        next_q_values = self.next_state_values(next_state)
         expected_q_values = normalized_rewards + (
             self.discount_factor * next_q_values * (1 - dones)
         )
 
         # Compute the loss between the current Q-values and the expected Q-values
-        loss = self.criterion(curr_q_values, expected_q_values)
+        if weights is None:
+            loss = self.criterion(curr_q_values, expected_q_values)
+        else:
+            td_errors = expected_q_values - curr_q_values
+            weights = staging["weights"].copy_(torch.from_numpy(weights))
+            loss = (weights * td_errors.pow(2)).mean()
+            self.memory.update_priorities(indices, td_errors.detach().cpu().numpy())
 
         # Zero the parameter gradients
         self.optimizer.zero_grad()
@@ -150,6 +312,7 @@ class DeepQLearningAgent(AbstractAgent):
         loss.backward()
         # Update the model weights
         self.optimizer.step()
+        self.last_loss = loss.detach()
 
         # Update the exploration rate
         self.exploration_rate = max(
@@ -158,26 +321,93 @@ class DeepQLearningAgent(AbstractAgent):
 
         # Update the target network, if needed
         self.update_count += 1
-        if self.update_count % self.target_update == 0:
+        if self.target_update_tau is not None:
+            self.soft_update_target_model()
+        elif self.update_count % self.target_update == 0:
             self.update_target_model()
 
+    def next_state_values(self, next_states):
+        """
+        Highest target Q-value of every next state.
+
+        The dice value of a next state is only one of the rolls the next turn
+        could bring. With expected_dice_target the next states are evaluated
+        with every dice value in one batch and the highest values averaged
+        per state, which is the value before the roll.
+        """
+        with torch.no_grad():
+            if not self.expected_dice_target:
+                return self.target_model(next_states).max(1)[0]
+            dice_states = self.staging_tensors()["dice_states"]
+            dice_states[:, :, :-1] = next_states[:, None, :-1]
+            next_q_values = self.target_model(dice_states.view(-1, self.state_size)).max(1)[0]
+            return next_q_values.view(len(next_states), self.max_dice_value).mean(1)
+
     def memorize(self, state, action, reward, next_state, done):
         """
         Stores a transition in the agent's memory.
         """
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.add(state, action, reward, next_state, done)
 
     def memorize_all_possible_transitions(
         self, state, action, reward, next_state, done
     ):
 
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.add(state, action, reward, next_state, done)
 
     def update_target_model(self):
         """
-        Copies the weights from the model to the target model.
+        Copies the weights from the model to the target model, in place.
         """
-        self.target_model.load_state_dict(self.model.state_dict())
+        with torch.no_grad():
+            for target, source in zip(
+                self.target_model.parameters(), self.model.parameters()
+            ):
+                target.copy_(source)
+
+    def soft_update_target_model(self):
+        """
+        Moves the target model target_update_tau of the way towards the model (Polyak averaging).
+        """
+        with torch.no_grad():
+            for target, source in zip(
+                self.target_model.parameters(), self.model.parameters()
+            ):
+                target.lerp_(source, self.target_update_tau)
+
+    def save_model(self, path):
+        """Save the networks, optimizer and schedule, see agents.neural_checkpoints."""
+        if not self.should_save_model:
+            return
+        state = {
+            "model_type": self.modelType,
+            "model": self.model.state_dict(),
+            "target_model": self.target_model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "exploration_rate": self.exploration_rate,
+            "update_count": self.update_count,
+            "new_transitions": self.new_transitions,
+        }
+        if self.save_replay:
+            state["replay"] = self.memory.state_dict()
+        save_checkpoint(path, state)
+
+    def load_model(self, path):
+        """Load a model saved by save_model, or a pickled model of older versions."""
+        # the compiled copy belongs to the replaced network, whatever its update count
+        self.inference_cache = InferenceCache()
+        checkpoint = load_checkpoint(path, self.modelType)
+        if checkpoint is None:
+            super().load_model(path)
+            return
+        self.model.load_state_dict(checkpoint["model"])
+        self.target_model.load_state_dict(checkpoint["target_model"])
+        self.optimizer.load_state_dict(checkpoint["optimizer"])
+        self.exploration_rate = checkpoint["exploration_rate"]
+        self.update_count = checkpoint["update_count"]
+        self.new_transitions = checkpoint["new_transitions"]
+        if "replay" in checkpoint:
+            self.memory.load_state_dict(tensors_to_arrays(checkpoint["replay"]))
 
     # Additional code to interact with your specific environment might be needed here.
 
@@ -185,6 +415,8 @@ class DeepQLearningAgent(AbstractAgent):
         """
         Converts the current board state and dice value into a format suitable for the DQN.
         """
+        if self.column_encoder is not None:
+            return self.column_encoder.encode(board_state, dice_value)
         state = np.array(board_state).flatten().tolist() + [dice_value]
         return state
 
@@ -0,0 +1,183 @@
+"""
+Inference-only copies of the networks of the neural agents.
+
+Picking a move runs a batch of one through a small MLP, so eager mode spends
+most of the time dispatching every layer from Python. compile_for_inference
+copies the network without dropout, scripts it with TorchScript and freezes
+it, which folds the weights into the graph and lets it fuse layers. Networks
+TorchScript can't handle fall back to the eager copy.
+
+The copy doesn't follow training, InferenceCache rebuilds it once the
+network has been trained further.
+
+For CPU-only evaluation export_quantized saves a copy with int8 weights,
+which AbstractAgent.load_model loads like any other model, after checking it
+picks the same moves as the float network.
+
+python -m agents.inference quantize models/deep_q.pkl models/deep_q_int8.pkl --agent deep_q
+"""
+
+import argparse
+import copy
+import pickle
+import random
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+import game.player_actions_v2 as pa
+
+
+def strip_dropout(model):
+    """Copy of the model in eval mode, with every dropout layer replaced by an identity."""
+    model = copy.deepcopy(model)
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, nn.Dropout):
+                setattr(parent, name, nn.Identity())
+    return model.eval().requires_grad_(False)
+
+
+def compile_for_inference(model):
+    """
+    Inference-only copy of the model, scripted and frozen, or in eager mode if that fails.
+
+    :return: module taking the same input as the model
+    """
+    eager = strip_dropout(model)
+    try:
+        with warnings.catch_warnings():
+            # TorchScript is deprecated in favour of torch.compile, which needs a compiler toolchain
+            warnings.simplefilter("ignore", FutureWarning)
+            compiled = torch.jit.freeze(torch.jit.script(eager))
+            if all(parameter.device.type == "cpu" for parameter in model.parameters()):
+                compiled = torch.jit.optimize_for_inference(compiled)
+    except Exception as error:  # TorchScript doesn't support every module
+        print(
+            f"Compiling {type(model).__name__} for inference failed, using eager mode: {error}"
+        )
+        return eager
+    return compiled
+
+
+class InferenceCache:
+    """Compiled copy of a network, rebuilt when its version changes, i.e. after gradient steps."""
+
+    def __init__(self):
+        self.module = None
+        self.version = None
+
+    def get(self, model, version):
+        if self.module is None or version != self.version:
+            self.module = compile_for_inference(model)
+            self.version = version
+        return self.module
+
+    def __getstate__(self):
+        # scripted modules can't be pickled, agents are, so it's rebuilt after loading
+        return {"module": None, "version": None}
+
+
+def quantize_dynamic(model):
+    """
+    CPU copy of the model with int8 weights in its linear layers, activations are quantized on the fly.
+
+    The copy is marked as quantized, so agents loading it run on the CPU.
+    """
+    model = strip_dropout(model).cpu()
+    with warnings.catch_warnings():
+        # eager mode quantization is deprecated, but still the only one without a compiler toolchain
+        warnings.simplefilter("ignore")
+        quantized = torch.ao.quantization.quantize_dynamic(
+            model, {nn.Linear}, dtype=torch.qint8
+        )
+    quantized.quantized = True
+    return quantized
+
+
+def sample_states(agent, games=100, max_dice_value=6, should_remove_opponents_dice=True):
+    """
+    States seen in games of random moves, as the agent converts them.
+
+    :return: array of states and bool array of the available moves in each of them
+    """
+    states = []
+    legal_masks = []
+    for _ in range(games):
+        game_engine = pa.start_game(
+            enable_print=False,
+            max_dice_value=max_dice_value,
+            should_remove_opponents_dice=should_remove_opponents_dice,
+            safe_mode=False,
+        )
+        while not pa.get_game_over(game_engine):
+            pa.start_turn(game_engine)
+            available_moves = pa.get_available_moves(game_engine)
+            states.append(
+                agent.convert_state(
+                    pa.get_board_state(game_engine), pa.get_dice_value(game_engine)
+                )
+            )
+            legal_mask = np.zeros(agent.action_size, dtype=bool)
+            legal_mask[available_moves] = True
+            legal_masks.append(legal_mask)
+            pa.do_move(game_engine, random.choice(available_moves))
+            pa.end_turn(game_engine)
+    return np.array(states), np.array(legal_masks)
+
+
+def action_agreement(model, other, states, legal_masks):
+    """Share of the states where both networks rate the same available move highest."""
+    inputs = torch.as_tensor(states, dtype=torch.float32)
+    masks = torch.as_tensor(legal_masks)
+    with torch.no_grad():
+        picks = [
+            network(inputs).masked_fill(~masks, float("-inf")).argmax(dim=1)
+            for network in (model, other)
+        ]
+    return (picks[0] == picks[1]).float().mean().item()
+
+
+def export_quantized(agent, path, games=100, min_agreement=0.99):
+    """
+    Save an int8 copy of the network of the agent, to be loaded with load_model.
+
+    :param games: number of random games the states of the agreement check are sampled from.
+    :param min_agreement: share of states the copy has to pick the same move in as the agent.
+    :return: the action agreement
+    """
+    quantized = quantize_dynamic(agent.model)
+    states, legal_masks = sample_states(agent, games)
+    agreement = action_agreement(
+        strip_dropout(agent.model).cpu(), quantized, states, legal_masks
+    )
+    print(f"int8 copy agrees on {agreement:.2%} of {len(states):,} sampled states")
+    if agreement < min_agreement:
+        raise ValueError(
+            f"int8 copy picks the same move in {agreement:.2%} of states, expected at least {min_agreement:.2%}"
+        )
+    with open(path, "wb") as file:
+        pickle.dump(quantized, file)
+    return agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export networks for inference.")
+    parser.add_argument("command", choices=["quantize"])
+    parser.add_argument("model", help="model saved by save_model")
+    parser.add_argument("output", help="where the int8 model is saved")
+    parser.add_argument("--agent", default="deep_q", help="agent the model belongs to")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    # imported here, the config imports agents
+    from training.config import AGENTS, resolve
+
+    agent = resolve(args.agent, AGENTS)(device="cpu", should_save_model=False)
+    agent.load_model(args.model)
+    export_quantized(agent, args.output, args.games, args.min_agreement)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Checkpoints of the neural agents.
+
+Pickling the whole nn.Module ties a saved model to the class definitions and
+leaves out the optimizer, the target network and the exploration schedule.
+Neural agents save a dict with torch.save instead: the state_dicts of their
+networks and optimizer, the schedule, update counters and optionally the
+replay memory. It only holds tensors and plain values, so it's loaded with
+weights_only and memory mapped, large tensors are read from disk as they're
+used. Files of the old format, a pickled module, are recognized and loaded
+the old way.
+"""
+
+import os
+import zipfile
+import numpy as np
+import torch
+
+CHECKPOINT_FORMAT = "knucks neural checkpoint"
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path, state):
+    """Write the state of an agent, numpy arrays are stored as tensors."""
+    checkpoint = dict(
+        _arrays_to_tensors(state), format=CHECKPOINT_FORMAT, version=CHECKPOINT_VERSION
+    )
+    torch.save(checkpoint, path)
+
+
+def load_checkpoint(path, model_type):
+    """
+    Read the state of an agent, memory mapped on the CPU.
+
+    :param model_type: modelType of the agent loading it, a checkpoint of another kind of agent is refused.
+    :return: the state, or None when there's no file or it's a pickled module
+    """
+    if not os.path.exists(path) or not zipfile.is_zipfile(path):
+        return None
+    checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    if checkpoint.get("format") != CHECKPOINT_FORMAT:
+        raise ValueError(f"{path} is not a neural agent checkpoint")
+    if checkpoint["version"] != CHECKPOINT_VERSION:
+        raise ValueError(
+            f"Checkpoint version {checkpoint['version']} is not supported, expected {CHECKPOINT_VERSION}"
+        )
+    if checkpoint["model_type"] != model_type:
+        raise ValueError(
+            f"{path} is a checkpoint of a {checkpoint['model_type']} agent, not {model_type}"
+        )
+    return checkpoint
+
+
+def tensors_to_arrays(state):
+    """Numpy views of the tensors of a loaded state, i.e. the replay memory."""
+    return {
+        name: value.numpy() if isinstance(value, torch.Tensor) else value
+        for name, value in state.items()
+    }
+
+
+def _arrays_to_tensors(state):
+    converted = {}
+    for name, value in state.items():
+        if isinstance(value, dict):
+            value = _arrays_to_tensors(value)
+        elif isinstance(value, np.ndarray):
+            value = torch.from_numpy(np.ascontiguousarray(value))
+        converted[name] = value
+    return converted
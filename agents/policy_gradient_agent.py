@@ -4,6 +4,9 @@ import torch.optim as optim
 import numpy as np
 from collections import deque
 from agents.base_agent_v2 import AbstractAgent
+from agents.inference import InferenceCache
+from agents.column_network import ColumnEncoder, ColumnNetwork
+from agents.neural_checkpoints import save_checkpoint, load_checkpoint
 import game.player_actions_v2 as pa
 
 
@@ -34,16 +37,36 @@ class PolicyGradientAgent(AbstractAgent):
         should_save_model=True,
         learning_rate=0.001,
         device="cuda",
+        compiled_inference=False,
+        column_network=False,
+        max_dice_value=6,
     ):
+        """
+        :param compiled_inference: pick moves with a compiled copy of the model, see agents.inference.
+            It's rebuilt after every policy update, so it pays off once the agent stops learning.
+        :param column_network: states are column ids and the policy a ColumnNetwork, see agents.column_network.
+            state_size is 7 then.
+        :param max_dice_value: highest dice value of the game, for the column network.
+        """
         super().__init__(nickname, should_save_model, device)
         self.modelType = "PG"
+        self.column_encoder = ColumnEncoder(max_dice_value) if column_network else None
+        if column_network:
+            state_size = 7
+            self.model = ColumnNetwork(max_dice_value, softmax=True).to(self.device)
+        else:
+            self.model = PolicyNetwork(state_size, action_size).to(self.device)
         self.state_size = state_size
         self.action_size = action_size
         self.entropy = entropy
-        self.model = PolicyNetwork(state_size, action_size).to(self.device)
         self.optimizer = optim.Adam(self.model.parameters(), lr=learning_rate)
         self.memory = deque(maxlen=10000)
         self.counter = 0
+        self.update_count = 0
+        self.compiled_inference = compiled_inference
+        self.inference_cache = InferenceCache()
+        # kept as a tensor, so reading the loss doesn't sync the device on every step
+        self.last_loss = None
 
     def select_move(self, game_engine):
         available_moves = pa.get_available_moves(game_engine)
@@ -51,8 +74,7 @@ class PolicyGradientAgent(AbstractAgent):
             pa.get_board_state(game_engine), pa.get_dice_value(game_engine)
         )
         state = torch.FloatTensor(state).unsqueeze(0).to(self.device)
-        with torch.no_grad():
-            probabilities = self.model(state)
+        probabilities = self.predict(state)
 
         probabilities = probabilities.cpu().numpy().squeeze()
 
@@ -72,6 +94,42 @@ class PolicyGradientAgent(AbstractAgent):
         action = np.random.choice(available_moves, p=available_probabilities)
         return action
 
+    def select_moves(self, observations, legal_masks):
+        """
+        Moves of a batch of games sampled from the policy, with one forward pass.
+
+        :param observations: (games, state_size) states from convert_state.
+        :param legal_masks: (games, action_size) bool, True for available moves.
+        :return: array of actions
+        """
+        legal_masks = np.asarray(legal_masks, dtype=bool)
+        states = torch.as_tensor(
+            np.asarray(observations), dtype=torch.float32, device=self.device
+        )
+        probabilities = self.predict(states).cpu().numpy()
+
+        probabilities = np.where(legal_masks, probabilities, 0.0)
+        totals = probabilities.sum(axis=1, keepdims=True)
+        # all available moves can underflow to 0, they're equally likely then
+        probabilities = np.where(
+            totals > 0,
+            probabilities / np.where(totals > 0, totals, 1.0),
+            legal_masks / legal_masks.sum(axis=1, keepdims=True),
+        )
+        draws = np.random.random_sample((len(probabilities), 1))
+        actions = (probabilities.cumsum(axis=1) <= draws).sum(axis=1)
+        # rounding can leave the draw above the last sum, take the last available move then
+        last_available = legal_masks.shape[1] - 1 - np.argmax(legal_masks[:, ::-1], axis=1)
+        self.counter += len(actions)
+        return np.minimum(actions, last_available)
+
+    def predict(self, states):
+        """Move probabilities of a batch of states, without gradients."""
+        with torch.no_grad():
+            if self.compiled_inference:
+                return self.inference_cache.get(self.model, self.update_count)(states)
+            return self.model(states)
+
     def learn(
         self,
         prev_state: str,
@@ -94,6 +152,30 @@ class PolicyGradientAgent(AbstractAgent):
             self.optimize_model(states, actions, rewards)
             self.memory.clear()
 
+    def learn_batch(self, batch):
+        """
+        One policy update over all episodes of the batch that ended, instead of one per episode.
+        Moves of an unfinished episode are kept for the next call.
+        """
+        transitions = list(
+            zip(
+                batch["prev_states"].tolist(),
+                batch["actions"].tolist(),
+                batch["rewards"].tolist(),
+                batch["game_overs"].tolist(),
+            )
+        )
+        ended = np.flatnonzero(batch["game_overs"])
+        if len(ended) == 0:
+            self.memory.extend(transitions)
+            return
+
+        end = ended[-1] + 1
+        states, actions, rewards, dones = zip(*self.memory, *transitions[:end])
+        self.optimize_model(states, actions, rewards)
+        self.memory.clear()
+        self.memory.extend(transitions[end:])
+
     def optimize_model(self, states, actions, rewards):
         # torch.autograd.set_detect_anomaly(True)
         states = torch.FloatTensor(states).to(self.device)
@@ -117,8 +199,40 @@ class PolicyGradientAgent(AbstractAgent):
         # Gradient clipping
         torch.nn.utils.clip_grad_norm_(self.model.parameters(), max_norm=1.0)
         self.optimizer.step()
+        self.last_loss = loss.detach()
+        self.update_count += 1
+
+    def save_model(self, path):
+        """Save the policy, optimizer and counters, see agents.neural_checkpoints."""
+        if not self.should_save_model:
+            return
+        save_checkpoint(
+            path,
+            {
+                "model_type": self.modelType,
+                "model": self.model.state_dict(),
+                "optimizer": self.optimizer.state_dict(),
+                "update_count": self.update_count,
+                "counter": self.counter,
+            },
+        )
+
+    def load_model(self, path):
+        """Load a model saved by save_model, or a pickled model of older versions."""
+        # the compiled copy belongs to the replaced network, whatever its update count
+        self.inference_cache = InferenceCache()
+        checkpoint = load_checkpoint(path, self.modelType)
+        if checkpoint is None:
+            super().load_model(path)
+            return
+        self.model.load_state_dict(checkpoint["model"])
+        self.optimizer.load_state_dict(checkpoint["optimizer"])
+        self.update_count = checkpoint["update_count"]
+        self.counter = checkpoint["counter"]
 
     def convert_state(self, board_state, dice_value):
+        if self.column_encoder is not None:
+            return self.column_encoder.encode(board_state, dice_value)
         state = np.array(board_state).flatten().tolist() + [dice_value]
         return state
 
@@ -0,0 +1,666 @@
+"""
+Storage backends for the tabular Q-Learning agents.
+
+Every table behaves like the plain dict QLearningAgent uses by default:
+state -> list of Q-values, one per action. Tables also expose stats()
+so the trainer heartbeat can report on them.
+"""
+
+import os
+import queue
+import sqlite3
+import struct
+import threading
+from collections import OrderedDict
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+# rough cost of one entry in the state -> row dict, key and value int objects included
+INDEX_BYTES_PER_STATE = 104
+
+
+class TieredQTable:
+    """
+    Q-table that keeps hot states in an in-memory LRU cache and everything
+    else in a local SQLite file.
+
+    Under removal rules the reachable state space is far larger than RAM, so
+    instead of growing a dict until the process gets killed we only hold
+    cache_size states in memory. Dirty states are written back to disk by a
+    background thread when they fall out of the cache.
+    """
+
+    def __init__(
+        self,
+        path,
+        cache_size=1000 * 1000,
+        action_size=3,
+        write_batch_size=10 * 1000,
+    ):
+        """
+        :param path: SQLite file backing the table, created if missing.
+        :param cache_size: number of states kept in memory.
+        :param action_size: number of Q-values stored per state.
+        :param write_batch_size: number of states written per disk transaction.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self.action_size = action_size
+        self.write_batch_size = write_batch_size
+        self._open()
+
+    def _open(self):
+        self._packer = struct.Struct(f"<{self.action_size}d")
+        self._cache = OrderedDict()
+        self._dirty = set()
+        # states handed to the writer thread, but not committed to disk yet
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        # bounded, so a slow disk applies backpressure instead of growing memory
+        self._write_queue = queue.Queue(maxsize=self.write_batch_size * 4)
+
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS q_values (state INTEGER PRIMARY KEY, q BLOB)"
+        )
+        self._connection.commit()
+        self._size = self._connection.execute(
+            "SELECT COUNT(*) FROM q_values"
+        ).fetchone()[0]
+
+        self._writer = threading.Thread(target=self._write_back, daemon=True)
+        self._writer.start()
+
+    def _write_back(self):
+        """Background thread writing evicted dirty states to disk in batches."""
+        connection = sqlite3.connect(self.path)
+        running = True
+        while running:
+            batch = [self._write_queue.get()]
+            while len(batch) < self.write_batch_size:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # (None, None) is the signal from close() to stop
+            running = all(state is not None for state, _ in batch)
+            rows = [
+                (state, self._packer.pack(*values))
+                for state, values in batch
+                if state is not None
+            ]
+            if rows:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO q_values (state, q) VALUES (?, ?)", rows
+                )
+                connection.commit()
+
+            with self._pending_lock:
+                for state, values in batch:
+                    # only forget the pending copy if it was not replaced in the meantime
+                    if state is not None and self._pending.get(state) is values:
+                        del self._pending[state]
+
+            for _ in batch:
+                self._write_queue.task_done()
+        connection.close()
+
+    def _read(self, state):
+        """Read a state from the write-back buffer or disk, None if unknown."""
+        with self._pending_lock:
+            values = self._pending.get(state)
+        if values is not None:
+            return list(values)
+
+        row = self._connection.execute(
+            "SELECT q FROM q_values WHERE state = ?", (state,)
+        ).fetchone()
+        if row is None:
+            return None
+        return list(self._packer.unpack(row[0]))
+
+    def _cache_put(self, state, values, dirty):
+        self._cache[state] = values
+        if dirty:
+            self._dirty.add(state)
+
+        while len(self._cache) > self.cache_size:
+            evicted_state, evicted_values = self._cache.popitem(last=False)
+            if evicted_state in self._dirty:
+                self._dirty.remove(evicted_state)
+                with self._pending_lock:
+                    self._pending[evicted_state] = evicted_values
+                self._write_queue.put((evicted_state, evicted_values))
+
+    def get(self, state, default=None):
+        values = self._cache.get(state)
+        if values is not None:
+            self.hits += 1
+            self._cache.move_to_end(state)
+            return values
+
+        self.misses += 1
+        values = self._read(state)
+        if values is None:
+            return default
+        self._cache_put(state, values, dirty=False)
+        return values
+
+    def __getitem__(self, state):
+        values = self.get(state)
+        if values is None:
+            raise KeyError(state)
+        return values
+
+    def __setitem__(self, state, values):
+        if state in self._cache:
+            self._cache.move_to_end(state)
+        elif self._read(state) is None:
+            self._size += 1
+        self._cache_put(state, values, dirty=True)
+
+    def __contains__(self, state):
+        return self.get(state) is not None
+
+    def __len__(self):
+        return self._size
+
+    def flush(self):
+        """Write every dirty cached state to disk and wait for the writer to finish."""
+        for state in list(self._dirty):
+            values = self._cache[state]
+            with self._pending_lock:
+                self._pending[state] = values
+            self._write_queue.put((state, values))
+        self._dirty.clear()
+        self._write_queue.join()
+
+    def items(self):
+        """Iterate over all states, flushes the cache first."""
+        self.flush()
+        cursor = self._connection.execute("SELECT state, q FROM q_values")
+        for state, packed in cursor:
+            yield state, list(self._packer.unpack(packed))
+
+    def keys(self):
+        for state, _ in self.items():
+            yield state
+
+    def values(self):
+        for _, values in self.items():
+            yield values
+
+    def __iter__(self):
+        return self.keys()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "cache hit rate": self.hits / lookups if lookups else 0.0,
+            "states in memory": len(self._cache),
+            "states waiting for write back": len(self._pending),
+        }
+
+    def close(self):
+        """Flush the table to disk and stop the writer thread."""
+        self.flush()
+        self._write_queue.put((None, None))
+        self._writer.join()
+        self._connection.close()
+
+    def __getstate__(self):
+        """
+        Pickling only stores where the table lives, the states themselves stay on disk.
+        This keeps AbstractAgent.save_model and load_model working as they are.
+        """
+        self.flush()
+        return {
+            "path": os.path.abspath(self.path),
+            "cache_size": self.cache_size,
+            "action_size": self.action_size,
+            "write_batch_size": self.write_batch_size,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+
+class ArrayQTable:
+    """
+    Compact Q-table, a dict maps the state to a row and the Q-values live in a
+    numpy array instead of a list of boxed floats per state.
+
+    Optionally counts visits per state in a uint16/uint32 array. With a visit
+    counter and a memory cap, a full table runs an LFU-with-aging eviction
+    pass that drops the coldest states, so training can run indefinitely
+    within a fixed memory budget.
+
+    Values can be stored as float32, float16 or int8 scaled by value_scale.
+    Updates are computed in Python floats and rounded stochastically when
+    written back, so learning rate sized steps smaller than the storage
+    precision are not lost on average. validate=True also keeps the last
+    written values before rounding, in float32, to measure how often rounding
+    a write changes its best action. They're computed from the rounded values
+    read before the update, so it's not a table trained in float32, compare
+    against one of those with policy_agreement.
+
+    States have to be integers, which is what QLearningAgent.convert_state returns.
+    """
+
+    def __init__(
+        self,
+        action_size=3,
+        visit_counter=None,
+        max_states=None,
+        memory_limit_mb=None,
+        eviction_fraction=0.25,
+        initial_capacity=1 << 16,
+        value_dtype="float32",
+        value_scale=None,
+        validate=False,
+        seed=None,
+    ):
+        """
+        :param action_size: number of Q-values stored per state.
+        :param visit_counter: None, "uint16" or "uint32", dtype of the per state visit counter.
+        :param max_states: cap on the number of states in the table.
+        :param memory_limit_mb: cap on the table memory, used to derive max_states.
+        :param eviction_fraction: share of the states dropped by one eviction pass.
+        :param initial_capacity: number of rows allocated up front.
+        :param value_dtype: "float32", "float16" or "int8" storage for the Q-values.
+        :param value_scale: Q-value of one int8 step, i.e. max abs Q-value / 127.
+        :param validate: keep the last written values before rounding, see policy_agreement.
+        :param seed: seed for the stochastic rounding.
+        """
+        self.action_size = action_size
+        self.value_dtype = np.dtype(value_dtype)
+        if self.value_dtype not in (np.float32, np.float16, np.int8):
+            raise ValueError(f"Unsupported value dtype: {value_dtype}")
+        if self.value_dtype == np.int8 and not value_scale:
+            raise ValueError("int8 values require a value_scale.")
+        self.value_scale = value_scale
+        self.validate = validate
+        self._rng = np.random.default_rng(seed)
+        self.visit_counter = visit_counter
+        self.eviction_fraction = eviction_fraction
+
+        if max_states is None and memory_limit_mb is not None:
+            max_states = int(memory_limit_mb * 1024 * 1024 // self.bytes_per_state())
+        if max_states is not None and visit_counter is None:
+            raise ValueError("Capping the table size requires a visit_counter.")
+        self.max_states = max_states
+
+        if max_states is not None:
+            initial_capacity = min(initial_capacity, max_states)
+        self._index = {}
+        self._keys = np.zeros(initial_capacity, dtype=np.int64)
+        self._values = np.zeros(
+            (initial_capacity, action_size), dtype=self.value_dtype
+        )
+        self._baseline = None
+        if validate:
+            self._baseline = np.zeros((initial_capacity, action_size), dtype=np.float32)
+        self._visits = None
+        if visit_counter:
+            self._visits = np.zeros(initial_capacity, dtype=visit_counter)
+            # counters saturate instead of wrapping around
+            self._max_visits = np.iinfo(self._visits.dtype).max
+        # rows freed by eviction, reused before the table grows
+        self._free_rows = []
+        self._next_row = 0
+
+        self.evicted = 0
+        self.coverage_retained = 1.0
+
+    def bytes_per_state(self):
+        """Approximate memory used by a single state in the table."""
+        visit_bytes = np.dtype(self.visit_counter).itemsize if self.visit_counter else 0
+        baseline_bytes = 4 * self.action_size if self.validate else 0
+        return (
+            INDEX_BYTES_PER_STATE
+            + np.dtype(np.int64).itemsize
+            + self.value_dtype.itemsize * self.action_size
+            + visit_bytes
+            + baseline_bytes
+        )
+
+    @staticmethod
+    def int8_scale(max_abs_q_value):
+        """value_scale that fits Q-values in [-max_abs_q_value, max_abs_q_value] into int8."""
+        return max_abs_q_value / 127
+
+    def _encode(self, values):
+        """Round the values to the storage dtype, stochastically so small updates survive."""
+        values = np.asarray(values, dtype=np.float64)
+        if self.value_dtype == np.float32:
+            return values
+
+        if self.value_dtype == np.int8:
+            scaled = values / self.value_scale
+            rounded = np.floor(scaled + self._rng.random(scaled.shape))
+            return np.clip(rounded, -127, 127)
+
+        nearest = values.astype(np.float16)
+        error = values - nearest
+        # the float16 on the other side of the exact value
+        direction = np.where(error > 0, np.inf, -np.inf).astype(np.float16)
+        other = np.nextafter(nearest, direction)
+        gap = other.astype(np.float64) - nearest
+        # move to the other neighbour with probability proportional to the distance
+        probability = np.divide(error, gap, out=np.zeros_like(error), where=error != 0)
+        return np.where(self._rng.random(values.shape) < probability, other, nearest)
+
+    def _decode(self, row):
+        if self.value_dtype == np.int8:
+            return (self._values[row] * self.value_scale).tolist()
+        return self._values[row].tolist()
+
+    def _grow(self):
+        capacity = len(self._keys) * 2
+        if self.max_states is not None:
+            capacity = min(capacity, self.max_states)
+        self._keys = np.resize(self._keys, capacity)
+        values = np.zeros((capacity, self.action_size), dtype=self.value_dtype)
+        values[: len(self._values)] = self._values
+        self._values = values
+        if self._baseline is not None:
+            baseline = np.zeros((capacity, self.action_size), dtype=np.float32)
+            baseline[: len(self._baseline)] = self._baseline
+            self._baseline = baseline
+        if self._visits is not None:
+            visits = np.zeros(capacity, dtype=self._visits.dtype)
+            visits[: len(self._visits)] = self._visits
+            self._visits = visits
+
+    def _allocate_row(self):
+        if self.max_states is not None and len(self._index) >= self.max_states:
+            self.evict()
+        if self._free_rows:
+            return self._free_rows.pop()
+        if self._next_row == len(self._keys):
+            self._grow()
+        row = self._next_row
+        self._next_row += 1
+        return row
+
+    def evict(self):
+        """
+        LFU-with-aging eviction pass.
+
+        Drops the eviction_fraction of states with the fewest visits, then halves
+        the visit count of the survivors (rounding up), so states that were popular a long
+        time ago eventually make room for the current ones.
+        """
+        rows = np.fromiter(self._index.values(), dtype=np.int64, count=len(self._index))
+        evict_count = max(1, int(len(rows) * self.eviction_fraction))
+        visits = self._visits[rows]
+        coldest = np.argpartition(visits, evict_count - 1)[:evict_count]
+        evicted_rows = rows[coldest]
+
+        total_visits = int(visits.sum(dtype=np.int64))
+        evicted_visits = int(visits[coldest].sum(dtype=np.int64))
+        self.coverage_retained = (
+            (total_visits - evicted_visits) / total_visits if total_visits else 1.0
+        )
+
+        for state in self._keys[evicted_rows].tolist():
+            del self._index[state]
+        self._values[evicted_rows] = 0
+        if self._baseline is not None:
+            self._baseline[evicted_rows] = 0
+        self._visits[evicted_rows] = 0
+        self._free_rows.extend(evicted_rows.tolist())
+        # round up, so every survivor keeps at least one visit
+        survivors = self._visits[rows]
+        self._visits[rows] = (survivors >> 1) + (survivors & 1)
+        self.evicted += evict_count
+
+    def get(self, state, default=None):
+        row = self._index.get(state)
+        if row is None:
+            return default
+        return self._decode(row)
+
+    def __getitem__(self, state):
+        return self._decode(self._index[state])
+
+    def __setitem__(self, state, values):
+        row = self._index.get(state)
+        if row is None:
+            row = self._allocate_row()
+            self._index[state] = row
+            self._keys[row] = state
+        self._values[row] = self._encode(values)
+        if self._baseline is not None:
+            self._baseline[row] = values
+        if self._visits is not None:
+            if self._visits[row] < self._max_visits:
+                self._visits[row] += 1
+
+    def __contains__(self, state):
+        return state in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def visits(self, state):
+        """Number of updates the state received, aged by eviction passes."""
+        return int(self._visits[self._index[state]])
+
+    def items(self):
+        for state, row in self._index.items():
+            yield state, self._decode(row)
+
+    def keys(self):
+        return iter(self._index)
+
+    def values(self):
+        for _, values in self.items():
+            yield values
+
+    def __iter__(self):
+        return self.keys()
+
+    def stats(self):
+        stats = {
+            "table memory (MB)": len(self._index)
+            * self.bytes_per_state()
+            // (1024 * 1024)
+        }
+        if self.max_states is not None:
+            stats["states evicted"] = self.evicted
+            stats["coverage retained"] = self.coverage_retained
+        if self.validate:
+            stats["policy agreement before rounding"] = self.policy_agreement()
+        return stats
+
+    def policy_agreement(self):
+        """
+        Share of states where the stored values pick the same best action as
+        their last write before rounding, kept with validate=True.
+        """
+        if not self.validate:
+            raise ValueError("Policy agreement requires validate=True.")
+        if not self._index:
+            return 1.0
+        rows = np.fromiter(self._index.values(), dtype=np.int64, count=len(self._index))
+        stored = self._values[rows].astype(np.float32)
+        if self.value_dtype == np.int8:
+            stored *= self.value_scale
+        return float(
+            np.mean(stored.argmax(axis=1) == self._baseline[rows].argmax(axis=1))
+        )
+
+
+def policy_agreement(table, baseline_table):
+    """
+    Share of the baseline table states where both tables pick the same best action,
+    i.e. to compare a quantized table against one trained with float32 values.
+    States missing from the table count as disagreement.
+    """
+    if len(baseline_table) == 0:
+        return 1.0
+    agreeing = 0
+    for state, baseline_values in baseline_table.items():
+        values = table.get(state)
+        if values is not None and np.argmax(values) == np.argmax(baseline_values):
+            agreeing += 1
+    return agreeing / len(baseline_table)
+
+
+class SharedQTable:
+    """
+    Fixed size Q-table in multiprocessing.shared_memory for Hogwild training.
+
+    Open addressing hash table with linear probing over two arrays, state keys
+    (int64, 0 marks an empty slot) and float32 Q-values. Every process that
+    unpickles the table attaches to the same memory, and all of them update it
+    without locks. Concurrent writes to the same state can lose an update,
+    which Hogwild style training tolerates. Once the table is more than
+    max_load full new states are no longer stored.
+    """
+
+    def __init__(self, capacity=1 << 22, action_size=3, max_load=0.9, name=None):
+        """
+        :param capacity: number of slots, rounded up to a power of two.
+        :param action_size: number of Q-values stored per state.
+        :param max_load: share of slots that can be filled before new states are dropped.
+        :param name: attach to an existing table instead of creating a new one.
+        """
+        self.capacity = 1 << max(capacity - 1, 1).bit_length()
+        self.action_size = action_size
+        self.max_load = max_load
+        self._owner = name is None
+        # int64 key and float32 values per slot
+        size = self.capacity * (8 + 4 * action_size)
+        if self._owner:
+            self._memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            # the creating process is responsible for unlinking the memory
+            resource_tracker.unregister(self._memory._name, "shared_memory")
+        self.name = self._memory.name
+        self._attach()
+        if self._owner:
+            self.keys_array[:] = 0
+            self.values_array[:] = 0
+
+    def _attach(self):
+        self._mask = self.capacity - 1
+        self._max_states = int(self.capacity * self.max_load)
+        buffer = self._memory.buf
+        keys_size = self.capacity * 8
+        self.keys_array = np.ndarray((self.capacity,), dtype=np.int64, buffer=buffer)
+        # right after the keys, their 8 byte slots keep the float32 values aligned
+        self.values_array = np.ndarray(
+            (self.capacity, self.action_size),
+            dtype=np.float32,
+            buffer=buffer,
+            offset=keys_size,
+        )
+        # memoryviews return Python numbers, which is a lot quicker than numpy scalars
+        self._keys = buffer[:keys_size].cast("q")
+        self._values = buffer[keys_size : keys_size + self.capacity * self.action_size * 4].cast("f")
+        self._size = 0
+        self.dropped = 0
+
+    def _slot(self, state):
+        # fibonacci hashing, neighbouring states end up far from each other
+        return ((state * 11400714819323198485) >> 17) & self._mask
+
+    def _find(self, state):
+        """Slot holding the state, or the empty slot where it would go."""
+        keys = self._keys
+        slot = self._slot(state)
+        while True:
+            key = keys[slot]
+            if key == state or key == 0:
+                return slot, key
+            slot = (slot + 1) & self._mask
+
+    def get(self, state, default=None):
+        slot, key = self._find(state)
+        if key == 0:
+            return default
+        start = slot * self.action_size
+        return self._values[start : start + self.action_size].tolist()
+
+    def __getitem__(self, state):
+        values = self.get(state)
+        if values is None:
+            raise KeyError(state)
+        return values
+
+    def __setitem__(self, state, values):
+        slot, key = self._find(state)
+        if key == 0:
+            if self._size >= self._max_states:
+                self._size = len(self)
+                if self._size >= self._max_states:
+                    self.dropped += 1
+                    return
+            self._size += 1
+            self._keys[slot] = state
+        start = slot * self.action_size
+        for action in range(self.action_size):
+            self._values[start + action] = values[action]
+
+    def __contains__(self, state):
+        return self._find(state)[1] != 0
+
+    def __len__(self):
+        return int(np.count_nonzero(self.keys_array))
+
+    def items(self):
+        slots = np.flatnonzero(self.keys_array)
+        for state, values in zip(
+            self.keys_array[slots].tolist(), self.values_array[slots].tolist()
+        ):
+            yield state, values
+
+    def keys(self):
+        return iter(self.keys_array[np.flatnonzero(self.keys_array)].tolist())
+
+    def values(self):
+        for _, values in self.items():
+            yield values
+
+    def __iter__(self):
+        return self.keys()
+
+    def update(self, table):
+        """Copy every state of another table into this one."""
+        for state, values in table.items():
+            self[state] = values
+
+    def stats(self):
+        return {"table load": len(self) / self.capacity, "states dropped": self.dropped}
+
+    def close(self):
+        """Detach from the shared memory, the creating process also frees it."""
+        self._keys.release()
+        self._values.release()
+        del self.keys_array, self.values_array
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def __getstate__(self):
+        return {
+            "capacity": self.capacity,
+            "action_size": self.action_size,
+            "max_load": self.max_load,
+            "name": self.name,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
@@ -11,7 +11,7 @@ class RandomAgent(AbstractAgent):
     """
 
     def __init__(self, nickname="Wild Card", should_save_model=False):
-        super().__init__(nickname, should_save_model)
+        super().__init__(nickname, should_save_model, device="cpu")
 
     def select_move(self, game_engine):
         available_moves = pa.get_available_moves(game_engine)
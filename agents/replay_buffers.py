@@ -0,0 +1,280 @@
+"""
+Replay memories of the neural agents.
+
+Transitions are kept in preallocated numpy arrays instead of a deque of
+tuples of lists: board cells and dice as uint8, actions as int8, rewards as
+float32 and game overs as bool. That's about 40 bytes per transition instead
+of about 500, inserting overwrites the oldest row in O(1) and a minibatch is
+drawn with one vectorized index lookup.
+
+PrioritizedReplayBuffer samples by TD error instead, through a SumTree.
+ColumnPermutations reorders the columns of sampled minibatches.
+"""
+
+import itertools
+import numpy as np
+
+
+class ReplayBuffer:
+    """Ring buffer of the last capacity transitions."""
+
+    def __init__(self, capacity, state_size, state_dtype=np.uint8):
+        """
+        :param capacity: number of transitions kept, the oldest ones are overwritten.
+        :param state_size: length of the state vectors from convert_state.
+        :param state_dtype: dtype the state vectors are stored as, uint8 fits board cells and dice.
+        """
+        self.capacity = capacity
+        self.state_size = state_size
+        self.states = np.zeros((capacity, state_size), dtype=state_dtype)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=state_dtype)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        """Store a transition, returns the row it's stored at."""
+        index = self.position
+        self.states[index] = state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.next_states[index] = next_state
+        self.dones[index] = done
+        self.position = (index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return index
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """Store rows of transitions at once, returns the rows they're stored at."""
+        count = len(actions)
+        if count > self.capacity:
+            # only the newest capacity transitions would survive anyway
+            states, actions, rewards, next_states, dones = (
+                values[-self.capacity :]
+                for values in (states, actions, rewards, next_states, dones)
+            )
+            count = self.capacity
+        indices = (self.position + np.arange(count)) % self.capacity
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_states[indices] = next_states
+        self.dones[indices] = dones
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        return indices
+
+    def sample_indices(self, batch_size):
+        """Rows of a uniformly drawn minibatch, with replacement."""
+        return np.random.randint(0, self.size, batch_size)
+
+    def get(self, indices):
+        """Transitions at the rows as a dict of arrays, states still in their stored dtype."""
+        return {
+            "states": self.states[indices],
+            "actions": self.actions[indices],
+            "rewards": self.rewards[indices],
+            "next_states": self.next_states[indices],
+            "dones": self.dones[indices],
+        }
+
+    def bytes_per_transition(self):
+        return (
+            self.states.itemsize * self.state_size * 2
+            + self.actions.itemsize
+            + self.rewards.itemsize
+            + self.dones.itemsize
+        )
+
+    def importance_weights(self, indices):
+        """Loss weights of the sampled rows, None when sampling is uniform."""
+        return None
+
+    def state_dict(self):
+        """Arrays and position of the buffer, for agent checkpoints."""
+        return {
+            "states": self.states,
+            "actions": self.actions,
+            "rewards": self.rewards,
+            "next_states": self.next_states,
+            "dones": self.dones,
+            "position": self.position,
+            "size": self.size,
+        }
+
+    def load_state_dict(self, state):
+        """Continue from a saved buffer, its capacity replaces the one given to the constructor."""
+        self.states = state["states"]
+        self.actions = state["actions"]
+        self.rewards = state["rewards"]
+        self.next_states = state["next_states"]
+        self.dones = state["dones"]
+        self.position = state["position"]
+        self.size = state["size"]
+        self.capacity = len(self.actions)
+        self.state_size = self.states.shape[1]
+
+    def update_priorities(self, indices, td_errors):
+        """Uniform sampling ignores how surprising a transition was."""
+
+
+class SumTree:
+    """
+    Binary tree of priorities in a flat array, every node holds the sum of its children.
+
+    Leaves start at leaf_start, node i has children 2i and 2i + 1, so the
+    total is at index 1. Updates and prefix sum lookups walk a single path,
+    O(log n), and both are vectorized over a batch of leaves.
+    """
+
+    def __init__(self, capacity):
+        self.leaf_start = 1
+        while self.leaf_start < capacity:
+            self.leaf_start *= 2
+        self.capacity = capacity
+        self.nodes = np.zeros(2 * self.leaf_start, dtype=np.float64)
+
+    def total(self):
+        return self.nodes[1]
+
+    def update(self, leaves, priorities):
+        """Set the priorities of leaves, a leaf listed twice gets one of its priorities."""
+        nodes = np.asarray(leaves) + self.leaf_start
+        self.nodes[nodes] = priorities
+        while nodes[0] > 1:
+            # shared parents are written more than once, but always with the same sum
+            nodes = nodes // 2
+            self.nodes[nodes] = self.nodes[2 * nodes] + self.nodes[2 * nodes + 1]
+
+    def find(self, values):
+        """Leaves where the running sum of priorities passes each of the values."""
+        # a value at or past the total would end on an empty leaf after the filled ones
+        values = np.minimum(np.array(values, dtype=np.float64), np.nextafter(self.total(), 0))
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.leaf_start:
+            left = 2 * nodes
+            left_sums = self.nodes[left]
+            go_right = values > left_sums
+            values -= np.where(go_right, left_sums, 0.0)
+            nodes = left + go_right
+        return np.minimum(nodes - self.leaf_start, self.capacity - 1)
+
+    def get(self, leaves):
+        return self.nodes[np.asarray(leaves) + self.leaf_start]
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """
+    Replay buffer sampling transitions in proportion to their TD error.
+
+    Rare win/loss rewards get replayed far more often than the many zero
+    reward moves. New transitions get the highest priority seen so far, so
+    they're replayed at least once. The bias of non-uniform sampling is
+    corrected with importance sampling weights, annealed from beta to 1.
+    """
+
+    def __init__(
+        self,
+        capacity,
+        state_size,
+        state_dtype=np.uint8,
+        alpha=0.6,
+        beta=0.4,
+        beta_increment=1e-5,
+        epsilon=1e-6,
+    ):
+        """
+        :param alpha: how strongly priorities skew sampling, 0 is uniform.
+        :param beta: importance sampling correction at the start, raised by beta_increment every minibatch.
+        :param epsilon: added to TD errors so no transition stops being sampled.
+        """
+        super().__init__(capacity, state_size, state_dtype)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+
+    def add(self, state, action, reward, next_state, done):
+        index = super().add(state, action, reward, next_state, done)
+        self.tree.update([index], [self.max_priority**self.alpha])
+        return index
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        indices = super().add_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(indices, np.full(len(indices), self.max_priority**self.alpha))
+        return indices
+
+    def sample_indices(self, batch_size):
+        """Rows drawn in proportion to priority, one from each of batch_size equal segments."""
+        segment = self.tree.total() / batch_size
+        values = (np.arange(batch_size) + np.random.random_sample(batch_size)) * segment
+        return self.tree.find(values)
+
+    def importance_weights(self, indices):
+        probabilities = self.tree.get(indices) / self.tree.total()
+        weights = (self.size * probabilities) ** -self.beta
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        # normalized by the batch, so weights only ever scale the loss down
+        return (weights / weights.max()).astype(np.float32)
+
+    def state_dict(self):
+        state = super().state_dict()
+        state.update(
+            priorities=self.tree.nodes, max_priority=self.max_priority, beta=self.beta
+        )
+        return state
+
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.tree = SumTree(self.capacity)
+        self.tree.nodes = state["priorities"]
+        self.max_priority = state["max_priority"]
+        self.beta = state["beta"]
+
+    def update_priorities(self, indices, td_errors):
+        """Priorities of sampled rows from their absolute TD errors."""
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities**self.alpha)
+
+
+class ColumnPermutations:
+    """
+    Reorders the columns of sampled transitions, a free copy of every game for each column order.
+
+    Reordering the columns of both sides of a board gives a position worth
+    the same, with the move landing in the reordered column. Every sampled
+    transition gets one of the 6 orders at random, the buffer stays as it is.
+    Works with both layouts of the neural agents, 3 cells per column plus the
+    dice (19 values) and a column id per column plus the dice (7 values).
+    """
+
+    def __init__(self, state_size):
+        cells = (state_size - 1) // 6
+        orders = np.array(list(itertools.permutations(range(3))))
+        # column j of a reordered state is column orders[k][j] of the stored one
+        columns = np.concatenate((orders, orders + 3), axis=1)
+        cell_indices = (columns[:, :, None] * cells + np.arange(cells)).reshape(len(orders), -1)
+        dice = np.full((len(orders), 1), state_size - 1)
+        self.state_indices = np.concatenate((cell_indices, dice), axis=1)
+        # the move into column a lands in the column a is moved to
+        self.actions = np.argsort(orders, axis=1).astype(np.int8)
+
+    def apply(self, mini_batch):
+        """Minibatch from ReplayBuffer.get with a random column order per transition."""
+        orders = np.random.randint(len(self.actions), size=len(mini_batch["actions"]))
+        state_indices = self.state_indices[orders]
+        permuted = dict(mini_batch)
+        permuted["states"] = np.take_along_axis(mini_batch["states"], state_indices, axis=1)
+        permuted["next_states"] = np.take_along_axis(
+            mini_batch["next_states"], state_indices, axis=1
+        )
+        permuted["actions"] = self.actions[orders, mini_batch["actions"]]
+        return permuted
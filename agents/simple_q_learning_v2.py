@@ -1,6 +1,7 @@
 """Simple Q-Learning Agent Module"""
 
 import random
+import numpy as np
 from agents.base_agent_v2 import AbstractAgent
 import game.player_actions_v2 as pa
 
@@ -19,8 +20,15 @@ class QLearningAgent(AbstractAgent):
         exploration_rate=1.0,
         exploration_decay=0.99,
         min_exploration_rate=0.01,
+        q_table=None,
     ):
-        super().__init__(nickname, should_save_model)
+        """
+        :param q_table: storage for the Q-values, i.e. agents.q_tables.TieredQTable.
+            Defaults to a plain dict.
+        """
+        super().__init__(nickname, should_save_model, device="cpu")
+        if q_table is not None:
+            self.model = q_table
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.exploration_rate = exploration_rate
@@ -39,10 +47,10 @@ class QLearningAgent(AbstractAgent):
         # Decide action: explore or exploit
         if random.uniform(0, 1) < self.exploration_rate:
             action = random.choice(available_moves)
-        if state not in self.model:
+        q_values = self.model.get(state)
+        if q_values is None:
             action = random.choice(available_moves)
         else:
-            q_values = self.model[state]
             # filter out actions from the Q-table that are not in the available moves
             available_moves_q_values = [q_values[i] for i in available_moves]
             if all(q == 0 for q in available_moves_q_values):
@@ -67,25 +75,85 @@ class QLearningAgent(AbstractAgent):
         """update the Q-table based on the reward received"""
         # Ensure the state entries exist in the Q-table
 
-        if prev_state not in self.model:
-            self.model[prev_state] = [0.0, 0.0, 0.0]
+        q_values = self.model.get(prev_state)
+        if q_values is None:
+            q_values = [0.0, 0.0, 0.0]
 
         # update Q-Value for the taken action in the previous state
-        current_q_value = self.model[prev_state][action]
+        current_q_value = q_values[action]
 
-        future_reward = self.model[next_state]
+        # best value we can get from the next state, nothing left to gain once the game is over
+        next_q_values = None if game_over else self.model.get(next_state)
+        future_reward = max(next_q_values) if next_q_values is not None else 0.0
 
         new_q_value = current_q_value + self.learning_rate * (
             reward + self.discount_factor * future_reward - current_q_value
         )
 
-        self.model[prev_state][action] = new_q_value
+        q_values[action] = new_q_value
+        # write back, so tables that don't hand out live references see the update
+        self.model[prev_state] = q_values
 
         # Update exploration rate
         self.exploration_rate = max(
             self.min_exploration_rate, self.exploration_rate * self.exploration_decay
         )
 
+    def learn_batch(self, batch):
+        """
+        Vectorized learn over a batch of transitions.
+
+        Targets are calculated from the table as it was before the batch. A
+        state-action pair that shows up k times moves towards the mean of its
+        targets as far as k single updates with that target would.
+        """
+        prev_states = batch["prev_states"]
+        if len(prev_states) == 0:
+            return
+        actions = batch["actions"].astype(np.int64)
+        game_overs = batch["game_overs"]
+
+        states, state_rows = np.unique(prev_states, return_inverse=True)
+        q_values = np.zeros((len(states), 3))
+        for row, state in enumerate(states.tolist()):
+            values = self.model.get(state)
+            if values is not None:
+                q_values[row] = values
+
+        future_rewards = np.zeros(len(prev_states))
+        not_over = np.flatnonzero(~game_overs)
+        next_states, next_rows = np.unique(
+            batch["next_states"][not_over], return_inverse=True
+        )
+        best_next = np.zeros(len(next_states))
+        for row, state in enumerate(next_states.tolist()):
+            values = self.model.get(state)
+            if values is not None:
+                best_next[row] = max(values)
+        future_rewards[not_over] = best_next[next_rows]
+        targets = batch["rewards"] + self.discount_factor * future_rewards
+
+        # aggregate duplicates of state-action pairs
+        pairs = state_rows.ravel() * 3 + actions
+        target_sums = np.zeros(q_values.size)
+        counts = np.zeros(q_values.size)
+        np.add.at(target_sums, pairs, targets)
+        np.add.at(counts, pairs, 1)
+        flat_q_values = q_values.reshape(-1)
+        seen = counts > 0
+        step = 1 - (1 - self.learning_rate) ** counts[seen]
+        flat_q_values[seen] += step * (
+            target_sums[seen] / counts[seen] - flat_q_values[seen]
+        )
+
+        for state, values in zip(states.tolist(), q_values.tolist()):
+            self.model[state] = values
+
+        self.exploration_rate = max(
+            self.min_exploration_rate,
+            self.exploration_rate * self.exploration_decay ** len(prev_states),
+        )
+
     def convert_state(self, board_state, dice_value):
         """
         Converts the current board state and dice value into a string for Q-Table.
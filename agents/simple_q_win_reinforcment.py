@@ -1,4 +1,5 @@
 import agents.simple_q_learning_v2 as sq
+from agents.base_agent_v2 import AbstractAgent
 import game.player_actions_v2 as pa
 
 
@@ -57,3 +58,10 @@ class SimpleQWinReinforcementAgent(sq.QLearningAgent):
 
         if winner is not None and winner != 1:
             self.undo_memories()
+
+    def learn_batch(self, batch):
+        """
+        Learn the transitions one by one, the vectorized update of QLearningAgent
+        would skip memorizing states for undo_memories.
+        """
+        AbstractAgent.learn_batch(self, batch)
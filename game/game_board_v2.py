@@ -201,11 +201,15 @@ class GameBoard:
             return can_move_to_cols(self.player_1_board)
         return can_move_to_cols(self.player_2_board)
 
-    def display(self):
+    def display(self, enable_print=True):
         """
         Display the current state of the board for both players.
+
+        :param enable_print: print the board, otherwise only return the lines.
+        :return: lines of the board
         """
-        print("\n")  # Print a newline character before the game board
+        if enable_print:
+            print("\n")  # Print a newline character before the game board
         lines = []
 
         # Iterate over each player's board
@@ -224,12 +228,14 @@ class GameBoard:
                     )
                     + " |"
                 )
-                print(line)
+                if enable_print:
+                    print(line)
                 lines.append(line)
             # Print the separating line after each player's board except the last one
             separator = "|---|---|---|" if player == 0 else ""
             if separator:
-                print(separator)
+                if enable_print:
+                    print(separator)
                 lines.append(separator)
 
         return lines
@@ -0,0 +1,149 @@
+"""Test cases for playing games side by side and batched move selection"""
+
+import unittest
+import numpy as np
+import game.player_actions_v2 as pa
+import training.reward_models_v2 as rm
+from training.agent_trainer import play_episodes_batched, train_agents
+from training.transitions import TransitionBuffer
+from agents.deep_q_learning import DeepQLearningAgent
+from agents.policy_gradient_agent import PolicyGradientAgent
+from agents.random_agent_v2 import RandomAgent
+from utils.play_game import PlayingAgent, GameRules
+
+
+LEGAL_MASKS = np.array(
+    [[True, False, False], [False, True, True], [True, False, True]] * 20
+)
+
+
+class ListSink:
+    """Sink keeping records in memory"""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class TestSelectMoves(unittest.TestCase):
+    """Test cases for select_moves of the neural agents"""
+
+    def setUp(self):
+        self.observations = np.random.randint(0, 7, (len(LEGAL_MASKS), 19))
+
+    def assert_legal(self, actions):
+        self.assertEqual(len(actions), len(LEGAL_MASKS))
+        self.assertTrue(LEGAL_MASKS[np.arange(len(actions)), actions].all())
+
+    def test_deep_q_exploit(self):
+        """Test greedy moves are the best available ones"""
+        agent = DeepQLearningAgent(
+            exploration_rate=0.0, device="cpu", should_save_model=False
+        )
+        actions = agent.select_moves(self.observations, LEGAL_MASKS)
+        self.assert_legal(actions)
+        self.assertTrue(agent.model.training)
+
+    def test_deep_q_explore(self):
+        """Test random moves are available ones"""
+        agent = DeepQLearningAgent(
+            exploration_rate=1.0, device="cpu", should_save_model=False
+        )
+        self.assert_legal(agent.select_moves(self.observations, LEGAL_MASKS))
+
+    def test_policy_gradient(self):
+        """Test moves sampled from the policy are available ones"""
+        agent = PolicyGradientAgent(device="cpu", should_save_model=False)
+        self.assert_legal(agent.select_moves(self.observations, LEGAL_MASKS))
+        self.assertEqual(agent.counter, len(LEGAL_MASKS))
+
+
+class TestPlayEpisodesBatched(unittest.TestCase):
+    """Test cases for the batched game driver"""
+
+    def test_games_are_finished(self):
+        """Test every game is played to the end"""
+        played = play_episodes_batched(
+            PlayingAgent(DeepQLearningAgent(device="cpu", should_save_model=False)),
+            PlayingAgent(RandomAgent()),
+            GameRules(),
+            16,
+        )
+
+        self.assertEqual(len(played), 16)
+        for game_engine, move_counter in played:
+            self.assertTrue(pa.get_game_over(game_engine))
+            self.assertGreaterEqual(move_counter, 9)
+
+    def test_episodes_are_buffered_in_one_piece(self):
+        """Test the moves of a game follow each other and end with the game over"""
+        buffers = [TransitionBuffer(), None]
+        played = play_episodes_batched(
+            PlayingAgent(
+                PolicyGradientAgent(device="cpu", should_save_model=False),
+                rm.calculate_for_own_score_only,
+            ),
+            PlayingAgent(RandomAgent()),
+            GameRules(),
+            8,
+            buffers,
+        )
+
+        game_overs = buffers[0].take()["game_overs"]
+        self.assertEqual(game_overs.sum(), 8)
+        self.assertTrue(game_overs[-1])
+        self.assertLessEqual(len(game_overs), sum(moves for _, moves in played))
+
+    def test_learning_needs_buffers(self):
+        """Test learning players can't learn from interleaved moves"""
+        with self.assertRaises(ValueError):
+            play_episodes_batched(
+                PlayingAgent(
+                    PolicyGradientAgent(device="cpu", should_save_model=False),
+                    rm.calculate_for_own_score_only,
+                ),
+                PlayingAgent(RandomAgent()),
+                GameRules(),
+                2,
+            )
+
+    def test_train_with_concurrent_games(self):
+        """Test training counts every game and learns from the batches"""
+        agent = DeepQLearningAgent(batch_size=8, device="cpu", should_save_model=False)
+        wins, losses, draws = train_agents(
+            PlayingAgent(agent, rm.calculate_for_own_score_only),
+            PlayingAgent(RandomAgent()),
+            GameRules(),
+            episodes=20,
+            metrics_sinks=[],
+            concurrent_games=8,
+        )
+
+        self.assertEqual(wins + losses + draws, 20)
+        self.assertGreater(len(agent.memory), 20 * 4)
+        self.assertGreater(agent.update_count, 0)
+
+    def test_profile_learn_batch(self):
+        """Test the heartbeat reports how long learn_batch took"""
+        sink = ListSink()
+        agent = DeepQLearningAgent(batch_size=8, device="cpu", should_save_model=False)
+        train_agents(
+            PlayingAgent(agent, rm.calculate_for_own_score_only),
+            PlayingAgent(RandomAgent()),
+            GameRules(),
+            episodes=20,
+            metrics_sinks=[sink],
+            profile_every=100,
+            concurrent_games=4,
+        )
+
+        self.assertIn(f"{agent.nickname} learn_batch count", sink.records[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Test cases for the checkpoints module"""
+
+import os
+import random
+import tempfile
+import unittest
+import numpy as np
+import training.reward_models_v2 as rm
+from training import checkpoints
+from training.agent_trainer import train_agents
+from training.metrics import JsonlSink
+from agents.random_agent_v2 import RandomAgent
+from agents.simple_q_learning_v2 import QLearningAgent
+from utils.play_game import PlayingAgent, GameRules
+
+
+def make_players():
+    return (
+        PlayingAgent(
+            QLearningAgent(exploration_decay=0.99, should_save_model=False),
+            rm.calculate_for_own_score_only,
+        ),
+        PlayingAgent(RandomAgent(), None),
+    )
+
+
+class TestCheckpoints(unittest.TestCase):
+    """Test cases for writing checkpoints and resuming training"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.checkpoint")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_writer_replaces_checkpoint(self):
+        """Test the last saved checkpoint is the one on disk"""
+        writer = checkpoints.CheckpointWriter(self.path)
+        writer.save({"episode": 1})
+        writer.save({"episode": 2})
+        writer.close()
+
+        self.assertEqual(checkpoints.load_checkpoint(self.path)["episode"], 2)
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+
+    def test_rng_state_round_trip(self):
+        """Test restoring the generators repeats the same numbers"""
+        state = checkpoints.get_rng_state()
+        expected = (random.random(), np.random.rand())
+        checkpoints.set_rng_state(state)
+        self.assertEqual((random.random(), np.random.rand()), expected)
+
+    def test_resume_matches_uninterrupted_run(self):
+        """Test a run resumed from a checkpoint ends where a straight run does"""
+        random.seed(0)
+        np.random.seed(0)
+        player_1, player_2 = make_players()
+        expected = train_agents(
+            player_1, player_2, GameRules(), episodes=20, metrics_sinks=[]
+        )
+        expected_model = dict(player_1.agent.model)
+
+        random.seed(0)
+        np.random.seed(0)
+        player_1, player_2 = make_players()
+        train_agents(
+            player_1,
+            player_2,
+            GameRules(),
+            episodes=10,
+            metrics_sinks=[],
+            checkpoint_path=self.path,
+            checkpoint_every=5,
+        )
+        checkpoint = checkpoints.load_checkpoint(self.path)
+        self.assertEqual(checkpoint["episode"], 10)
+
+        resumed = train_agents(
+            checkpoint["player_1"],
+            checkpoint["player_2"],
+            checkpoint["game_rules"],
+            episodes=20,
+            metrics_sinks=[],
+            resume_from=checkpoint,
+        )
+        self.assertEqual(resumed, expected)
+        self.assertEqual(dict(checkpoint["player_1"].agent.model), expected_model)
+
+    def test_resume_keeps_trainer_options(self):
+        """Test a resumed run keeps learning in batches and writing to the same sinks"""
+        random.seed(0)
+        np.random.seed(0)
+        player_1, player_2 = make_players()
+        expected = train_agents(
+            player_1, player_2, GameRules(), episodes=20, metrics_sinks=[], learn_every=5
+        )
+
+        random.seed(0)
+        np.random.seed(0)
+        player_1, player_2 = make_players()
+        metrics_path = os.path.join(self.directory.name, "metrics.jsonl")
+        train_agents(
+            player_1,
+            player_2,
+            GameRules(),
+            episodes=10,
+            metrics_sinks=[JsonlSink(metrics_path)],
+            checkpoint_path=self.path,
+            checkpoint_every=5,
+            learn_every=5,
+        )
+        self.assertEqual(checkpoints.load_checkpoint(self.path)["options"]["learn_every"], 5)
+        with open(metrics_path, encoding="utf-8") as file:
+            records = len(file.readlines())
+
+        resumed = checkpoints.resume_training(self.path, episodes=20)
+        self.assertEqual(resumed, expected)
+        with open(metrics_path, encoding="utf-8") as file:
+            self.assertGreater(len(file.readlines()), records)
+
+
+if __name__ == "__main__":
+    unittest.main()
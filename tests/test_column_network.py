@@ -0,0 +1,117 @@
+"""Test cases for the column encoder and network"""
+
+import unittest
+import numpy as np
+import torch
+from agents.column_network import ColumnEncoder, ColumnNetwork
+from agents.deep_q_learning import DeepQLearningAgent
+from agents.inference import compile_for_inference, sample_states
+from agents.policy_gradient_agent import PolicyGradientAgent
+
+
+def permute_columns(states, order):
+    permuted = states.clone()
+    permuted[:, 0:3] = states[:, order]
+    permuted[:, 3:6] = states[:, [3 + column for column in order]]
+    return permuted
+
+
+class TestColumnEncoder(unittest.TestCase):
+    """Test cases for encoding boards as column ids"""
+
+    def setUp(self):
+        self.encoder = ColumnEncoder()
+
+    def test_column_ids(self):
+        """Test every column gets one of 84 ids, the same for every order of its dice"""
+        self.assertEqual(self.encoder.column_count, 84)
+        self.assertEqual(sorted(np.unique(self.encoder.ids)), list(range(84)))
+        self.assertEqual(self.encoder.ids[0, 0, 0], 0)
+        self.assertEqual(self.encoder.ids[6, 6, 6], 83)
+        self.assertEqual(self.encoder.ids[0, 2, 5], self.encoder.ids[5, 0, 2])
+
+    def test_encode(self):
+        """Test own columns, opponent columns and dice are encoded in that order"""
+        board_state = ([[0, 0, 1], [0, 0, 0], [2, 3, 3]], [[6, 6, 6], [0, 0, 1], [0, 0, 0]])
+        state = self.encoder.encode(board_state, 4)
+
+        ids = self.encoder.ids
+        self.assertEqual(
+            state, [ids[0, 0, 1], 0, ids[2, 3, 3], 83, ids[0, 0, 1], 0, 4]
+        )
+
+    def test_smaller_dice(self):
+        """Test the ids only cover the dice values of the game"""
+        self.assertEqual(ColumnEncoder(max_dice_value=3).column_count, 20)
+
+
+class TestColumnNetwork(unittest.TestCase):
+    """Test cases for the column network"""
+
+    def setUp(self):
+        agent = DeepQLearningAgent(column_network=True, device="cpu", should_save_model=False)
+        states, self.legal_masks = sample_states(agent, games=3)
+        self.states = torch.as_tensor(states, dtype=torch.float32)
+
+    def test_permutation_equivariant(self):
+        """Test reordering the columns of a board reorders their scores"""
+        network = ColumnNetwork().eval()
+        for order in ([1, 0, 2], [2, 0, 1], [2, 1, 0]):
+            torch.testing.assert_close(
+                network(permute_columns(self.states, order)), network(self.states)[:, order]
+            )
+
+    def test_smaller_than_mlp(self):
+        """Test the column network has fewer parameters than the MLP on raw cells"""
+        column_agent = DeepQLearningAgent(column_network=True, device="cpu")
+        cell_agent = DeepQLearningAgent(device="cpu")
+
+        count = lambda agent: sum(p.numel() for p in agent.model.parameters())
+        self.assertLess(count(column_agent), count(cell_agent) / 2)
+
+    def test_policy_probabilities(self):
+        """Test the policy version returns move probabilities"""
+        probabilities = ColumnNetwork(softmax=True)(self.states)
+
+        torch.testing.assert_close(probabilities.sum(dim=1), torch.ones(len(self.states)))
+
+    def test_compiled_matches_model(self):
+        """Test the compiled copy gives the outputs of the network"""
+        network = ColumnNetwork().eval()
+        compiled = compile_for_inference(network)
+
+        self.assertIsInstance(compiled, torch.jit.ScriptModule)
+        with torch.no_grad():
+            torch.testing.assert_close(compiled(self.states), network(self.states))
+
+
+class TestAgentsColumnNetwork(unittest.TestCase):
+    """Test cases for agents using the column network"""
+
+    def test_deep_q_learns(self):
+        """Test the deep Q-learning agent stores and trains on column states"""
+        agent = DeepQLearningAgent(
+            column_network=True, batch_size=4, device="cpu", should_save_model=False
+        )
+        states, legal_masks = sample_states(agent, games=1)
+        for index in range(8):
+            agent.learn(states[index], index % 3, 1.0, states[index + 1], False)
+
+        self.assertEqual(agent.memory.states.shape[1], 7)
+        self.assertEqual(agent.update_count, 5)
+        self.assertEqual(len(agent.select_moves(states, legal_masks)), len(states))
+
+    def test_policy_gradient_learns(self):
+        """Test the policy gradient agent updates on column states"""
+        agent = PolicyGradientAgent(column_network=True, device="cpu", should_save_model=False)
+        states, legal_masks = sample_states(agent, games=1)
+        for index in range(4):
+            agent.learn(states[index], index % 3, 1.0, states[index + 1], index == 3)
+
+        self.assertEqual(agent.update_count, 1)
+        actions = agent.select_moves(states, legal_masks)
+        self.assertTrue(legal_masks[np.arange(len(states)), actions].all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Test cases for the config module"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from training import config
+from agents.simple_q_learning_v2 import QLearningAgent
+from agents.q_tables import ArrayQTable
+from training.reward_models_v2 import calculate_for_own_score_only
+
+RUN = {
+    "episodes": 5,
+    "game_rules": {"max_dice_value": 3},
+    "metrics": {"console": False},
+    "players": [
+        {
+            "agent": "q_learning",
+            "reward": "calculate_for_own_score_only",
+            "params": {"should_save_model": False, "learning_rate": 0.5},
+        },
+        {"agent": "random"},
+    ],
+}
+
+
+class TestConfig(unittest.TestCase):
+    """Test cases for loading run configs and building runs"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+        return path
+
+    def test_load_toml(self):
+        """Test the example config is valid"""
+        loaded = config.load_config("training/configs/simple_vs_random.toml")
+        self.assertEqual(loaded["players"][1]["agent"], "random")
+        self.assertEqual(loaded["checkpoint"]["every"], 1000000)
+
+    def test_rejects_invalid_configs(self):
+        """Test configs with a missing player or an unknown mode are rejected"""
+        with self.assertRaises(ValueError):
+            config.load_config(self.write("run.json", json.dumps({"players": [{}]})))
+        with self.assertRaises(ValueError):
+            config.load_config(
+                self.write("run.json", json.dumps(dict(RUN, mode="everywhere")))
+            )
+        with self.assertRaises(ValueError):
+            config.load_config(self.write("run.ini", ""))
+
+    def test_build_player(self):
+        """Test agents, tables and rewards are resolved by name"""
+        player = config.build_player(
+            {
+                "agent": "agents.simple_q_learning_v2:QLearningAgent",
+                "reward": "calculate_for_own_score_only",
+                "params": {"q_table": {"type": "array", "value_dtype": "float16"}},
+            }
+        )
+        self.assertIsInstance(player.agent, QLearningAgent)
+        self.assertIsInstance(player.agent.model, ArrayQTable)
+        self.assertIs(player.reward_func, calculate_for_own_score_only)
+
+    def test_build_reward_model(self):
+        """Test a parametrized reward model becomes its calculate_reward"""
+        reward = config.build_reward(
+            {"model": "ParametrizedRewardModel", "params": {"reward_win_amount": 10}}
+        )
+        self.assertEqual(reward.__self__.reward_win_multiplier, 10)
+
+    def test_unknown_agent(self):
+        """Test unknown agent names are reported"""
+        with self.assertRaises(ValueError):
+            config.build_player({"agent": "alpha_zero"})
+
+    def test_run(self):
+        """Test a config trains for the given episodes"""
+        loaded = config.load_config(self.write("run.json", json.dumps(RUN)))
+        wins, losses, draws = config.run(loaded, episodes=7)
+        self.assertEqual(wins + losses + draws, 7)
+
+    def test_tabular_run_does_not_import_torch(self):
+        """Test agents are only imported when a run uses them"""
+        code = (
+            "import sys; from training import config; "
+            "config.build_player({'agent': 'q_learning'}); "
+            "print('torch' in sys.modules)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(output.stdout.splitlines()[-1], "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
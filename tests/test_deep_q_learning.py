@@ -0,0 +1,145 @@
+"""Test cases for the deep Q-learning agent"""
+
+import unittest
+import numpy as np
+import torch
+from agents.deep_q_learning import DeepQLearningAgent
+
+
+def make_state(value, state_size=19):
+    return [value % 7] * state_size
+
+
+def make_agent(**kwargs):
+    return DeepQLearningAgent(
+        batch_size=4, device="cpu", should_save_model=False, **kwargs
+    )
+
+
+def make_batch(count):
+    states = np.array([make_state(value) for value in range(count)])
+    return {
+        "prev_states": states,
+        "actions": np.zeros(count, dtype=np.int8),
+        "rewards": np.arange(count, dtype=np.float32),
+        "next_states": states,
+        "game_overs": np.zeros(count, dtype=bool),
+        "winners": np.full(count, -2, dtype=np.int8),
+    }
+
+
+class TestDeepQLearningSchedule(unittest.TestCase):
+    """Test cases for how often the agent trains and updates its target network"""
+
+    def test_train_every(self):
+        """Test gradient_steps steps are taken for every train_every transitions"""
+        agent = make_agent(train_every=4, gradient_steps=2)
+        for value in range(11):
+            agent.learn(make_state(value), 1, 1.0, make_state(value + 1), False)
+
+        self.assertEqual(agent.update_count, 4)
+        self.assertEqual(agent.new_transitions, 3)
+
+    def test_train_every_batch(self):
+        """Test a batch takes the steps of all its transitions"""
+        agent = make_agent(train_every=4, gradient_steps=3)
+        agent.learn_batch(make_batch(10))
+
+        self.assertEqual(agent.update_count, 6)
+        self.assertEqual(agent.new_transitions, 2)
+
+    def test_hard_target_update(self):
+        """Test the target network is a copy of the model every target_update steps"""
+        agent = make_agent(target_update=2)
+        # takes the first step, the second one copies the model
+        agent.learn_batch(make_batch(8))
+        target = agent.target_model.fc1.weight
+        agent.gradient_step()
+        agent.gradient_step()
+
+        self.assertFalse(torch.equal(agent.model.fc1.weight, target))
+        agent.gradient_step()
+        self.assertTrue(torch.equal(agent.model.fc1.weight, target))
+        # updated in place, not replaced
+        self.assertIs(agent.target_model.fc1.weight, target)
+
+    def test_soft_target_update(self):
+        """Test the target network moves tau of the way towards the model"""
+        agent = make_agent(target_update_tau=0.25)
+        agent.learn_batch(make_batch(8))
+        target = agent.target_model.fc1.weight.detach().clone()
+
+        agent.gradient_step()
+
+        expected = target + 0.25 * (agent.model.fc1.weight.detach() - target)
+        torch.testing.assert_close(agent.target_model.fc1.weight.detach(), expected)
+
+    def test_staging_tensors_are_reused(self):
+        """Test minibatches are copied into the same tensors on every step"""
+        agent = make_agent()
+        agent.learn_batch(make_batch(8))
+        staging = agent.staging_tensors()["states"]
+
+        agent.gradient_step()
+
+        self.assertIs(agent.staging_tensors()["states"], staging)
+        self.assertEqual(staging.dtype, torch.float32)
+
+
+
+class RecordingNetwork(torch.nn.Module):
+    """Target network returning the sum of its input for every action"""
+
+    def __init__(self):
+        super().__init__()
+        self.inputs = []
+
+    def forward(self, x):
+        self.inputs.append(x.clone())
+        return x.sum(dim=1, keepdim=True).repeat(1, 3)
+
+
+class TestDeepQLearningTargets(unittest.TestCase):
+    """Test cases for the bootstrapped targets"""
+
+    def setUp(self):
+        self.next_states = torch.tensor(
+            [make_state(1), make_state(5), make_state(3), make_state(0)], dtype=torch.float32
+        )
+
+    def test_targets_per_sample(self):
+        """Test every next state gets its own highest Q-value"""
+        agent = make_agent()
+        agent.target_model = RecordingNetwork()
+
+        values = agent.next_state_values(self.next_states)
+
+        torch.testing.assert_close(values, self.next_states.sum(dim=1))
+
+    def test_expected_over_dice(self):
+        """Test next states are evaluated with every dice value in one pass and averaged"""
+        agent = make_agent(expected_dice_target=True)
+        agent.target_model = RecordingNetwork()
+
+        values = agent.next_state_values(self.next_states)
+
+        self.assertEqual(len(agent.target_model.inputs), 1)
+        evaluated = agent.target_model.inputs[0].view(4, 6, 19)
+        np.testing.assert_array_equal(evaluated[0, :, -1], np.arange(1, 7))
+        torch.testing.assert_close(evaluated[:, :, :-1], self.next_states[:, None, :-1].expand(4, 6, 18))
+        # the mean dice value, 3.5, replaces the rolled one
+        torch.testing.assert_close(values, self.next_states[:, :-1].sum(dim=1) + 3.5)
+
+    def test_learns_with_expected_dice_target(self):
+        """Test training works with the expected dice target, the column network too"""
+        for column_network in (False, True):
+            agent = make_agent(expected_dice_target=True, column_network=column_network)
+            state = make_state(1, agent.state_size)
+            for value in range(6):
+                agent.learn(state, value % 3, float(value), state, value == 5)
+
+            self.assertEqual(agent.update_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
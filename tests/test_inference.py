@@ -0,0 +1,181 @@
+"""Test cases for the inference module"""
+
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import torch
+import torch.nn as nn
+from agents.deep_q_learning import DQN, DeepQLearningAgent
+from agents.inference import (
+    InferenceCache,
+    action_agreement,
+    compile_for_inference,
+    export_quantized,
+    quantize_dynamic,
+    sample_states,
+    strip_dropout,
+)
+from agents.policy_gradient_agent import PolicyGradientAgent, PolicyNetwork
+
+
+class NotScriptable(nn.Module):
+    """Network TorchScript can't compile"""
+
+    def __init__(self):
+        super().__init__()
+        self.fc = nn.Linear(19, 3)
+        self.dropout = nn.Dropout(p=0.5)
+
+    def forward(self, x):
+        return self.dropout(self.fc(x)) * float(np.sqrt(4.0))
+
+
+class TestCompileForInference(unittest.TestCase):
+    """Test cases for compiling networks for inference"""
+
+    def setUp(self):
+        self.states = torch.rand(8, 19)
+
+    def test_strip_dropout(self):
+        """Test the copy has no dropout and leaves the model untouched"""
+        model = DQN(19, 3)
+        stripped = strip_dropout(model)
+
+        self.assertFalse(any(isinstance(m, nn.Dropout) for m in stripped.modules()))
+        self.assertTrue(any(isinstance(m, nn.Dropout) for m in model.modules()))
+        self.assertTrue(model.training)
+        model.eval()
+        torch.testing.assert_close(stripped(self.states), model(self.states))
+
+    def test_compiled_matches_model(self):
+        """Test compiled networks give the outputs of the model in eval mode"""
+        for model in (DQN(19, 3), PolicyNetwork(19, 3)):
+            compiled = compile_for_inference(model)
+            self.assertIsInstance(compiled, torch.jit.ScriptModule)
+            model.eval()
+            with torch.no_grad():
+                torch.testing.assert_close(
+                    compiled(self.states), model(self.states), atol=1e-5, rtol=1e-4
+                )
+
+    def test_eager_fallback(self):
+        """Test a network TorchScript can't handle is used in eager mode"""
+        model = NotScriptable()
+        module = compile_for_inference(model)
+
+        self.assertNotIsInstance(module, torch.jit.ScriptModule)
+        self.assertIsInstance(module.dropout, nn.Identity)
+
+    def test_cache(self):
+        """Test the copy is only rebuilt for a new version and isn't pickled"""
+        model = DQN(19, 3)
+        cache = InferenceCache()
+        first = cache.get(model, 0)
+
+        self.assertIs(cache.get(model, 0), first)
+        self.assertIsNot(cache.get(model, 1), first)
+        self.assertIsNone(pickle.loads(pickle.dumps(cache)).module)
+
+
+class TestAgentsCompiledInference(unittest.TestCase):
+    """Test cases for agents picking moves with compiled networks"""
+
+    def setUp(self):
+        self.observations = np.random.randint(0, 7, (32, 19))
+        self.legal_masks = np.ones((32, 3), dtype=bool)
+
+    def test_deep_q_moves_match(self):
+        """Test greedy moves are the same with and without compiling"""
+        agent = DeepQLearningAgent(
+            exploration_rate=0.0, device="cpu", should_save_model=False
+        )
+        eager = agent.select_moves(self.observations, self.legal_masks)
+        agent.compiled_inference = True
+        compiled = agent.select_moves(self.observations, self.legal_masks)
+
+        np.testing.assert_array_equal(compiled, eager)
+        self.assertEqual(agent.inference_cache.version, agent.update_count)
+
+    def test_policy_gradient_agent_pickles(self):
+        """Test an agent that picked moves with a compiled network can be pickled"""
+        agent = PolicyGradientAgent(
+            compiled_inference=True, device="cpu", should_save_model=False
+        )
+        agent.select_moves(self.observations, self.legal_masks)
+
+        restored = pickle.loads(pickle.dumps(agent))
+
+        self.assertEqual(len(restored.select_moves(self.observations, self.legal_masks)), 32)
+
+
+class TestQuantization(unittest.TestCase):
+    """Test cases for int8 exports of the networks"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "deep_q_int8.pkl")
+        self.agent = DeepQLearningAgent(
+            exploration_rate=0.0, device="cpu", should_save_model=False
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sample_states(self):
+        """Test sampled states come with the moves available in them"""
+        states, legal_masks = sample_states(self.agent, games=2)
+
+        self.assertEqual(states.shape[1], 19)
+        self.assertEqual(legal_masks.shape, (len(states), 3))
+        self.assertTrue(legal_masks.any(axis=1).all())
+
+    def test_quantized_agrees_with_model(self):
+        """Test the int8 copy picks nearly the same moves as the float network"""
+        quantized = quantize_dynamic(self.agent.model)
+        states, legal_masks = sample_states(self.agent, games=10)
+
+        self.assertTrue(quantized.quantized)
+        self.assertFalse(hasattr(self.agent.model, "quantized"))
+        agreement = action_agreement(
+            strip_dropout(self.agent.model), quantized, states, legal_masks
+        )
+        self.assertGreater(agreement, 0.95)
+
+    def test_export_and_load(self):
+        """Test an exported int8 network is loaded with load_model and picks moves on the CPU"""
+        export_quantized(self.agent, self.path, games=10, min_agreement=0.9)
+        agent = DeepQLearningAgent(
+            exploration_rate=0.0, device="cpu", should_save_model=False
+        )
+        agent.device = "cuda"
+
+        agent.load_model(self.path)
+
+        self.assertEqual(agent.device, "cpu")
+        states, legal_masks = sample_states(agent, games=1)
+        self.assertEqual(len(agent.select_moves(states, legal_masks)), len(states))
+
+    def test_load_drops_compiled_copy(self):
+        """Test loading a model doesn't keep picking moves with the old compiled network"""
+        export_quantized(self.agent, self.path, games=10, min_agreement=0.9)
+        self.agent.compiled_inference = True
+        states, legal_masks = sample_states(self.agent, games=1)
+        self.agent.select_moves(states, legal_masks)
+        old_module = self.agent.inference_cache.module
+
+        self.agent.load_model(self.path)
+        self.agent.select_moves(states, legal_masks)
+
+        self.assertIsNot(self.agent.inference_cache.module, old_module)
+
+    def test_export_checks_agreement(self):
+        """Test a copy picking different moves than the agent isn't saved"""
+        with self.assertRaises(ValueError):
+            export_quantized(self.agent, self.path, games=2, min_agreement=1.01)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Test cases for the metrics module"""
+
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from training.agent_trainer import train_agents
+from training.metrics import TrainingMetrics, JsonlSink, CsvSink
+from agents.random_agent_v2 import RandomAgent
+from utils.play_game import PlayingAgent, GameRules
+
+
+class ListSink:
+    """Sink keeping records in memory"""
+
+    def __init__(self):
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class TestTrainingMetrics(unittest.TestCase):
+    """Test cases for the TrainingMetrics class"""
+
+    def test_counters_gauges_and_rates(self):
+        """Test a published record holds counters, rates and gauges"""
+        sink = ListSink()
+        metrics = TrainingMetrics([sink])
+        metrics.increment("episodes played")
+        metrics.increment("moves", 20)
+        metrics.set_gauge("exploration rate", 0.5)
+        metrics.set_counter("gradient steps", 7)
+        metrics.publish(episode=1)
+        metrics.close()
+
+        record = sink.records[0]
+        self.assertEqual(record["episode"], 1)
+        self.assertEqual(record["moves"], 20)
+        self.assertEqual(record["exploration rate"], 0.5)
+        self.assertIn("moves per second", record)
+        self.assertEqual(record["gradient steps"], 7)
+        self.assertIn("gradient steps per second", record)
+
+    def test_rolling_win_rate(self):
+        """Test the win rate only looks at the last window of games"""
+        metrics = TrainingMetrics([], window=4)
+        for result in (1, 1, 1, 1, -1, 0):
+            metrics.record_result(result)
+        self.assertEqual(metrics.rolling_win_rate(), 0.5)
+        metrics.close()
+
+    def test_file_sinks(self):
+        """Test records are written as JSON lines and CSV"""
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl_path = os.path.join(directory, "metrics.jsonl")
+            csv_path = os.path.join(directory, "metrics.csv")
+            metrics = TrainingMetrics([JsonlSink(jsonl_path), CsvSink(csv_path)])
+            metrics.increment("episodes played")
+            metrics.set_text("board", ["| 1 |   |   |"])
+            metrics.publish(episode=0)
+            metrics.publish(episode=1)
+            metrics.close()
+
+            with open(jsonl_path, encoding="utf-8") as file:
+                records = [json.loads(line) for line in file]
+            with open(csv_path, encoding="utf-8") as file:
+                lines = file.read().splitlines()
+
+        self.assertEqual([record["episode"] for record in records], [0, 1])
+        self.assertEqual(records[0]["text"]["board"], ["| 1 |   |   |"])
+        self.assertEqual(len(lines), 3)
+        self.assertIn("episodes played", lines[0])
+
+    def test_csv_sink_pickle(self):
+        """Test a CSV sink loaded from a pickle appends rows under the same header"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.csv")
+            sink = CsvSink(path)
+            sink.write({"episode": 0, "moves": 10})
+            state = pickle.dumps(sink)
+            sink.close()
+
+            sink = pickle.loads(state)
+            sink.write({"episode": 1, "moves": 20, "loss": 0.5})
+            sink.close()
+            with open(path, encoding="utf-8") as file:
+                lines = file.read().splitlines()
+
+        self.assertEqual(lines, ["episode,moves", "0,10", "1,20"])
+
+    def test_csv_sink_has_every_result(self):
+        """Test the columns of a training run hold the wins of both players and draws"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.csv")
+            train_agents(
+                PlayingAgent(RandomAgent("first"), None),
+                PlayingAgent(RandomAgent("second"), None),
+                GameRules(),
+                episodes=5,
+                metrics_sinks=[CsvSink(path)],
+            )
+            with open(path, encoding="utf-8") as file:
+                header = file.readline().strip().split(",")
+
+        for name in ("first wins", "second wins", "draws"):
+            self.assertIn(name, header)
+
+
+if __name__ == "__main__":
+    unittest.main()
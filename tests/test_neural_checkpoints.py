@@ -0,0 +1,117 @@
+"""Test cases for saving and loading neural agents"""
+
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+import torch
+from agents.deep_q_learning import DeepQLearningAgent
+from agents.policy_gradient_agent import PolicyGradientAgent
+
+
+def make_deep_q(**kwargs):
+    return DeepQLearningAgent(batch_size=4, device="cpu", **kwargs)
+
+
+def train(agent, moves=12):
+    for value in range(moves):
+        state = [value % 7] * 19
+        agent.learn(state, value % 3, float(value), state, value % 5 == 0)
+
+
+def assert_state_dicts_equal(test, first, second):
+    test.assertEqual(first.keys(), second.keys())
+    for name in first:
+        torch.testing.assert_close(first[name], second[name], rtol=0, atol=0)
+
+
+class TestNeuralCheckpoints(unittest.TestCase):
+    """Test cases for checkpoints of the deep Q-learning and policy gradient agents"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "agent.pkl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_deep_q_round_trip(self):
+        """Test a loaded agent continues training exactly like the saved one"""
+        agent = make_deep_q(exploration_decay=0.9)
+        train(agent)
+        agent.save_model(self.path)
+        loaded = make_deep_q(exploration_decay=0.9)
+        loaded.load_model(self.path)
+
+        assert_state_dicts_equal(self, loaded.model.state_dict(), agent.model.state_dict())
+        assert_state_dicts_equal(
+            self, loaded.target_model.state_dict(), agent.target_model.state_dict()
+        )
+        self.assertEqual(loaded.exploration_rate, agent.exploration_rate)
+        self.assertEqual(loaded.update_count, agent.update_count)
+        self.assertEqual(len(loaded.memory), 0)
+
+        # same replay memory and random numbers, the next step has to match
+        loaded.memory = agent.memory
+        for trained in (agent, loaded):
+            torch.manual_seed(0)
+            np.random.seed(0)
+            trained.gradient_step()
+        assert_state_dicts_equal(self, loaded.model.state_dict(), agent.model.state_dict())
+
+    def test_replay_is_saved(self):
+        """Test the replay memory is saved on request and can be added to after loading"""
+        agent = make_deep_q(save_replay=True, prioritized_replay=True, memory_size=32)
+        train(agent)
+        agent.save_model(self.path)
+        loaded = make_deep_q(prioritized_replay=True)
+        loaded.load_model(self.path)
+
+        self.assertEqual(loaded.memory.capacity, 32)
+        self.assertEqual(len(loaded.memory), 12)
+        np.testing.assert_array_equal(loaded.memory.states, agent.memory.states)
+        self.assertEqual(loaded.memory.tree.total(), agent.memory.tree.total())
+        loaded.learn([1] * 19, 0, 1.0, [2] * 19, False)
+        self.assertEqual(len(loaded.memory), 13)
+
+    def test_policy_gradient_round_trip(self):
+        """Test the policy and optimizer of the policy gradient agent are restored"""
+        agent = PolicyGradientAgent(device="cpu")
+        train(agent)
+        agent.save_model(self.path)
+        loaded = PolicyGradientAgent(device="cpu")
+        loaded.load_model(self.path)
+
+        assert_state_dicts_equal(self, loaded.model.state_dict(), agent.model.state_dict())
+        self.assertEqual(loaded.update_count, agent.update_count)
+        self.assertEqual(
+            loaded.optimizer.state_dict()["state"].keys(),
+            agent.optimizer.state_dict()["state"].keys(),
+        )
+
+    def test_legacy_pickled_model(self):
+        """Test models saved as pickled modules are still loaded"""
+        agent = make_deep_q()
+        with open(self.path, "wb") as file:
+            pickle.dump(agent.model, file)
+        loaded = make_deep_q()
+        loaded.load_model(self.path)
+
+        assert_state_dicts_equal(self, loaded.model.state_dict(), agent.model.state_dict())
+
+    def test_other_agent_refused(self):
+        """Test a checkpoint of another kind of agent isn't loaded"""
+        PolicyGradientAgent(device="cpu").save_model(self.path)
+        with self.assertRaises(ValueError):
+            make_deep_q().load_model(self.path)
+
+    def test_missing_file(self):
+        """Test a missing file leaves the agent untrained"""
+        agent = make_deep_q()
+        agent.load_model(os.path.join(self.directory.name, "missing.pkl"))
+        self.assertEqual(agent.update_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
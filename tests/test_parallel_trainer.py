@@ -0,0 +1,209 @@
+"""Test cases for the parallel_trainer module"""
+
+import unittest
+import numpy as np
+import training.reward_models_v2 as rm
+from training import parallel_trainer
+from agents.random_agent_v2 import RandomAgent
+from agents.simple_q_learning_v2 import QLearningAgent
+from agents.q_tables import ArrayQTable
+from utils.play_game import PlayingAgent, GameRules
+
+
+class CrashingAgent(RandomAgent):
+    """Agent that fails on its first move"""
+
+    def select_move(self, game_engine):
+        raise ValueError("crashed")
+
+
+class TestHogwildTraining(unittest.TestCase):
+    """Test cases for train_agents_hogwild"""
+
+    def test_train_agents_hogwild(self):
+        """Test workers share the table and counters add up"""
+        player_1 = PlayingAgent(
+            QLearningAgent(exploration_decay=0.999, should_save_model=False),
+            rm.calculate_for_own_score_only,
+        )
+        player_2 = PlayingAgent(RandomAgent(), None)
+
+        wins, losses, draws = parallel_trainer.train_agents_hogwild(
+            player_1,
+            player_2,
+            GameRules(),
+            episodes=41,
+            workers=2,
+            table_capacity=1 << 14,
+            sync_every=10,
+            heartbeat_seconds=1,
+        )
+
+        self.assertEqual(wins + losses + draws, 41)
+        self.assertIsInstance(player_1.agent.model, dict)
+        self.assertGreater(len(player_1.agent.model), 0)
+        self.assertLess(player_1.agent.exploration_rate, 1.0)
+
+    def test_worker_crash_raises(self):
+        """Test a failed worker isn't reported as a finished run"""
+        player_1 = PlayingAgent(
+            QLearningAgent(should_save_model=False),
+            rm.calculate_for_own_score_only,
+        )
+        player_2 = PlayingAgent(CrashingAgent(), None)
+
+        with self.assertRaises(RuntimeError):
+            parallel_trainer.train_agents_hogwild(
+                player_1,
+                player_2,
+                GameRules(),
+                episodes=10,
+                workers=2,
+                table_capacity=1 << 14,
+                heartbeat_seconds=1,
+            )
+        self.assertIsInstance(player_1.agent.model, dict)
+
+
+class TestShardedTraining(unittest.TestCase):
+    """Test cases for sharded training and its merge step"""
+
+    def test_tracking_table_delta(self):
+        """Test the tracking table reports summed updates and visits"""
+        table = parallel_trainer.TrackingQTable({1: [0.0, 0.0, 0.0]})
+        values = table.get(1)
+        values[0] += 1.0
+        table[1] = values
+        values = table.get(1)
+        values[0] += 0.5
+        table[1] = values
+        table[2] = [0.0, 2.0, 0.0]
+
+        states, updates, visits = table.take_delta()
+        self.assertEqual(states.tolist(), [1, 2])
+        self.assertEqual(updates.tolist(), [[1.5, 0.0, 0.0], [0.0, 2.0, 0.0]])
+        self.assertEqual(visits.tolist(), [2, 1])
+        self.assertEqual(len(table.take_delta()[0]), 0)
+
+    def test_merge_deltas_is_visit_weighted(self):
+        """Test updates of a state are averaged by visit counts"""
+        for table in ({}, ArrayQTable()):
+            table[1] = [1.0, 0.0, 0.0]
+            deltas = [
+                (
+                    np.array([1, 2]),
+                    np.array([[3.0, 0.0, 0.0], [0.0, 1.0, 0.0]]),
+                    np.array([3, 1], dtype=np.uint32),
+                ),
+                (
+                    np.array([1]),
+                    np.array([[-1.0, 0.0, 0.0]]),
+                    np.array([1], dtype=np.uint32),
+                ),
+            ]
+
+            states, values = parallel_trainer.merge_deltas(table, deltas)
+
+            self.assertEqual(states.tolist(), [1, 2])
+            self.assertEqual(values.tolist(), [[3.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+            self.assertEqual(table[1], [3.0, 0.0, 0.0])
+            self.assertEqual(table[2], [0.0, 1.0, 0.0])
+
+    def test_train_agents_sharded(self):
+        """Test workers merge into the player's table"""
+        player_1 = PlayingAgent(
+            QLearningAgent(q_table=ArrayQTable(), should_save_model=False),
+            rm.calculate_for_own_score_only,
+        )
+        player_2 = PlayingAgent(RandomAgent(), None)
+
+        wins, losses, draws = parallel_trainer.train_agents_sharded(
+            player_1,
+            player_2,
+            GameRules(),
+            episodes=41,
+            workers=2,
+            merge_every=10,
+            seed=0,
+        )
+
+        self.assertEqual(wins + losses + draws, 41)
+        self.assertIsInstance(player_1.agent.model, ArrayQTable)
+        self.assertGreater(len(player_1.agent.model), 0)
+
+    def test_worker_crash_stops_merging(self):
+        """Test the merging process raises instead of waiting for a worker that died"""
+        player_1 = PlayingAgent(
+            QLearningAgent(q_table=ArrayQTable(), should_save_model=False),
+            rm.calculate_for_own_score_only,
+        )
+        player_2 = PlayingAgent(CrashingAgent(), None)
+
+        with self.assertRaises(RuntimeError):
+            parallel_trainer.train_agents_sharded(
+                player_1, player_2, GameRules(), episodes=10, workers=2, merge_every=5
+            )
+
+
+class TestActorLearnerTraining(unittest.TestCase):
+    """Test cases for actor-learner training"""
+
+    def test_actor_batch_round_trip(self):
+        """Test transitions recorded by an actor are learned by the learner"""
+        learner = QLearningAgent(learning_rate=1, discount_factor=0)
+        actor = parallel_trainer.ActorAgent(QLearningAgent())
+        actor.learn(123, 2, 5.0, 456, False)
+        actor.learn(456, 0, -1.0, 789, True, winner=1)
+
+        batch = actor.take_batch()
+        self.assertEqual(batch["actions"].dtype, np.int8)
+        self.assertEqual(len(actor), 0)
+
+        learner.learn_batch(batch)
+        self.assertEqual(learner.model[123], [0.0, 0.0, 5.0])
+        self.assertEqual(learner.model[456], [-1.0, 0.0, 0.0])
+
+    def test_train_agents_actor_learner(self):
+        """Test actors stream all their games to the learner"""
+        player_1 = PlayingAgent(
+            QLearningAgent(should_save_model=False),
+            rm.calculate_for_own_score_only,
+        )
+        player_2 = PlayingAgent(RandomAgent(), None)
+
+        wins, losses, draws = parallel_trainer.train_agents_actor_learner(
+            player_1,
+            player_2,
+            GameRules(),
+            episodes=41,
+            actors=2,
+            batch_size=50,
+            publish_every=100,
+            table_capacity=1 << 14,
+        )
+
+        self.assertEqual(wins + losses + draws, 41)
+        self.assertIsInstance(player_1.agent.model, dict)
+        self.assertGreater(len(player_1.agent.model), 0)
+
+    def test_actor_crash_stops_learner(self):
+        """Test the learner raises instead of waiting for an actor that died"""
+        player_1 = PlayingAgent(
+            QLearningAgent(should_save_model=False),
+            rm.calculate_for_own_score_only,
+        )
+        player_2 = PlayingAgent(CrashingAgent(), None)
+
+        with self.assertRaises(RuntimeError):
+            parallel_trainer.train_agents_actor_learner(
+                player_1,
+                player_2,
+                GameRules(),
+                episodes=10,
+                actors=1,
+                table_capacity=1 << 14,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Test cases for the profiling module"""
+
+import unittest
+from training.profiling import PhaseTimer, Stopwatch
+
+
+class TestPhaseTimer(unittest.TestCase):
+    """Test cases for the PhaseTimer class"""
+
+    def test_sample(self):
+        """Test only every n-th game is sampled"""
+        timer = PhaseTimer(sample_every=3)
+        samples = [timer.sample() for _ in range(6)]
+        self.assertEqual(samples, [False, False, True, False, False, True])
+
+    def test_report(self):
+        """Test timings are summarised per agent and phase and reset"""
+        timer = PhaseTimer()
+        for nanoseconds in (1000, 1000, 1000, 100 * 1000):
+            timer.add("Wild Card", "select_move", nanoseconds)
+
+        report = timer.report()[("Wild Card", "select_move")]
+        self.assertEqual(report["count"], 4)
+        self.assertEqual(report["mean"], 25.75)
+        # 1000ns falls in the bucket up to 1024ns
+        self.assertEqual(report["p50"], 1.024)
+        self.assertEqual(report["p99"], 131.072)
+        self.assertEqual(timer.report(), {})
+
+    def test_stopwatch(self):
+        """Test laps are recorded for consecutive phases"""
+        timer = PhaseTimer()
+        stopwatch = Stopwatch(timer, "Cell")
+        stopwatch.lap("select_move")
+        stopwatch.lap("do_move")
+        self.assertEqual(
+            sorted(timer.report()), [("Cell", "do_move"), ("Cell", "select_move")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+"""Test cases for the q_tables module"""
+
+import os
+import pickle
+import tempfile
+import unittest
+from agents.q_tables import TieredQTable, ArrayQTable, SharedQTable, policy_agreement
+
+
+class TestTieredQTable(unittest.TestCase):
+    """Test cases for the TieredQTable class"""
+
+    def setUp(self):
+        """Set up a table with a tiny cache so evictions happen quickly"""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "q_table.sqlite")
+        self.table = TieredQTable(self.path, cache_size=2)
+
+    def tearDown(self):
+        self.table.close()
+        self.directory.cleanup()
+
+    def test_get_missing_state(self):
+        """Test unknown states return the default"""
+        self.assertIsNone(self.table.get(123))
+        self.assertNotIn(123, self.table)
+        with self.assertRaises(KeyError):
+            self.table[123]
+
+    def test_evicted_states_are_read_back(self):
+        """Test states that fell out of the cache are still available"""
+        for state in range(1, 6):
+            self.table[state] = [float(state), 0.0, -1.0]
+
+        self.assertEqual(len(self.table), 5)
+        self.assertEqual(self.table.stats()["states in memory"], 2)
+        self.assertEqual(self.table[1], [1.0, 0.0, -1.0])
+
+    def test_overwrite_does_not_grow_table(self):
+        """Test updating a known state does not count it twice"""
+        self.table[1] = [1.0, 0.0, 0.0]
+        self.table[2] = [2.0, 0.0, 0.0]
+        self.table[3] = [3.0, 0.0, 0.0]
+        self.table[1] = [4.0, 0.0, 0.0]
+
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(self.table[1], [4.0, 0.0, 0.0])
+
+    def test_hit_rate(self):
+        """Test cache hits and misses are counted"""
+        self.table[1] = [1.0, 0.0, 0.0]
+        self.table.get(1)
+        self.table.get(2)
+        self.assertEqual(self.table.stats()["cache hit rate"], 0.5)
+
+    def test_pickle_round_trip(self):
+        """Test pickling keeps the states on disk and reopens the table"""
+        for state in range(1, 6):
+            self.table[state] = [float(state), 0.0, 0.0]
+
+        restored = pickle.loads(pickle.dumps(self.table))
+        self.assertEqual(len(restored), 5)
+        self.assertEqual(dict(restored.items())[5], [5.0, 0.0, 0.0])
+        restored.close()
+
+
+class TestArrayQTable(unittest.TestCase):
+    """Test cases for the ArrayQTable class"""
+
+    def test_set_and_get(self):
+        """Test values are stored per state"""
+        table = ArrayQTable(initial_capacity=2)
+        for state in range(1, 6):
+            table[state] = [float(state), 0.5, -1.0]
+
+        self.assertEqual(len(table), 5)
+        self.assertEqual(table[3], [3.0, 0.5, -1.0])
+        self.assertIsNone(table.get(6))
+        self.assertNotIn(6, table)
+
+    def test_visit_counter_saturates(self):
+        """Test visit counters stop at the max of their dtype"""
+        table = ArrayQTable(visit_counter="uint16")
+        table._visits[:] = 65534
+        table[1] = [0.0, 0.0, 0.0]
+        table[1] = [0.0, 0.0, 0.0]
+        self.assertEqual(table.visits(1), 65535)
+
+    def test_cap_requires_visit_counter(self):
+        """Test a memory cap without visit counts is rejected"""
+        with self.assertRaises(ValueError):
+            ArrayQTable(max_states=10)
+
+    def test_evicts_coldest_states(self):
+        """Test the least visited states are dropped when the cap is reached"""
+        table = ArrayQTable(visit_counter="uint32", max_states=4, eviction_fraction=0.5)
+        for state in range(1, 5):
+            for _ in range(state):
+                table[state] = [float(state), 0.0, 0.0]
+
+        table[5] = [5.0, 0.0, 0.0]
+
+        self.assertEqual(sorted(table.keys()), [3, 4, 5])
+        self.assertEqual(table.evicted, 2)
+        self.assertEqual(table.coverage_retained, 7 / 10)
+        # survivors are aged
+        self.assertEqual(table.visits(4), 2)
+        self.assertEqual(table[4], [4.0, 0.0, 0.0])
+
+    def test_memory_limit(self):
+        """Test the memory limit is converted into a state cap"""
+        table = ArrayQTable(visit_counter="uint16", memory_limit_mb=1)
+        self.assertEqual(table.max_states, 1024 * 1024 // table.bytes_per_state())
+
+
+class TestQuantizedArrayQTable(unittest.TestCase):
+    """Test cases for ArrayQTable with float16 and int8 values"""
+
+    def test_int8_requires_scale(self):
+        """Test int8 storage can't be used without a scale"""
+        with self.assertRaises(ValueError):
+            ArrayQTable(value_dtype="int8")
+
+    def test_int8_round_trip(self):
+        """Test values on the int8 grid are stored exactly"""
+        table = ArrayQTable(value_dtype="int8", value_scale=0.5)
+        table[1] = [1.5, -2.0, 63.5]
+        self.assertEqual(table[1], [1.5, -2.0, 63.5])
+
+    def test_int8_clips_to_range(self):
+        """Test values outside of the scale are clipped"""
+        table = ArrayQTable(value_dtype="int8", value_scale=1)
+        table[1] = [1000.0, -1000.0, 0.0]
+        self.assertEqual(table[1], [127.0, -127.0, 0.0])
+
+    def test_small_updates_survive_rounding(self):
+        """Test steps smaller than the storage precision accumulate on average"""
+        for table in (
+            ArrayQTable(value_dtype="float16", seed=0),
+            ArrayQTable(value_dtype="int8", value_scale=0.1, seed=0),
+        ):
+            table[1] = [10.0, 0.0, 0.0]
+            for _ in range(2000):
+                values = table[1]
+                values[0] += 0.001
+                table[1] = values
+            self.assertAlmostEqual(table[1][0], 12.0, delta=0.3)
+
+    def test_validate_policy_agreement(self):
+        """Test validation mode counts writes whose best action rounding flips"""
+        table = ArrayQTable(value_dtype="int8", value_scale=1, validate=True, seed=0)
+        # whole steps are stored exactly
+        table[1] = [0.0, 0.0, 5.0]
+        # 1e-9 of a step rounds up once in a billion writes, the tie picks action 0
+        table[2] = [0.0, 1e-9, 0.0]
+        self.assertEqual(table.policy_agreement(), 0.5)
+        self.assertEqual(table.stats()["policy agreement before rounding"], 0.5)
+
+    def test_policy_agreement_between_tables(self):
+        """Test comparing a table with a baseline table"""
+        baseline = {1: [1.0, 0.0, 0.0], 2: [0.0, 1.0, 0.0]}
+        table = ArrayQTable(value_dtype="float16")
+        table[1] = [1.0, 0.0, 0.0]
+        table[2] = [1.0, 0.0, 0.0]
+        self.assertEqual(policy_agreement(table, baseline), 0.5)
+
+
+class TestSharedQTable(unittest.TestCase):
+    """Test cases for the SharedQTable class"""
+
+    def setUp(self):
+        self.table = SharedQTable(capacity=16, max_load=0.5)
+
+    def tearDown(self):
+        self.table.close()
+
+    def test_memory_size(self):
+        """Test each slot takes an int64 key and float32 values"""
+        self.assertEqual(self.table._memory.size, 16 * (8 + 3 * 4))
+
+    def test_set_and_get(self):
+        """Test values are stored per state"""
+        self.table[123] = [1.0, 2.0, 3.0]
+        self.assertEqual(self.table[123], [1.0, 2.0, 3.0])
+        self.assertIsNone(self.table.get(124))
+        self.assertEqual(len(self.table), 1)
+
+    def test_attached_copy_shares_memory(self):
+        """Test unpickled tables see and make the same updates"""
+        attached = pickle.loads(pickle.dumps(self.table))
+        attached[5] = [0.5, 0.0, 0.0]
+        self.assertEqual(self.table[5], [0.5, 0.0, 0.0])
+        attached.close()
+
+    def test_drops_states_when_full(self):
+        """Test new states are dropped once the table reaches its max load"""
+        for state in range(1, 12):
+            self.table[state] = [float(state), 0.0, 0.0]
+        self.assertEqual(len(self.table), 8)
+        self.assertEqual(self.table.dropped, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,242 @@
+"""Test cases for the replay_buffers module"""
+
+import sys
+import unittest
+import numpy as np
+from agents.replay_buffers import (
+    ColumnPermutations,
+    PrioritizedReplayBuffer,
+    ReplayBuffer,
+    SumTree,
+)
+from agents.deep_q_learning import DeepQLearningAgent
+
+
+def make_state(value, state_size=19):
+    return [value] * state_size
+
+
+class TestReplayBuffer(unittest.TestCase):
+    """Test cases for the ring replay buffer"""
+
+    def test_add_overwrites_oldest(self):
+        """Test the buffer keeps the last capacity transitions"""
+        buffer = ReplayBuffer(3, 19)
+        for value in range(5):
+            buffer.add(make_state(value), value % 3, float(value), make_state(6), False)
+
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(sorted(buffer.states[:, 0].tolist()), [2, 3, 4])
+        self.assertEqual(buffer.position, 2)
+
+    def test_add_batch_wraps_around(self):
+        """Test rows added at once wrap around the end of the buffer"""
+        buffer = ReplayBuffer(4, 2)
+        buffer.add([9, 9], 0, 0.0, [9, 9], False)
+        states = np.arange(10).reshape(5, 2)
+
+        indices = buffer.add_batch(
+            states, np.zeros(5), np.arange(5), states, np.ones(5, dtype=bool)
+        )
+
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(indices.tolist(), [1, 2, 3, 0])
+        self.assertEqual(sorted(buffer.rewards.tolist()), [1.0, 2.0, 3.0, 4.0])
+        np.testing.assert_array_equal(buffer.states[buffer.rewards == 4.0], [[8, 9]])
+
+    def test_sample(self):
+        """Test sampled rows only come from stored transitions"""
+        buffer = ReplayBuffer(100, 19)
+        for value in range(10):
+            buffer.add(make_state(value), 1, float(value), make_state(value), True)
+
+        batch = buffer.get(buffer.sample_indices(64))
+
+        self.assertEqual(batch["states"].shape, (64, 19))
+        self.assertEqual(batch["states"].dtype, np.uint8)
+        np.testing.assert_array_equal(batch["states"][:, 0], batch["rewards"])
+        self.assertTrue(batch["dones"].all())
+
+    def test_memory_per_transition(self):
+        """Test a stored transition takes a fraction of a tuple of lists"""
+        buffer = ReplayBuffer(10, 19)
+        state = make_state(3)
+        as_tuple = (
+            sys.getsizeof((state, 1, 0.5, state, False))
+            + sys.getsizeof(state) * 2
+            + sys.getsizeof(0.5)
+        )
+
+        self.assertLess(buffer.bytes_per_transition() * 10, as_tuple)
+
+
+class TestSumTree(unittest.TestCase):
+    """Test cases for the sum tree of priorities"""
+
+    def test_update_keeps_sums(self):
+        """Test the root holds the sum of all leaves after updates"""
+        tree = SumTree(5)
+        tree.update([0, 1, 2, 3, 4], [1.0, 2.0, 3.0, 4.0, 5.0])
+        tree.update([1, 1, 4], [0.5, 0.5, 1.0])
+
+        self.assertEqual(tree.total(), 9.5)
+        np.testing.assert_array_equal(tree.get([1, 4]), [0.5, 1.0])
+
+    def test_find(self):
+        """Test values are mapped to the leaf where the running sum passes them"""
+        tree = SumTree(4)
+        tree.update([0, 1, 2, 3], [1.0, 0.0, 2.0, 1.0])
+
+        self.assertEqual(tree.find([0.5, 1.0, 1.5, 2.9, 3.5, 4.0]).tolist(), [0, 0, 2, 2, 3, 3])
+
+
+class TestPrioritizedReplayBuffer(unittest.TestCase):
+    """Test cases for the prioritized replay buffer"""
+
+    def setUp(self):
+        self.buffer = PrioritizedReplayBuffer(8, 2, alpha=1.0, beta=0.5, epsilon=0.0)
+        states = np.zeros((8, 2))
+        self.buffer.add_batch(
+            states, np.zeros(8), np.arange(8), states, np.zeros(8, dtype=bool)
+        )
+
+    def test_new_transitions_get_max_priority(self):
+        """Test unseen transitions are sampled as often as the most surprising ones"""
+        self.buffer.update_priorities(np.arange(8), np.full(8, 0.1))
+        self.buffer.update_priorities(np.array([0]), np.array([3.0]))
+        index = self.buffer.add([1, 1], 0, 0.0, [1, 1], False)
+
+        np.testing.assert_allclose(self.buffer.tree.get([0, index]), [3.0, 3.0])
+
+    def test_samples_by_priority(self):
+        """Test a transition with most of the priority is drawn most of the time"""
+        self.buffer.update_priorities(np.arange(8), np.full(8, 0.01))
+        self.buffer.update_priorities(np.array([5]), np.array([10.0]))
+
+        indices = self.buffer.sample_indices(1000)
+
+        self.assertGreater(np.mean(indices == 5), 0.95)
+
+    def test_partly_filled_buffer(self):
+        """Test a value rounded past the total still lands on a filled row"""
+        buffer = PrioritizedReplayBuffer(8, 2, alpha=1.0, beta=0.5, epsilon=0.0)
+        for value in range(3):
+            buffer.add([value, value], 0, 0.0, [value, value], False)
+        total = buffer.tree.total()
+
+        indices = buffer.tree.find([0.0, np.nextafter(total, np.inf), total * 2])
+
+        self.assertTrue((indices < 3).all())
+        self.assertTrue(np.isfinite(buffer.importance_weights(indices)).all())
+
+    def test_importance_weights(self):
+        """Test rarely drawn transitions get the largest weights and beta is annealed"""
+        self.buffer.update_priorities(np.arange(8), np.array([1, 1, 1, 1, 1, 1, 1, 4.0]))
+
+        weights = self.buffer.importance_weights(np.array([0, 7]))
+
+        np.testing.assert_allclose(weights, [1.0, 0.5])
+        self.assertGreater(self.buffer.beta, 0.5)
+
+
+class TestColumnPermutations(unittest.TestCase):
+    """Test cases for reordering the columns of sampled transitions"""
+
+    def make_batch(self, state_size, cells):
+        # every cell holds 10 * side + column, the dice is 99
+        columns = np.repeat(np.arange(3), cells)
+        state = np.concatenate((columns, columns + 10, [99])).astype(np.uint8)
+        states = np.tile(state, (600, 1))
+        self.assertEqual(states.shape[1], state_size)
+        return {
+            "states": states,
+            "actions": np.tile(np.arange(3, dtype=np.int8), 200),
+            "rewards": np.arange(600, dtype=np.float32),
+            "next_states": states + 1,
+            "dones": np.zeros(600, dtype=bool),
+        }
+
+    def test_both_sides_reordered_together(self):
+        """Test own and opponent columns move together and the dice stays"""
+        for state_size, cells in ((19, 3), (7, 1)):
+            mini_batch = self.make_batch(state_size, cells)
+            permuted = ColumnPermutations(state_size).apply(mini_batch)
+
+            own = permuted["states"][:, : 3 * cells : cells]
+            opponent = permuted["states"][:, 3 * cells : 6 * cells : cells]
+            np.testing.assert_array_equal(opponent, own + 10)
+            np.testing.assert_array_equal(np.sort(own, axis=1), np.tile([0, 1, 2], (600, 1)))
+            np.testing.assert_array_equal(permuted["states"][:, -1], 99)
+            np.testing.assert_array_equal(permuted["next_states"], permuted["states"] + 1)
+            np.testing.assert_array_equal(permuted["rewards"], mini_batch["rewards"])
+            self.assertEqual(len(np.unique(own, axis=0)), 6)
+
+    def test_action_follows_its_column(self):
+        """Test the move lands in the column the chosen column was moved to"""
+        mini_batch = self.make_batch(19, 3)
+        permuted = ColumnPermutations(19).apply(mini_batch)
+
+        moved_to = permuted["states"][np.arange(600), permuted["actions"].astype(int) * 3]
+        np.testing.assert_array_equal(moved_to, mini_batch["actions"])
+
+    def test_deep_q_learns_with_permutations(self):
+        """Test the agent trains on permuted minibatches without touching the memory"""
+        agent = DeepQLearningAgent(
+            batch_size=4, permute_columns=True, device="cpu", should_save_model=False
+        )
+        for value in range(6):
+            agent.learn(list(range(19)), 0, 1.0, make_state(value), False)
+
+        self.assertEqual(agent.update_count, 3)
+        np.testing.assert_array_equal(agent.memory.states[0], np.arange(19))
+
+
+class TestDeepQLearningReplay(unittest.TestCase):
+    """Test cases for the deep Q-learning agent learning from its replay buffer"""
+
+    def test_learn_from_memory(self):
+        """Test the agent stores transitions and trains once a batch is collected"""
+        agent = DeepQLearningAgent(batch_size=4, device="cpu", should_save_model=False)
+        for value in range(6):
+            agent.learn(make_state(value), 2, float(value), make_state(value + 1), False)
+
+        self.assertEqual(len(agent.memory), 6)
+        self.assertEqual(agent.update_count, 3)
+        self.assertIsNotNone(agent.last_loss)
+
+    def test_learn_batch(self):
+        """Test a batch is stored at once and trained on gradient_steps times"""
+        agent = DeepQLearningAgent(
+            batch_size=4, gradient_steps=2, device="cpu", should_save_model=False
+        )
+        states = np.array([make_state(value) for value in range(5)])
+        agent.learn_batch(
+            {
+                "prev_states": states,
+                "actions": np.zeros(5, dtype=np.int8),
+                "rewards": np.ones(5, dtype=np.float32),
+                "next_states": states,
+                "game_overs": np.zeros(5, dtype=bool),
+                "winners": np.full(5, -2, dtype=np.int8),
+            }
+        )
+
+        self.assertEqual(len(agent.memory), 5)
+        self.assertEqual(agent.update_count, 2)
+
+    def test_learn_with_prioritized_replay(self):
+        """Test priorities of sampled transitions are updated from their TD errors"""
+        agent = DeepQLearningAgent(
+            batch_size=4, prioritized_replay=True, device="cpu", should_save_model=False
+        )
+        for value in range(6):
+            agent.learn(make_state(value), 2, float(value), make_state(value + 1), False)
+
+        self.assertIsInstance(agent.memory, PrioritizedReplayBuffer)
+        self.assertEqual(agent.update_count, 3)
+        # all transitions start with the same priority
+        self.assertGreater(len(np.unique(agent.memory.tree.get(np.arange(6)))), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
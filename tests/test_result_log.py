@@ -0,0 +1,153 @@
+"""Test cases for the result_log module"""
+
+import glob
+import os
+import random
+import tempfile
+import unittest
+import numpy as np
+import training.reward_models_v2 as rm
+from training import checkpoints
+from training.agent_trainer import train_agents
+from training.result_log import (
+    ResultLog,
+    read_results,
+    read_scores,
+    rolling_win_rate,
+)
+from agents.random_agent_v2 import RandomAgent
+from agents.simple_q_learning_v2 import QLearningAgent
+from utils.play_game import PlayingAgent, GameRules
+
+
+class TestResultLog(unittest.TestCase):
+    """Test cases for writing and reading result logs"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run.results")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_append_and_read(self):
+        """Test results are written as one int8 per game"""
+        log = ResultLog(self.path)
+        for result in (1, -1, 0, 1):
+            log.append(result)
+        log.close()
+
+        self.assertEqual(os.path.getsize(self.path), 4)
+        np.testing.assert_array_equal(read_results(self.path), [1, -1, 0, 1])
+
+    def test_flushes_full_chunks(self):
+        """Test a full chunk is written without waiting for close"""
+        log = ResultLog(self.path, chunk_size=3)
+        for _ in range(4):
+            log.append(1)
+
+        self.assertEqual(os.path.getsize(self.path), 3)
+        self.assertEqual(len(log), 4)
+        log.close()
+        self.assertEqual(os.path.getsize(self.path), 4)
+
+    def test_scores(self):
+        """Test scores are written as int16 pairs next to the results"""
+        log = ResultLog(self.path, with_scores=True)
+        log.append(1, (30, 12))
+        log.append(-1, (5, 300))
+        log.close()
+
+        np.testing.assert_array_equal(read_scores(self.path), [[30, 12], [5, 300]])
+
+    def test_continue_drops_games_after_checkpoint(self):
+        """Test reopening with games truncates both files and appends after them"""
+        log = ResultLog(self.path, with_scores=True)
+        for result in (1, 1, -1, -1):
+            log.append(result, (result, 0))
+        log.close()
+
+        log = ResultLog(self.path, with_scores=True, games=2)
+        self.assertEqual(len(log), 2)
+        log.append(0, (7, 7))
+        log.close()
+
+        np.testing.assert_array_equal(read_results(self.path), [1, 1, 0])
+        np.testing.assert_array_equal(read_scores(self.path), [[1, 0], [1, 0], [7, 7]])
+
+    def test_read_empty_log(self):
+        """Test an empty log reads as an empty array"""
+        ResultLog(self.path).close()
+        self.assertEqual(len(read_results(self.path)), 0)
+        self.assertEqual(len(rolling_win_rate(read_results(self.path), 4, 2)), 0)
+
+    def test_rolling_win_rate(self):
+        """Test rates match a plain moving average sampled every step games"""
+        results = np.random.default_rng(0).integers(-1, 2, 1003).astype(np.int8)
+        expected = [
+            np.mean(results[end - 100 : end] == 1) for end in range(100, 1001, 10)
+        ]
+
+        rates = rolling_win_rate(results, window=100, step=10, chunk_size=95)
+
+        np.testing.assert_allclose(rates, expected)
+
+    def test_rolling_win_rate_needs_whole_steps(self):
+        """Test the window has to be made of whole steps"""
+        with self.assertRaises(ValueError):
+            rolling_win_rate(np.zeros(10, dtype=np.int8), window=15, step=10)
+
+
+class TestTrainerResultLog(unittest.TestCase):
+    """Test cases for the result log written by train_agents"""
+
+    def setUp(self):
+        self.working_directory = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.working_directory)
+        self.directory.cleanup()
+
+    def make_players(self):
+        return (
+            PlayingAgent(
+                QLearningAgent(should_save_model=False),
+                rm.calculate_for_own_score_only,
+            ),
+            PlayingAgent(RandomAgent(), None),
+        )
+
+    def test_resumed_run_continues_log(self):
+        """Test a resumed run drops games after the checkpoint and logs every game once"""
+        random.seed(0)
+        np.random.seed(0)
+        player_1, player_2 = self.make_players()
+        train_agents(
+            player_1,
+            player_2,
+            GameRules(),
+            episodes=10,
+            write_result_history=True,
+            write_result_scores=True,
+            metrics_sinks=[],
+            checkpoint_path="run.checkpoint",
+            checkpoint_every=5,
+        )
+        (path,) = glob.glob("./models/*.results")
+        # games played after the last checkpoint, as if the run had crashed
+        with open(path, "ab") as file:
+            file.write(b"\x01\x01")
+
+        wins, losses, _ = checkpoints.resume_training("run.checkpoint", episodes=20)
+
+        results = read_results(path)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(len(read_scores(path)), 20)
+        self.assertEqual(int(np.sum(results == 1)), wins)
+        self.assertEqual(int(np.sum(results == -1)), losses)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -112,3 +112,41 @@ class TestGameEngine(unittest.TestCase):
 
         action = q_agent.select_move(game_engine)
         self.assertEqual(action, 3)
+
+    def test_learn_batch(self):
+        """Test a batch gives the same updates as learning the transitions one by one"""
+        batch = {
+            "prev_states": np.array([1, 2, 1, 3], dtype=np.int64),
+            "actions": np.array([0, 1, 2, 0], dtype=np.int8),
+            "rewards": np.array([1.0, -2.0, 3.0, 4.0], dtype=np.float32),
+            "next_states": np.array([2, 3, 3, 4], dtype=np.int64),
+            "game_overs": np.array([False, False, False, True]),
+            "winners": np.array([-2, -2, -2, 0], dtype=np.int8),
+        }
+        q_agent = QLearningAgent(learning_rate=0.5, discount_factor=0.5)
+        q_agent.model = {2: [0.0, 2.0, 0.0], 3: [8.0, 0.0, 0.0]}
+        q_agent.learn_batch(batch)
+
+        self.assertEqual(
+            q_agent.model[1], [(1.0 + 0.5 * 2.0) * 0.5, 0.0, (3.0 + 0.5 * 8.0) * 0.5]
+        )
+        self.assertEqual(
+            q_agent.model[2], [0.0, 2.0 + 0.5 * (-2.0 + 0.5 * 8.0 - 2.0), 0.0]
+        )
+        # the terminal transition ignores the next state
+        self.assertEqual(q_agent.model[3], [8.0 + 0.5 * (4.0 - 8.0), 0.0, 0.0])
+        self.assertAlmostEqual(q_agent.exploration_rate, 0.99**4)
+
+    def test_learn_batch_duplicates(self):
+        """Test a repeated state-action pair moves as far as repeated single updates"""
+        batch = {
+            "prev_states": np.array([1, 1], dtype=np.int64),
+            "actions": np.array([0, 0], dtype=np.int8),
+            "rewards": np.array([4.0, 4.0], dtype=np.float32),
+            "next_states": np.array([0, 0], dtype=np.int64),
+            "game_overs": np.array([True, True]),
+            "winners": np.array([0, 0], dtype=np.int8),
+        }
+        q_agent = QLearningAgent(learning_rate=0.5)
+        q_agent.learn_batch(batch)
+        self.assertEqual(q_agent.model[1], [3.0, 0.0, 0.0])
@@ -0,0 +1,29 @@
+"""Test cases for the SimpleQWinReinforcementAgent class"""
+
+import unittest
+import numpy as np
+from agents.simple_q_win_reinforcment import SimpleQWinReinforcementAgent
+
+
+class TestSimpleQWinReinforcementAgent(unittest.TestCase):
+    """Test cases for the SimpleQWinReinforcementAgent class"""
+
+    def test_learn_batch_memorizes_states(self):
+        """Test learning a batch goes through learn, so the states can be undone after a loss"""
+        batch = {
+            "prev_states": np.array([1, 2], dtype=np.int64),
+            "actions": np.array([0, 1], dtype=np.int8),
+            "rewards": np.array([1.0, 2.0], dtype=np.float32),
+            "next_states": np.array([2, 3], dtype=np.int64),
+            "game_overs": np.array([False, False]),
+            "winners": np.array([-2, -2], dtype=np.int8),
+        }
+        agent = SimpleQWinReinforcementAgent(should_save_model=False)
+        agent.learn_batch(batch)
+
+        self.assertEqual(set(agent.memory), {1, 2})
+        self.assertEqual(agent.memory[2], agent.model[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
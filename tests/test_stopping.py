@@ -0,0 +1,127 @@
+"""Test cases for the stopping module"""
+
+import random
+import unittest
+import training.reward_models_v2 as rm
+from training import stopping
+from training.agent_trainer import train_agents
+from training.metrics import TrainingMetrics
+from agents.random_agent_v2 import RandomAgent
+from agents.simple_q_learning_v2 import QLearningAgent
+from utils.play_game import PlayingAgent, GameRules
+
+
+def make_metrics(wins, games):
+    metrics = TrainingMetrics(sinks=[])
+    metrics.counters = {"Wild Card wins": wins, "episodes played": games}
+    for result in [1] * wins + [-1] * (games - wins):
+        metrics.record_result(result)
+    return metrics
+
+
+class TestStoppingRules(unittest.TestCase):
+    """Test cases for the stopping rules"""
+
+    def setUp(self):
+        self.player = PlayingAgent(RandomAgent())
+
+    def test_wilson_interval(self):
+        """Test the interval narrows with more games"""
+        low, high = stopping.wilson_interval(50, 100)
+        self.assertAlmostEqual((low + high) / 2, 0.5)
+        narrow_low, narrow_high = stopping.wilson_interval(5000, 10000)
+        self.assertLess(narrow_high - narrow_low, high - low)
+
+    def test_cumulative_win_rate_confidence(self):
+        """Test the run stops once the interval is narrow enough"""
+        rule = stopping.WinRateConfidence(half_width=0.05, windowed=False)
+        self.assertIsNone(rule.check(make_metrics(5, 10), self.player, self.player))
+        self.assertIsNotNone(
+            rule.check(make_metrics(500, 1000), self.player, self.player)
+        )
+
+    def test_windowed_win_rate_needs_stable_heartbeats(self):
+        """Test the rolling win rate has to settle for patience heartbeats"""
+        rule = stopping.WinRateConfidence(half_width=0.05, patience=2)
+        metrics = make_metrics(500, 1000)
+        self.assertIsNone(rule.check(metrics, self.player, self.player))
+        self.assertIsNone(rule.check(metrics, self.player, self.player))
+        self.assertIsNotNone(rule.check(metrics, self.player, self.player))
+
+    def test_windowed_defaults_fire(self):
+        """Test the default rule settles over a full rolling window of even results"""
+        rule = stopping.WinRateConfidence()
+        metrics = make_metrics(5000, 10000)
+        for _ in range(rule.patience):
+            self.assertIsNone(rule.check(metrics, self.player, self.player))
+        self.assertIn("settled", rule.check(metrics, self.player, self.player))
+
+    def test_unreachable_half_width(self):
+        """Test a half_width narrower than the rolling window allows is refused"""
+        rule = stopping.WinRateConfidence(half_width=0.005)
+        with self.assertRaises(ValueError):
+            rule.check(make_metrics(500, 1000), self.player, self.player)
+
+    def test_sprt(self):
+        """Test the SPRT accepts a clearly better agent and rejects an equal one"""
+        better = stopping.SPRT(baseline=0.5, delta=0.05)
+        self.assertIsNone(better.check(make_metrics(6, 10), self.player, self.player))
+        self.assertIn(
+            "above", better.check(make_metrics(700, 1000), self.player, self.player)
+        )
+
+        equal = stopping.SPRT(baseline=0.5, delta=0.05)
+        self.assertIn(
+            "not above", equal.check(make_metrics(480, 1000), self.player, self.player)
+        )
+
+    def test_q_value_plateau(self):
+        """Test a table that stops changing ends the run"""
+        player = PlayingAgent(QLearningAgent(), rm.calculate_for_own_score_only)
+        player.agent.model = {1: [0.0, 1.0, 2.0]}
+        rule = stopping.QValuePlateau(tolerance=0.01, patience=2)
+        metrics = make_metrics(0, 0)
+        self.assertIsNone(rule.check(metrics, player, self.player))
+        player.agent.model[1] = [0.5, 1.0, 2.0]
+        self.assertIsNone(rule.check(metrics, player, self.player))
+        self.assertIsNone(rule.check(metrics, player, self.player))
+        self.assertIsNotNone(rule.check(metrics, player, self.player))
+
+    def test_q_value_plateau_samples_at_random(self):
+        """Test the sample isn't just the oldest states of the table"""
+        player = PlayingAgent(QLearningAgent(), rm.calculate_for_own_score_only)
+        player.agent.model = {state: [0.0, 0.0, 0.0] for state in range(1000)}
+        rule = stopping.QValuePlateau(sample_size=10)
+        rule.check(make_metrics(0, 0), player, self.player)
+
+        sample = rule._samples[0]
+        self.assertEqual(len(sample), 10)
+        self.assertNotEqual(sorted(sample), list(range(10)))
+
+    def test_q_value_plateau_keeps_global_random_state(self):
+        """Test sampling doesn't move the generator the games are played with"""
+        player = PlayingAgent(QLearningAgent(), rm.calculate_for_own_score_only)
+        player.agent.model = {state: [0.0, 0.0, 0.0] for state in range(1000)}
+        rule = stopping.QValuePlateau(sample_size=10)
+
+        state = random.getstate()
+        rule.check(make_metrics(0, 0), player, self.player)
+        self.assertEqual(random.getstate(), state)
+
+    def test_train_agents_stops_early(self):
+        """Test training ends at the heartbeat where a rule fires"""
+        wins, losses, draws = train_agents(
+            PlayingAgent(RandomAgent()),
+            PlayingAgent(RandomAgent("Mad Contender")),
+            GameRules(),
+            episodes=1000,
+            metrics_sinks=[],
+            stopping_rules=[
+                stopping.WinRateConfidence(half_width=0.2, windowed=False)
+            ],
+        )
+        self.assertEqual(wins + losses + draws, 101)
+
+
+if __name__ == "__main__":
+    unittest.main()
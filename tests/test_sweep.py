@@ -0,0 +1,97 @@
+"""Test cases for the sweep module"""
+
+import json
+import os
+import tempfile
+import unittest
+from training import sweep
+from agents.random_agent_v2 import RandomAgent
+from utils.play_game import PlayingAgent, GameRules
+
+BASE = {
+    "game_rules": {"max_dice_value": 3},
+    "players": [
+        {
+            "agent": "q_learning",
+            "reward": "calculate_for_own_score_only",
+            "params": {"should_save_model": False},
+        },
+        {"agent": "random"},
+    ],
+}
+
+
+class TestSweep(unittest.TestCase):
+    """Test cases for trial expansion and successive halving"""
+
+    def test_grid(self):
+        """Test grid search tries every combination"""
+        trials = sweep.expand_trials({"a": [1, 2], "b": [3, 4, 5]})
+        self.assertEqual(len(trials), 6)
+        self.assertIn({"a": 2, "b": 5}, trials)
+
+    def test_random(self):
+        """Test random search draws from lists and ranges"""
+        trials = sweep.expand_trials(
+            {"a": [1, 2], "b": {"low": 0.01, "high": 1.0, "log": True}},
+            search="random",
+            trials=20,
+            seed=0,
+        )
+        self.assertEqual(len(trials), 20)
+        for trial in trials:
+            self.assertIn(trial["a"], (1, 2))
+            self.assertTrue(0.01 <= trial["b"] <= 1.0)
+        with self.assertRaises(ValueError):
+            sweep.expand_trials({"b": {"low": 0, "high": 1}})
+
+    def test_apply_overrides(self):
+        """Test dotted paths reach into lists and leave the base config untouched"""
+        config = sweep.apply_overrides(
+            BASE, {"players.0.params.learning_rate": 0.3, "episodes": 10}
+        )
+        self.assertEqual(config["players"][0]["params"]["learning_rate"], 0.3)
+        self.assertEqual(config["episodes"], 10)
+        self.assertNotIn("learning_rate", BASE["players"][0]["params"])
+
+    def test_rung_budgets(self):
+        """Test budgets grow by the reduction factor up to the max"""
+        self.assertEqual(sweep.rung_budgets(10, 200, 3), [10, 30, 90, 200])
+
+    def test_evaluate_restores_exploration(self):
+        """Test evaluation plays greedily and leaves the agent as it was"""
+        player = PlayingAgent(RandomAgent())
+        player.agent.exploration_rate = 0.5
+        win_rate = sweep.evaluate(player, PlayingAgent(RandomAgent()), GameRules(), 10)
+        self.assertTrue(0 <= win_rate <= 1)
+        self.assertEqual(player.agent.exploration_rate, 0.5)
+
+    def test_run_sweep(self):
+        """Test the bottom trials are stopped at every rung and results are written"""
+        with tempfile.TemporaryDirectory() as directory:
+            results = os.path.join(directory, "sweep.jsonl")
+            best = sweep.run_sweep(
+                {
+                    "base": BASE,
+                    "parameters": {
+                        "players.0.params.learning_rate": [0.1, 0.2, 0.3, 0.4]
+                    },
+                    "min_episodes": 4,
+                    "max_episodes": 8,
+                    "reduction_factor": 2,
+                    "evaluation_games": 5,
+                    "results": results,
+                },
+                workers=2,
+            )
+            with open(results, encoding="utf-8") as file:
+                records = [json.loads(line) for line in file]
+
+        self.assertEqual([record["rung"] for record in records], [0] * 4 + [1] * 2)
+        self.assertEqual(sum(record["promoted"] for record in records), 2)
+        self.assertEqual(best["episodes"], 8)
+        self.assertIn(best["trial"], [r["trial"] for r in records if r["promoted"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Test cases for the transitions module"""
+
+import unittest
+import numpy as np
+import training.reward_models_v2 as rm
+from training.agent_trainer import play_episode, train_agents
+from training.transitions import TransitionRecorder, TransitionBuffer
+from agents.random_agent_v2 import RandomAgent
+from agents.simple_q_learning_v2 import QLearningAgent
+from utils.play_game import PlayingAgent, GameRules
+
+
+class RecordingAgent(QLearningAgent):
+    """Q-Learning agent keeping every transition it learns from"""
+
+    def __init__(self):
+        super().__init__(should_save_model=False)
+        self.transitions = []
+
+    def learn(self, prev_state, action, reward, next_state, game_over, winner):
+        self.transitions.append((prev_state, action, next_state, game_over))
+        super().learn(prev_state, action, reward, next_state, game_over, winner)
+
+
+class TestTransitionRecorder(unittest.TestCase):
+    """Test cases for the TransitionRecorder class"""
+
+    def test_move_is_pending_until_observed(self):
+        """Test a move waits for the next observation of the same player"""
+        recorder = TransitionRecorder()
+        recorder.observe(0, 10, (0, 0), 3)
+        self.assertFalse(recorder.pending[0])
+        recorder.act(0, 1)
+        self.assertTrue(recorder.pending[0])
+        self.assertFalse(recorder.pending[1])
+        self.assertEqual(
+            (recorder.states[0], recorder.dice[0], recorder.actions[0]), (10, 3, 1)
+        )
+
+        recorder.observe(0, 11, (3, 0), 5)
+        self.assertFalse(recorder.pending[0])
+
+    def test_reset(self):
+        """Test a new game starts without pending moves"""
+        recorder = TransitionRecorder()
+        recorder.act(1, 2)
+        recorder.reset()
+        self.assertEqual(recorder.pending, [False, False])
+
+
+class TestTransitionBuffer(unittest.TestCase):
+    """Test cases for the TransitionBuffer class"""
+
+    def test_take(self):
+        """Test transitions come out as arrays and the buffer is emptied"""
+        buffer = TransitionBuffer()
+        buffer.append(123, 2, 5.0, 456, False)
+        buffer.append(456, 0, -1.0, 789, True, winner=1)
+
+        batch = buffer.take()
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(batch["prev_states"].tolist(), [123, 456])
+        self.assertEqual(batch["actions"].dtype, np.int8)
+        self.assertEqual(batch["game_overs"].tolist(), [False, True])
+        self.assertEqual(batch["winners"].tolist(), [-2, 1])
+
+
+class TestPlayEpisode(unittest.TestCase):
+    """Test cases for the transitions play_episode hands to the agents"""
+
+    def test_both_players_learn_every_move(self):
+        """Test every move of both players is learned from, ending with one terminal transition"""
+        players = [
+            PlayingAgent(RecordingAgent(), rm.calculate_for_own_score_only)
+            for _ in range(2)
+        ]
+        recorder = TransitionRecorder()
+        for _ in range(3):
+            for player in players:
+                player.agent.transitions = []
+            _, move_counter = play_episode(
+                players[0], players[1], GameRules(), recorder=recorder
+            )
+
+            transitions = players[0].agent.transitions + players[1].agent.transitions
+            self.assertEqual(len(transitions), move_counter)
+            for player in players:
+                game_overs = [t[3] for t in player.agent.transitions]
+                self.assertEqual(game_overs.count(True), 1)
+                self.assertTrue(game_overs[-1])
+                # each transition starts where the previous one ended
+                for previous, transition in zip(
+                    player.agent.transitions, player.agent.transitions[1:]
+                ):
+                    self.assertEqual(previous[2], transition[0])
+
+    def test_train_agents_learn_every(self):
+        """Test buffered moves are learned in batches"""
+        player_1 = PlayingAgent(RecordingAgent(), rm.calculate_for_own_score_only)
+        player_2 = PlayingAgent(RandomAgent(), None)
+        learned_batches = []
+        player_1.agent.learn_batch = learned_batches.append
+
+        train_agents(player_1, player_2, GameRules(), episodes=10, learn_every=4)
+
+        self.assertEqual(player_1.agent.transitions, [])
+        self.assertEqual(len(learned_batches), 3)
+        self.assertEqual(
+            sum(batch["game_overs"].sum() for batch in learned_batches), 10
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
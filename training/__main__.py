@@ -0,0 +1,33 @@
+"""
+Command line entry point for training runs.
+
+python -m training training/configs/simple_vs_random.toml
+python -m training --resume ./models/simple_vs_random.checkpoint
+"""
+
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m training", description="Train agents against each other."
+    )
+    parser.add_argument("config", nargs="?", help="run config, .json, .toml or .yaml")
+    parser.add_argument("--resume", help="checkpoint of a run to continue")
+    parser.add_argument("--episodes", type=int, help="override the number of episodes")
+    args = parser.parse_args()
+
+    if args.resume:
+        from training.checkpoints import resume_training
+
+        resume_training(args.resume, episodes=args.episodes)
+    elif args.config:
+        from training.config import load_config, run
+
+        run(load_config(args.config), episodes=args.episodes)
+    else:
+        parser.error("a config or --resume is required")
+
+
+if __name__ == "__main__":
+    main()
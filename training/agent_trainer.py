@@ -1,14 +1,17 @@
 """Utility to train agents against each other."""
 
 import signal
-import pickle
 import time
-import copy
 from math import comb
+import numpy as np
 import game.player_actions_v2 as pa
 from utils.play_game import PlayingAgent, GameRules, player_move
 from game.game_engine_v2 import GameEngine
-import datetime
+from training.metrics import TrainingMetrics
+from training.profiling import PhaseTimer, Stopwatch
+from training.checkpoints import CheckpointWriter, get_rng_state, set_rng_state
+from training.transitions import TransitionRecorder, TransitionBuffer
+from training.result_log import ResultLog
 
 interrupted = False
 
@@ -29,22 +32,89 @@ def train_agents(
     game_rules: GameRules,
     episodes=1000,
     write_result_history=False,
+    write_result_scores=False,
+    metrics_sinks=None,
+    profile_every=None,
+    checkpoint_path=None,
+    checkpoint_every=100 * 1000,
+    resume_from=None,
+    learn_every=None,
+    stopping_rules=None,
+    concurrent_games=None,
 ):
-    """train Q-Learning agent against a random agent"""
+    """
+    train Q-Learning agent against a random agent
+
+    :param write_result_history: log the result of every game to ./models, see training.result_log.
+    :param write_result_scores: also log the final scores of every game.
+    :param metrics_sinks: where heartbeat metrics are written, see training.metrics. Printed by default.
+    :param profile_every: time the phases of every profile_every-th game and report them at heartbeat.
+        With learn_every every learn_batch call is timed too, with concurrent_games only those are.
+    :param checkpoint_path: write a resumable checkpoint there every checkpoint_every episodes and when training stops.
+    :param resume_from: checkpoint to continue from, see training.checkpoints.resume_training.
+    :param learn_every: buffer the moves of learning agents and hand them to agent.learn_batch
+        every learn_every episodes, instead of calling agent.learn after every move.
+    :param stopping_rules: checked at every heartbeat, training ends once one of them gives a reason, see training.stopping.
+    :param concurrent_games: play this many games side by side, see play_episodes_batched.
+        Agents learn in batches, every concurrent_games episodes unless learn_every is given.
+    """
     wins = 0
     losses = 0
     draws = 0
-    if write_result_history:
-        result_history = []
+    start_episode = 0
+    result_log = None
 
     heartbeat = min(10 / 100 * episodes, 10000)
     perf_timer_total_run = time.time()
-    perf_timer = time.time()
+    metrics = TrainingMetrics(metrics_sinks)
+    timer = PhaseTimer(profile_every) if profile_every else None
+    if timer is not None and concurrent_games:
+        print("Batched games aren't split into phases, profile_every only times learn_batch")
+    recorder = TransitionRecorder()
+    if concurrent_games and not learn_every:
+        learn_every = concurrent_games
+    played = []
+    buffers = None
+    if learn_every:
+        buffers = [
+            TransitionBuffer() if player.reward_func is not None else None
+            for player in (player_1, player_2)
+        ]
+    checkpoints = CheckpointWriter(checkpoint_path) if checkpoint_path else None
+    # passed back to train_agents when the checkpoint is resumed, the sinks and rules keep their state
+    options = {
+        "metrics_sinks": metrics.sinks,
+        "profile_every": profile_every,
+        "learn_every": learn_every,
+        "stopping_rules": stopping_rules,
+        "concurrent_games": concurrent_games,
+    }
     global interrupted
 
+    if resume_from is not None:
+        wins, losses, draws = resume_from["results"]
+        start_episode = resume_from["episode"]
+        if write_result_history and resume_from["result_history"] is not None:
+            result_log = ResultLog(
+                resume_from["result_history"],
+                resume_from["result_scores"],
+                games=resume_from["result_games"],
+            )
+        metrics.counters = dict(resume_from["counters"])
+        set_rng_state(resume_from["rng"])
+        print(f"Resuming training at episode {start_episode:,}/{episodes:,}")
+    if write_result_history and result_log is None:
+        result_log = ResultLog(
+            f"./models/{player_1.agent.nickname}_vs_{player_2.agent.nickname}_result_history_{time.time()}.results",
+            write_result_scores,
+        )
+
+    # every result is in the first record, sinks such as CsvSink take their columns from it
+    for name in (f"{player_1.agent.nickname} wins", f"{player_2.agent.nickname} wins", "draws"):
+        metrics.counters.setdefault(name, 0)
+
     n = game_rules.max_dice_value + 1  # dice size + empty
     r = 3  # column size
-    perf_timer = time.time()
     total_combinations = comb(n + r - 1, r)
     one_side = total_combinations**3 * n
     two_sides = total_combinations**6 * n
@@ -54,236 +124,117 @@ def train_agents(
     # Total combinations for two sides: 2,459,086,221,312
     # Simple Q table would need to use around 1,036 terabytes of memory to store all possible states
 
-    average_moves_per_game = 0
-    total_moves = 0
-
-    for episode in range(episodes):
-        game_engine = pa.start_game(
-            enable_print=False,
-            max_dice_value=game_rules.max_dice_value,
-            should_remove_opponents_dice=game_rules.should_remove_opponents_dice,
-            safe_mode=False,
-        )
-
+    episode = start_episode - 1
+    stop_early = False
+    for episode in range(start_episode, episodes):
         is_heartbeat = episode % heartbeat == 0
 
-        move_counter = 0
-
-        previous_move = {
-            player_1: {
-                "state": None,
-                "scores": None,
-                "dice": None,
-                "action": None,
-            },
-            player_2: {
-                "state": None,
-                "scores": None,
-                "dice": None,
-                "action": None,
-            },
-        }
-        while not pa.get_game_over(game_engine):
-            if pa.get_current_player(game_engine) == 0:
-                current_player = player_1
-            else:
-                current_player = player_2
-
-            pa.start_turn(game_engine)
-            dice_value = pa.get_dice_value(game_engine)
-
-            # we're selecting the action before we calculated reward for the previous move :thinking:
-
-            if current_player.reward_func is not None:
-                next_state = current_player.agent.convert_state(
-                    pa.get_board_state(game_engine),
-                    dice_value,
-                )
-                next_state_scores = pa.get_score(game_engine)
-
-                if move_counter > 1:
-                    delayed_reward(
-                        game_engine=game_engine,
-                        player=current_player,
-                        prev_state=previous_move[current_player]["state"],
-                        prev_scores=previous_move[current_player]["scores"],
-                        prev_dice=previous_move[current_player]["dice"],
-                        prev_action=previous_move[current_player]["action"],
-                        next_state=next_state,
-                        next_scores=next_state_scores,
-                        game_over=pa.get_game_over(game_engine),
-                        winner=pa.get_winner(game_engine),
-                    )
-                previous_move[current_player]["state"] = copy.deepcopy(next_state)
-                previous_move[current_player]["scores"] = copy.deepcopy(
-                    next_state_scores
+        if concurrent_games:
+            if not played:
+                played = play_episodes_batched(
+                    player_1,
+                    player_2,
+                    game_rules,
+                    min(concurrent_games, episodes - episode),
+                    buffers,
                 )
-                previous_move[current_player]["dice"] = dice_value
-
-            action = current_player.agent.select_move(game_engine)
-            pa.do_move(game_engine, action)
-            pa.end_turn(game_engine)
-
-            if current_player.reward_func is not None:
-                previous_move[current_player]["action"] = action
-
-            move_counter += 1
-
-        # run delayed reward after the game is over
-        # we know that game engine current player is the one that did the last move, since we do not switch players after end_turn
-        if pa.get_current_player(game_engine) == 0:
-            last_player_index = 0
-            last_player = player_1
-            before_last_player = player_2
-            before_last_player_index = 1
+                played.reverse()
+            game_engine, move_counter = played.pop()
         else:
-            last_player_index = 1
-            last_player = player_2
-            before_last_player = player_1
-            before_last_player_index = 0
-
-        if last_player.reward_func is not None:
-            # for the last state we always pass dice value 0, since it's not relevant
-            delayed_reward(
-                game_engine=game_engine,
-                player=last_player,
-                prev_state=previous_move[last_player]["state"],
-                prev_scores=previous_move[last_player]["scores"],
-                prev_dice=previous_move[last_player]["dice"],
-                prev_action=previous_move[last_player]["action"],
-                next_state=last_player.agent.convert_state(
-                    pa.get_board_state(
-                        engine=game_engine,
-                        player=last_player_index,
-                    ),
-                    dice_value,
-                ),
-                next_scores=pa.get_score(engine=game_engine, player=last_player_index),
-                game_over=True,
-                winner=pa.get_winner(game_engine),
-            )
-
-        if before_last_player.reward_func is not None:
-            # for the last state we always pass dice value 0, since it's not relevant
-            delayed_reward(
-                game_engine=game_engine,
-                player=before_last_player,
-                prev_state=previous_move[before_last_player]["state"],
-                prev_scores=previous_move[before_last_player]["scores"],
-                prev_dice=previous_move[before_last_player]["dice"],
-                prev_action=previous_move[before_last_player]["action"],
-                next_state=before_last_player.agent.convert_state(
-                    pa.get_board_state(
-                        engine=game_engine,
-                        player=last_player_index,
-                    ),
-                    dice_value,
-                ),
-                next_scores=pa.get_score(
-                    engine=game_engine, player=before_last_player_index
-                ),
-                game_over=True,
-                winner=pa.get_winner(game_engine),
+            game_engine, move_counter = play_episode(
+                player_1, player_2, game_rules, timer, recorder, buffers
             )
 
         winner = pa.get_winner(game_engine)
         if winner == 0:
             wins += 1
-            if write_result_history:
-                result_history.append(1)
+            result = 1
+            metrics.increment(f"{player_1.agent.nickname} wins")
         elif winner == 1:
             losses += 1
-            if write_result_history:
-                result_history.append(-1)
+            result = -1
+            metrics.increment(f"{player_2.agent.nickname} wins")
         else:
             draws += 1
-            if write_result_history:
-                result_history.append(0)
+            result = 0
+            metrics.increment("draws")
+        if result_log is not None:
+            result_log.append(
+                result, pa.get_score(game_engine, 0) if result_log.with_scores else None
+            )
 
-        total_moves += move_counter
-        average_moves_per_game = total_moves / (episode + 1)
-        move_counter = 0
+        metrics.increment("episodes played")
+        metrics.increment("moves", move_counter)
+        metrics.record_result(result)
 
-        # sanity check, print game every 10% of the episodes, but not more rarely than 1000
-        if is_heartbeat:
-            print(f"Episode {episode:,}/{episodes:,}")
+        if buffers is not None and (episode + 1) % learn_every == 0:
+            learn_buffered(player_1, player_2, buffers, timer)
 
-            print("\nPerformance stats:")
-            if perf_timer:
-                print(
-                    f"Time taken for {heartbeat:,} episodes: {str(datetime.timedelta(seconds=int(time.time() - perf_timer)))}"
-                )
-            # objgraph.show_most_common_types()
-
-            if (
-                hasattr(player_1.agent, "model")
-                and isinstance(player_1.agent.model, dict)
-                and len(player_1.agent.model) > 0
-            ):
-                print(
-                    f"keys in {player_1.agent.nickname} model: {len(player_1.agent.model):,}"
-                )
-                print(
-                    f"which is {len(player_1.agent.model) / two_sides if game_rules.should_remove_opponents_dice else one_side:.2%} of all possible states"
-                )
-            if (
-                hasattr(player_2.agent, "model")
-                and isinstance(player_2.agent.model, dict)
-                and len(player_2.agent.model) > 0
-            ):
-                print(
-                    f"keys in {player_2.agent.nickname} model: {len(player_2.agent.model):,}"
-                )
-                print(
-                    f"which is {len(player_2.agent.model) / two_sides if game_rules.should_remove_opponents_dice else one_side:.2%} of all possible states"
-                )
-            print(f"Average moves per game: {average_moves_per_game:.2f}")
-
-            # if player_1.agent.modelType == "DQ":
-            #     for name, param in player_1.agent.model.named_parameters():
-            #         print(
-            #             f"Layer Name: {name}, Parameter Size: {param.size()}, Param Data: {param.data}"
-            #         )
-
-            # if player_2.agent.modelType == "DQ":
-            #     for name, param in player_2.agent.model.named_parameters():
-            #         print(
-            #             f"Layer Name: {name}, Parameter Size: {param.size()}, Param Data Len: {param.data}"
-            #         )
-
-            print("\nMotivational Stats:")
-            print(
-                f"{player_1.agent.nickname} Wins: {wins:,}, {player_2.agent.nickname} Wins: {losses:,}, Draws: {draws:,}"
-            )
-            # print diff in wins and % from mean
-            print(
-                f"\nWin difference: {abs(wins - losses):,} - % from mean: {abs(wins - losses) / (wins + losses + draws) * 100:.2f}% - in the lead: {player_1.agent.nickname if wins > losses else player_2.agent.nickname}"
-            )
-            print(
-                "\nWe just won!"
-                if pa.get_winner(game_engine) == 0
-                else "\nWe just lost!"
+        # sanity check, publish stats every 10% of the episodes, but not more rarely than every 10,000
+        if is_heartbeat:
+            publish_heartbeat(
+                metrics,
+                player_1,
+                player_2,
+                game_engine,
+                episode,
+                episodes,
+                two_sides if game_rules.should_remove_opponents_dice else one_side,
+                timer,
             )
-            print(
-                f"Scores: {player_1.agent.nickname}: {pa.get_score(game_engine)[0]},  {player_2.agent.nickname}: {pa.get_score(game_engine)[1]}"
+            for rule in stopping_rules or ():
+                reason = rule.check(metrics, player_1, player_2)
+                if reason is not None:
+                    print(f"Stopping early at episode {episode:,}: {reason}")
+                    stop_early = True
+                    break
+
+        if checkpoints is not None and (episode + 1) % checkpoint_every == 0:
+            # buffered moves are not part of the checkpoint
+            if buffers is not None:
+                learn_buffered(player_1, player_2, buffers, timer)
+            checkpoints.save(
+                checkpoint_state(
+                    player_1,
+                    player_2,
+                    game_rules,
+                    episode + 1,
+                    episodes,
+                    (wins, losses, draws),
+                    result_log,
+                    metrics,
+                    checkpoint_every,
+                    options,
+                )
             )
 
-            if hasattr(player_1.agent, "learning_rate"):
-                print("\nLearning Stats:")
-                print(f"learning rate: {player_1.agent.learning_rate}")
-                print(f"exploration rate: {player_1.agent.exploration_rate}")
-            if hasattr(player_2.agent, "learning_rate"):
-                print("\nLearning Stats:")
-                print(f"learning rate: {player_2.agent.learning_rate}")
-                print(f"exploration rate: {player_2.agent.exploration_rate}")
-
-            pa.display_board(game_engine)
-            print("\n")
-
         if interrupted:
             print("Stop requested. Exiting training.")
             break
+        if stop_early:
+            break
 
+    if buffers is not None:
+        learn_buffered(player_1, player_2, buffers, timer)
+    if checkpoints is not None:
+        # the last episode played might not be on a checkpoint boundary
+        if (episode + 1) % checkpoint_every != 0:
+            checkpoints.save(
+                checkpoint_state(
+                    player_1,
+                    player_2,
+                    game_rules,
+                    episode + 1,
+                    episodes,
+                    (wins, losses, draws),
+                    result_log,
+                    metrics,
+                    checkpoint_every,
+                    options,
+                )
+            )
+        checkpoints.close()
+    metrics.close()
     print(
         f"Total time taken: {time.time() - perf_timer_total_run} for {wins+draws+losses:,} episodes"
     )
@@ -293,11 +244,9 @@ def train_agents(
     if player_2.model_name is not None:
         player_2.agent.save_model(f"./models/{player_2.model_name}.pkl")
 
-    if write_result_history:
-        save_list(
-            result_history,
-            f"./models/{player_1.agent.nickname}_vs_{player_2.agent.nickname}_result_history_{time.time()}.pkl",
-        )
+    if result_log is not None:
+        result_log.close()
+        print(f"Result history written to {result_log.path}")
 
     print(
         f"Training completed. {player_1.agent.nickname} Wins: {wins:,}, {player_2.agent.nickname} Wins: {losses:,}, Draws: {draws:,}"
@@ -306,6 +255,332 @@ def train_agents(
     return wins, losses, draws
 
 
+def learn_buffered(
+    player_1: PlayingAgent, player_2: PlayingAgent, buffers, timer: PhaseTimer = None
+):
+    """
+    Hand the buffered moves of both players to their agents.
+
+    :param timer: every learn_batch call is timed, there are few of them.
+    """
+    for player, buffer in zip((player_1, player_2), buffers):
+        if buffer is not None and len(buffer) > 0:
+            stopwatch = None if timer is None else Stopwatch(timer, player.agent.nickname)
+            player.agent.learn_batch(buffer.take())
+            if stopwatch is not None:
+                stopwatch.lap("learn_batch")
+
+
+def checkpoint_state(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    next_episode: int,
+    episodes: int,
+    results: tuple,
+    result_log: ResultLog,
+    metrics: TrainingMetrics,
+    checkpoint_every: int,
+    options: dict,
+):
+    """
+    Everything needed to continue training at next_episode, see training.checkpoints.
+
+    :param options: keyword arguments of train_agents the run was started with, i.e. learn_every.
+    """
+    if result_log is not None:
+        # games up to the checkpoint have to be on disk when it's resumed
+        result_log.flush()
+    return {
+        "player_1": player_1,
+        "player_2": player_2,
+        "game_rules": game_rules,
+        "episode": next_episode,
+        "episodes": episodes,
+        "results": results,
+        "result_history": None if result_log is None else result_log.path,
+        "result_games": 0 if result_log is None else len(result_log),
+        "result_scores": result_log is not None and result_log.with_scores,
+        "counters": metrics.counters,
+        "rng": get_rng_state(),
+        "checkpoint_every": checkpoint_every,
+        "options": options,
+    }
+
+
+def play_episode(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    timer: PhaseTimer = None,
+    recorder: TransitionRecorder = None,
+    buffers=None,
+):
+    """
+    Play a single training game, agents with a reward function learn from every move.
+
+    :param timer: collects phase timings, if this game is picked as a sample.
+    :param recorder: reused between games to keep the moves of the agents, a new one by default.
+    :param buffers: TransitionBuffer (or None) per player, buffered players don't learn during the game.
+    :return: finished game engine and the number of moves made
+    """
+    if timer is not None and not timer.sample():
+        timer = None
+    stopwatch = None
+    if recorder is None:
+        recorder = TransitionRecorder()
+    else:
+        recorder.reset()
+    players = (player_1, player_2)
+
+    game_engine = pa.start_game(
+        enable_print=False,
+        max_dice_value=game_rules.max_dice_value,
+        should_remove_opponents_dice=game_rules.should_remove_opponents_dice,
+        safe_mode=False,
+    )
+
+    move_counter = 0
+
+    while not pa.get_game_over(game_engine):
+        player_index = pa.get_current_player(game_engine)
+        current_player = players[player_index]
+
+        pa.start_turn(game_engine)
+        dice_value = pa.get_dice_value(game_engine)
+        if timer is not None:
+            stopwatch = Stopwatch(timer, current_player.agent.nickname)
+
+        # we're selecting the action before we calculated reward for the previous move :thinking:
+
+        if current_player.reward_func is not None:
+            observe_turn(
+                game_engine,
+                players,
+                player_index,
+                recorder,
+                dice_value,
+                stopwatch,
+                buffers[player_index] if buffers else None,
+            )
+
+        action = current_player.agent.select_move(game_engine)
+        if stopwatch is not None:
+            stopwatch.lap("select_move")
+        pa.do_move(game_engine, action)
+        pa.end_turn(game_engine)
+        if stopwatch is not None:
+            stopwatch.lap("do_move")
+
+        if current_player.reward_func is not None:
+            recorder.act(player_index, action)
+
+        move_counter += 1
+
+    finish_episode(game_engine, players, recorder, dice_value, timer, buffers)
+
+    return game_engine, move_counter
+
+
+def play_episodes_batched(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    games: int,
+    buffers=None,
+):
+    """
+    Play games side by side, agents with select_moves pick the moves of all of them in one call.
+
+    Every round each unfinished game makes a move for both players, the games
+    waiting for the same player are batched, so a neural agent runs one forward pass per
+    round instead of one per move. Moves are buffered per game and handed to
+    buffers when the game ends, so every episode stays in one piece for
+    learn_batch.
+
+    :param games: number of games played at once.
+    :param buffers: TransitionBuffer (or None) per player, needed for every player with a reward function.
+    :return: finished game engine and the number of moves made, of every game
+    """
+    players = (player_1, player_2)
+    for player, buffer in zip(players, buffers or (None, None)):
+        if player.reward_func is not None and buffer is None:
+            raise ValueError("Batched games learn through buffers, use learn_every")
+    engines = [
+        pa.start_game(
+            enable_print=False,
+            max_dice_value=game_rules.max_dice_value,
+            should_remove_opponents_dice=game_rules.should_remove_opponents_dice,
+            safe_mode=False,
+        )
+        for _ in range(games)
+    ]
+    recorders = [TransitionRecorder() for _ in range(games)]
+    game_buffers = [
+        [None if buffer is None else TransitionBuffer() for buffer in buffers or ()]
+        for _ in range(games)
+    ]
+    move_counters = [0] * games
+    dice_values = [0] * games
+
+    active = list(range(games))
+    while active:
+        for player_index, player in enumerate(players):
+            turn = [
+                game
+                for game in active
+                if not pa.get_game_over(engines[game])
+                and pa.get_current_player(engines[game]) == player_index
+            ]
+            if not turn:
+                continue
+
+            observations = []
+            for game in turn:
+                pa.start_turn(engines[game])
+                dice_values[game] = pa.get_dice_value(engines[game])
+                if player.reward_func is not None:
+                    observations.append(
+                        observe_turn(
+                            engines[game],
+                            players,
+                            player_index,
+                            recorders[game],
+                            dice_values[game],
+                            buffer=game_buffers[game][player_index],
+                        )
+                    )
+            actions = select_moves(
+                player, [engines[game] for game in turn], observations or None
+            )
+
+            for game, action in zip(turn, actions):
+                pa.do_move(engines[game], action)
+                pa.end_turn(engines[game])
+                if player.reward_func is not None:
+                    recorders[game].act(player_index, action)
+                move_counters[game] += 1
+
+        for game in active:
+            if pa.get_game_over(engines[game]):
+                finish_episode(
+                    engines[game],
+                    players,
+                    recorders[game],
+                    dice_values[game],
+                    buffers=game_buffers[game],
+                )
+                for buffer, game_buffer in zip(buffers or (), game_buffers[game]):
+                    if buffer is not None:
+                        buffer.extend(game_buffer)
+        active = [game for game in active if not pa.get_game_over(engines[game])]
+
+    return list(zip(engines, move_counters))
+
+
+def select_moves(player: PlayingAgent, game_engines, observations=None):
+    """
+    Moves of player in every game, with one select_moves call if the agent has it.
+
+    :param observations: states from convert_state of every game, if they're already known.
+    """
+    agent = player.agent
+    if not hasattr(agent, "select_moves"):
+        return [agent.select_move(game_engine) for game_engine in game_engines]
+    if observations is None:
+        observations = [
+            agent.convert_state(
+                pa.get_board_state(game_engine), pa.get_dice_value(game_engine)
+            )
+            for game_engine in game_engines
+        ]
+    legal_masks = np.zeros((len(game_engines), agent.action_size), dtype=bool)
+    for row, game_engine in enumerate(game_engines):
+        legal_masks[row, pa.get_available_moves(game_engine)] = True
+    return agent.select_moves(np.array(observations), legal_masks).tolist()
+
+
+def observe_turn(
+    game_engine: GameEngine,
+    players: tuple,
+    player_index: int,
+    recorder: TransitionRecorder,
+    dice_value: int,
+    stopwatch: Stopwatch = None,
+    buffer: TransitionBuffer = None,
+):
+    """
+    Record what the current player sees, its previous move is learned from first.
+
+    :return: the state from convert_state
+    """
+    player = players[player_index]
+    next_state = player.agent.convert_state(pa.get_board_state(game_engine), dice_value)
+    next_state_scores = pa.get_score(game_engine)
+    if stopwatch is not None:
+        stopwatch.lap("convert_state")
+
+    if recorder.pending[player_index]:
+        delayed_reward(
+            game_engine=game_engine,
+            player=player,
+            prev_state=recorder.states[player_index],
+            prev_scores=recorder.scores[player_index],
+            prev_dice=recorder.dice[player_index],
+            prev_action=recorder.actions[player_index],
+            next_state=next_state,
+            next_scores=next_state_scores,
+            game_over=False,
+            winner=pa.get_winner(game_engine),
+            stopwatch=stopwatch,
+            buffer=buffer,
+        )
+    recorder.observe(player_index, next_state, next_state_scores, dice_value)
+    if stopwatch is not None:
+        stopwatch.lap("record")
+    return next_state
+
+
+def finish_episode(
+    game_engine: GameEngine,
+    players: tuple,
+    recorder: TransitionRecorder,
+    dice_value: int,
+    timer: PhaseTimer = None,
+    buffers=None,
+):
+    """Players with a pending move learn from the end of the game."""
+    # run delayed reward after the game is over, for the player that made the last move first
+    # we know that game engine current player is the one that did the last move, since we do not switch players after end_turn
+    last_player_index = pa.get_current_player(game_engine)
+    stopwatch = None
+    for player_index in (last_player_index, 1 - last_player_index):
+        player = players[player_index]
+        if player.reward_func is None or not recorder.pending[player_index]:
+            continue
+        if timer is not None:
+            stopwatch = Stopwatch(timer, player.agent.nickname)
+        # the dice of the last turn is passed along, it doesn't matter for a finished game
+        delayed_reward(
+            game_engine=game_engine,
+            player=player,
+            prev_state=recorder.states[player_index],
+            prev_scores=recorder.scores[player_index],
+            prev_dice=recorder.dice[player_index],
+            prev_action=recorder.actions[player_index],
+            next_state=player.agent.convert_state(
+                pa.get_board_state(engine=game_engine, player=player_index),
+                dice_value,
+            ),
+            next_scores=pa.get_score(engine=game_engine, player=player_index),
+            game_over=True,
+            winner=pa.get_winner(game_engine),
+            stopwatch=stopwatch,
+            buffer=buffers[player_index] if buffers else None,
+        )
+        recorder.pending[player_index] = False
+
+
 def delayed_reward(
     game_engine: GameEngine,
     player: PlayingAgent,
@@ -317,6 +592,8 @@ def delayed_reward(
     next_scores: tuple,
     game_over: bool,
     winner: int,
+    stopwatch: Stopwatch = None,
+    buffer: TransitionBuffer = None,
 ):
     reward = player.reward_func(
         game_engine=game_engine,
@@ -329,10 +606,16 @@ def delayed_reward(
         next_state=next_state,
         next_scores=next_scores,
     )
+    if stopwatch is not None:
+        stopwatch.lap("reward")
     # print(
     #     f"prev_state: {prev_state}, prev_scores: {prev_scores}, prev_action: {prev_action}, prev_dice: {prev_dice}, next_state: {next_state}, next_scores: {next_scores}, game_over: {game_over}, winner: {winner}, reward: {reward}"
     # )
 
+    if buffer is not None:
+        buffer.append(prev_state, prev_action, reward, next_state, game_over, winner)
+        return
+
     player.agent.learn(
         prev_state=prev_state,
         action=prev_action,
@@ -341,9 +624,63 @@ def delayed_reward(
         game_over=game_over,
         winner=winner,
     )
+    if stopwatch is not None:
+        stopwatch.lap("learn")
+
+
+def publish_heartbeat(
+    metrics: TrainingMetrics,
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_engine: GameEngine,
+    episode: int,
+    episodes: int,
+    possible_states: int,
+    timer: PhaseTimer = None,
+):
+    """Collect gauges of the agents and the last game, and publish them with the counters."""
+    record_agent_metrics(metrics, player_1, possible_states)
+    record_agent_metrics(metrics, player_2, possible_states)
+
+    metrics.set_gauge(
+        "moves per game", metrics.counters["moves"] / metrics.counters["episodes played"]
+    )
+    scores = pa.get_score(engine=game_engine, player=0)
+    metrics.set_gauge(f"{player_1.agent.nickname} last game score", scores[0])
+    metrics.set_gauge(f"{player_2.agent.nickname} last game score", scores[1])
+    metrics.set_text(
+        "last game board", game_engine.game_board.display(enable_print=False)
+    )
+    if timer is not None:
+        for (agent_name, phase), timings in timer.report().items():
+            for name, value in timings.items():
+                unit = "" if name == "count" else " (µs)"
+                metrics.set_gauge(f"{agent_name} {phase} {name}{unit}", value)
+    metrics.publish(episode=episode, episodes=episodes)
 
 
-def save_list(list, save_path):
-    """Save the List to a file."""
-    with open(save_path, "wb") as file:
-        pickle.dump(list, file)
+def record_agent_metrics(
+    metrics: TrainingMetrics, player: PlayingAgent, possible_states: int
+):
+    """Set gauges for the learning stats of an agent and the size of a tabular model."""
+    agent = player.agent
+    nickname = agent.nickname
+    if hasattr(agent, "learning_rate"):
+        metrics.set_gauge(f"{nickname} learning rate", agent.learning_rate)
+    if hasattr(agent, "exploration_rate"):
+        metrics.set_gauge(f"{nickname} exploration rate", agent.exploration_rate)
+    if getattr(agent, "last_loss", None) is not None:
+        metrics.set_gauge(f"{nickname} loss", float(agent.last_loss))
+    if hasattr(agent, "update_count"):
+        metrics.set_counter(f"{nickname} gradient steps", agent.update_count)
+
+    model = getattr(agent, "model", None)
+    if not (isinstance(model, dict) or hasattr(model, "stats")) or len(model) == 0:
+        return
+    metrics.set_gauge(f"{nickname} q-table size", len(model))
+    metrics.set_gauge(
+        f"{nickname} share of all possible states", len(model) / possible_states
+    )
+    if hasattr(model, "stats"):
+        for name, value in model.stats().items():
+            metrics.set_gauge(f"{nickname} {name}", value)
@@ -0,0 +1,156 @@
+"""
+Micro benchmarks of the hot paths of training.
+
+python -m training.benchmarks replay_sampling dqn_training inference_latency
+"""
+
+import argparse
+import time
+import numpy as np
+import training.reward_models_v2 as rm
+from agents.replay_buffers import ReplayBuffer, PrioritizedReplayBuffer
+from utils.play_game import PlayingAgent, GameRules
+
+
+def fill_replay_buffer(buffer, state_size=19, max_dice_value=6, chunk_size=100 * 1000):
+    """Fill the buffer with random transitions, in chunks to keep memory flat."""
+    rng = np.random.default_rng(0)
+    for _ in range(0, buffer.capacity, chunk_size):
+        count = min(chunk_size, buffer.capacity - len(buffer))
+        states = rng.integers(0, max_dice_value + 1, (count, state_size), dtype=np.uint8)
+        buffer.add_batch(
+            states,
+            rng.integers(0, 3, count),
+            rng.standard_normal(count),
+            states,
+            rng.random(count) < 0.05,
+        )
+
+
+def replay_sampling(capacity=1000 * 1000, batch_size=64, minibatches=10 * 1000):
+    """
+    Minibatches per second drawn from full uniform and prioritized buffers.
+
+    Prioritized minibatches include the importance weights and the priority
+    update a gradient step makes.
+    """
+    results = {}
+    for name, buffer in (
+        ("uniform", ReplayBuffer(capacity, 19)),
+        ("prioritized", PrioritizedReplayBuffer(capacity, 19)),
+    ):
+        fill_replay_buffer(buffer)
+        td_errors = np.random.default_rng(1).standard_normal((minibatches, batch_size))
+        start = time.perf_counter()
+        for minibatch in range(minibatches):
+            indices = buffer.sample_indices(batch_size)
+            buffer.get(indices)
+            buffer.importance_weights(indices)
+            buffer.update_priorities(indices, td_errors[minibatch])
+        elapsed = time.perf_counter() - start
+        results[name] = minibatches / elapsed
+        print(
+            f"{name} replay, capacity {capacity:,}, batch {batch_size}: "
+            f"{results[name]:,.0f} minibatches/s, {results[name] * batch_size:,.0f} transitions/s"
+        )
+    return results
+
+
+DQN_SCHEDULES = {
+    "step per move": {},
+    "train_every=4": {"train_every": 4},
+    "train_every=4, concurrent_games=64": {"train_every": 4, "concurrent_games": 64},
+    "train_every=4, expected_dice_target": {"train_every": 4, "expected_dice_target": True},
+    "train_every=16, gradient_steps=4, tau=0.01": {
+        "train_every": 16,
+        "gradient_steps": 4,
+        "target_update_tau": 0.01,
+    },
+}
+
+
+def dqn_training(episodes=500, device="cpu"):
+    """Episodes and gradient steps per second of DQN training against a random agent, per update schedule."""
+    # imported here, so the replay benchmark runs without torch
+    import training.agent_trainer as agent_trainer
+    from agents.deep_q_learning import DeepQLearningAgent
+    from agents.random_agent_v2 import RandomAgent
+
+    results = {}
+    for name, options in DQN_SCHEDULES.items():
+        options = dict(options)
+        concurrent_games = options.pop("concurrent_games", None)
+        agent = DeepQLearningAgent(device=device, should_save_model=False, **options)
+        start = time.perf_counter()
+        agent_trainer.train_agents(
+            PlayingAgent(agent, rm.calculate_for_own_score_only),
+            PlayingAgent(RandomAgent(), None),
+            GameRules(),
+            episodes=episodes,
+            metrics_sinks=[],
+            concurrent_games=concurrent_games,
+        )
+        elapsed = time.perf_counter() - start
+        results[name] = (episodes / elapsed, agent.update_count / elapsed)
+        print(
+            f"DQN {name}: {results[name][0]:,.1f} episodes/s, "
+            f"{results[name][1]:,.1f} gradient steps/s"
+        )
+    return results
+
+
+def inference_latency(batch_sizes=(1, 256), calls=2000, state_size=19):
+    """Microseconds per forward pass of the networks, the column network included, in eager mode, compiled and int8 quantized."""
+    import torch
+    from agents.column_network import ColumnNetwork
+    from agents.deep_q_learning import DQN
+    from agents.inference import compile_for_inference, quantize_dynamic
+    from agents.policy_gradient_agent import PolicyNetwork
+
+    results = {}
+    for network, size in (
+        (DQN(state_size, 3), state_size),
+        (PolicyNetwork(state_size, 3), state_size),
+        (ColumnNetwork(), 7),
+    ):
+        network.eval()
+        quantized = quantize_dynamic(network)
+        for mode, module in (
+            ("eager", network),
+            ("compiled", compile_for_inference(network)),
+            ("int8", quantized),
+            ("int8 compiled", compile_for_inference(quantized)),
+        ):
+            for batch_size in batch_sizes:
+                # dice values, valid column ids as well
+                states = torch.randint(0, 7, (batch_size, size)).float()
+                with torch.no_grad():
+                    for _ in range(calls // 10):
+                        module(states)
+                    start = time.perf_counter()
+                    for _ in range(calls):
+                        module(states)
+                latency = (time.perf_counter() - start) / calls * 1000 * 1000
+                name = type(network).__name__
+                results[(name, mode, batch_size)] = latency
+                print(f"{name} {mode}, batch {batch_size}: {latency:,.1f} µs per call")
+    return results
+
+
+BENCHMARKS = {
+    "replay_sampling": replay_sampling,
+    "dqn_training": dqn_training,
+    "inference_latency": inference_latency,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run training micro benchmarks.")
+    parser.add_argument("benchmarks", nargs="*", choices=sorted(BENCHMARKS), help="all by default")
+    args = parser.parse_args()
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
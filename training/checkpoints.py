@@ -0,0 +1,136 @@
+"""
+Resumable training checkpoints.
+
+A checkpoint holds everything train_agents needs to continue a run where it
+stopped: both players (agents with their models, optimizers and exploration
+rate, reward functions), game rules, episode index, counters, the state of
+the random number generators and the trainer options (metrics sinks, stopping
+rules, learn_every, ...).
+
+Resume a run with:
+python -m training.checkpoints --resume ./models/run.checkpoint
+"""
+
+import argparse
+import os
+import pickle
+import queue
+import random
+import sys
+import threading
+import numpy as np
+
+CHECKPOINT_VERSION = 3
+
+
+def get_rng_state():
+    """State of every random number generator used during training."""
+    state = {"random": random.getstate(), "numpy": np.random.get_state()}
+    # only pay for torch if an agent already imported it
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        state["torch"] = torch.get_rng_state()
+        if torch.cuda.is_available():
+            state["torch_cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state["random"])
+    np.random.set_state(state["numpy"])
+    if "torch" in state:
+        import torch
+
+        torch.set_rng_state(state["torch"])
+        if "torch_cuda" in state and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(state["torch_cuda"])
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints from a background thread.
+
+    The checkpoint is pickled on the calling thread, so it's a consistent
+    snapshot, and written to a temporary file that is renamed over the old
+    checkpoint once complete, so a crash never leaves a half written one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # one checkpoint in flight at most, the next save waits for it
+        self._checkpoints = queue.Queue(maxsize=1)
+        self._writer = threading.Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+    def save(self, checkpoint: dict):
+        checkpoint = dict(checkpoint, version=CHECKPOINT_VERSION)
+        self._checkpoints.put(pickle.dumps(checkpoint, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _write(self):
+        while True:
+            data = self._checkpoints.get()
+            if data is None:
+                self._checkpoints.task_done()
+                return
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_path, self.path)
+            self._checkpoints.task_done()
+
+    def close(self):
+        """Wait for the last checkpoint to be written."""
+        self._checkpoints.put(None)
+        self._writer.join()
+
+
+def load_checkpoint(path):
+    with open(path, "rb") as file:
+        checkpoint = pickle.load(file)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}")
+    return checkpoint
+
+
+def resume_training(path, episodes=None, checkpoint_every=None):
+    """
+    Continue the run saved in the checkpoint at path.
+
+    :param episodes: change the total number of episodes of the run.
+    :param checkpoint_every: change how often checkpoints are written.
+    :return: wins, losses, draws
+    """
+    # imported here, agent_trainer uses this module
+    import training.agent_trainer as agent_trainer
+
+    checkpoint = load_checkpoint(path)
+    return agent_trainer.train_agents(
+        checkpoint["player_1"],
+        checkpoint["player_2"],
+        checkpoint["game_rules"],
+        episodes=episodes or checkpoint["episodes"],
+        write_result_history=checkpoint["result_history"] is not None,
+        write_result_scores=checkpoint["result_scores"],
+        checkpoint_path=path,
+        checkpoint_every=checkpoint_every or checkpoint["checkpoint_every"],
+        resume_from=checkpoint,
+        **checkpoint["options"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resume training from a checkpoint.")
+    parser.add_argument("--resume", required=True, help="path of the checkpoint")
+    parser.add_argument("--episodes", type=int, help="total episodes of the run")
+    parser.add_argument("--checkpoint-every", type=int, help="episodes between checkpoints")
+    args = parser.parse_args()
+    resume_training(args.resume, args.episodes, args.checkpoint_every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Declarative training runs.
+
+A run is described by a JSON, TOML or YAML (needs PyYAML) file with the
+players, game rules, episodes, training mode and checkpoint policy, i.e.
+training/configs/simple_vs_random.toml. Agents and reward models are given
+by a short name or "module:attribute" and only imported when a run uses them,
+so a tabular run never imports torch.
+
+python -m training training/configs/simple_vs_random.toml
+"""
+
+import importlib
+import json
+import os
+from utils.play_game import PlayingAgent, GameRules
+
+AGENTS = {
+    "random": "agents.random_agent_v2:RandomAgent",
+    "q_learning": "agents.simple_q_learning_v2:QLearningAgent",
+    "q_win_reinforcement": "agents.simple_q_win_reinforcment:SimpleQWinReinforcementAgent",
+    "deep_q": "agents.deep_q_learning:DeepQLearningAgent",
+    "policy_gradient": "agents.policy_gradient_agent:PolicyGradientAgent",
+}
+
+Q_TABLES = {
+    "tiered": "agents.q_tables:TieredQTable",
+    "array": "agents.q_tables:ArrayQTable",
+}
+
+STOPPING_RULES = {
+    "win_rate_confidence": "training.stopping:WinRateConfidence",
+    "sprt": "training.stopping:SPRT",
+    "q_value_plateau": "training.stopping:QValuePlateau",
+}
+
+# name of the mode -> trainer and the name of its worker count argument
+MODES = {
+    "single": ("training.agent_trainer:train_agents", None),
+    "hogwild": ("training.parallel_trainer:train_agents_hogwild", "workers"),
+    "sharded": ("training.parallel_trainer:train_agents_sharded", "workers"),
+    "actor_learner": ("training.parallel_trainer:train_agents_actor_learner", "actors"),
+}
+
+
+def resolve(name, registry=None, default_module=None):
+    """
+    Import what name points to.
+
+    :param name: key of the registry, "module:attribute" or an attribute of default_module.
+    """
+    if registry is not None and name in registry:
+        name = registry[name]
+    module_name, _, attribute = name.rpartition(":")
+    if not module_name:
+        if default_module is None:
+            raise ValueError(
+                f"Unknown name {name}, expected one of {sorted(registry or [])} or module:attribute"
+            )
+        module_name = default_module
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def load_config(path):
+    """Read a run config, the format is picked by the file extension."""
+    config = read_config_file(path)
+    validate_config(config)
+    return config
+
+
+def read_config_file(path):
+    """Parse a JSON, TOML or YAML file into a dict."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path, encoding="utf-8") as file:
+            config = json.load(file)
+    elif extension == ".toml":
+        import tomllib
+
+        with open(path, "rb") as file:
+            config = tomllib.load(file)
+    elif extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as error:
+            raise ImportError(
+                "YAML configs need PyYAML, pip install pyyaml"
+            ) from error
+        with open(path, encoding="utf-8") as file:
+            config = yaml.safe_load(file)
+    else:
+        raise ValueError(
+            f"Unsupported config format {extension}, use .json, .toml or .yaml"
+        )
+    return config
+
+
+def validate_config(config):
+    if len(config.get("players", [])) != 2:
+        raise ValueError("A run config needs exactly two players")
+    mode = config.get("mode", "single")
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode}, expected one of {sorted(MODES)}")
+    for option in ("checkpoint", "stopping"):
+        if option in config and mode != "single":
+            raise ValueError(f"{option} is only supported in single mode")
+
+
+def build_reward(config):
+    """
+    Reward function of a player.
+
+    :param config: None for players that don't learn, a function of training.reward_models_v2 (or module:function),
+        or a table with model (a reward model class) and its params.
+    """
+    if config is None:
+        return None
+    if isinstance(config, str):
+        return resolve(config, default_module="training.reward_models_v2")
+    reward_model = resolve(config["model"], default_module="training.reward_models_v2")
+    return reward_model(**config.get("params", {})).calculate_reward
+
+
+def build_player(config):
+    params = dict(config.get("params", {}))
+    if "q_table" in params:
+        table = dict(params["q_table"])
+        params["q_table"] = resolve(table.pop("type"), Q_TABLES)(**table)
+    agent = resolve(config["agent"], AGENTS)(**params)
+    return PlayingAgent(
+        agent, build_reward(config.get("reward")), config.get("model_name")
+    )
+
+
+def build_stopping_rule(config):
+    """Stopping rule from a table with rule (name or module:Class) and its parameters."""
+    params = dict(config)
+    return resolve(params.pop("rule"), STOPPING_RULES)(**params)
+
+
+def build_metrics_sinks(config):
+    """Sinks from a metrics table with console (default true), jsonl and csv paths."""
+    if config is None:
+        return None
+    from training.metrics import ConsoleSink, JsonlSink, CsvSink
+
+    sinks = [ConsoleSink()] if config.get("console", True) else []
+    if "jsonl" in config:
+        sinks.append(JsonlSink(config["jsonl"]))
+    if "csv" in config:
+        sinks.append(CsvSink(config["csv"]))
+    return sinks
+
+
+def run(config, episodes=None):
+    """
+    Train the players of a loaded config.
+
+    :param episodes: overrides the episodes of the config.
+    :return: wins, losses, draws
+    """
+    mode = config.get("mode", "single")
+    trainer_name, workers_argument = MODES[mode]
+    player_1, player_2 = (build_player(player) for player in config["players"])
+    game_rules = GameRules(**config.get("game_rules", {}))
+
+    options = dict(config.get("options", {}))
+    if workers_argument is not None and "workers" in config:
+        options[workers_argument] = config["workers"]
+    if mode == "single":
+        sinks = build_metrics_sinks(config.get("metrics"))
+        if sinks is not None:
+            options["metrics_sinks"] = sinks
+        if "stopping" in config:
+            options["stopping_rules"] = [
+                build_stopping_rule(rule) for rule in config["stopping"]
+            ]
+        if "checkpoint" in config:
+            options["checkpoint_path"] = config["checkpoint"]["path"]
+            if "every" in config["checkpoint"]:
+                options["checkpoint_every"] = config["checkpoint"]["every"]
+
+    return resolve(trainer_name)(
+        player_1,
+        player_2,
+        game_rules,
+        episodes=episodes or config.get("episodes", 1000),
+        **options,
+    )
@@ -0,0 +1,206 @@
+"""
+Training metrics collected by the training loop and written out by a background thread.
+
+The training loop only increments counters and sets gauges, every publish
+turns them into a flat record (counters, gauges and rates) that is handed to
+a background thread, which writes it to the sinks. A sink is anything with
+write(record) and close(), i.e. ConsoleSink, JsonlSink or CsvSink.
+"""
+
+import csv
+import json
+import queue
+import threading
+import time
+
+
+class TrainingMetrics:
+    """Counters, gauges and windowed rates of a training run."""
+
+    def __init__(self, sinks=None, window=10 * 1000):
+        """
+        :param sinks: where records are written, defaults to printing them.
+        :param window: number of recent games the rolling win rate is calculated over.
+        """
+        self.sinks = sinks if sinks is not None else [ConsoleSink()]
+        self.counters = {}
+        self.gauges = {}
+        self.text = {}
+
+        self.window = window
+        self._results = [0] * window
+        self._results_index = 0
+        self._results_count = 0
+        self._results_sum = 0
+
+        self._start_time = time.time()
+        self._last_publish_time = self._start_time
+        self._last_publish_counters = {}
+
+        self._records = queue.Queue()
+        self._writer = threading.Thread(target=self._write, daemon=True)
+        self._writer.start()
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_counter(self, name, value):
+        """Counter kept somewhere else, i.e. by an agent, it still gets a rate per second."""
+        self.counters[name] = value
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def set_text(self, name, lines):
+        """Text that is only useful for humans, i.e. the board of the last game."""
+        self.text[name] = lines
+
+    def record_result(self, result):
+        """Add 1 for a win, 0 for a draw or -1 for a loss to the rolling window."""
+        index = self._results_index
+        self._results_sum += (result == 1) - (self._results[index] == 1)
+        self._results[index] = result
+        self._results_index = (index + 1) % self.window
+        if self._results_count < self.window:
+            self._results_count += 1
+
+    def rolling_results(self):
+        """Wins and games in the rolling window."""
+        return self._results_sum, self._results_count
+
+    def rolling_win_rate(self):
+        if self._results_count == 0:
+            return 0.0
+        return self._results_sum / self._results_count
+
+    def publish(self, **fields):
+        """Snapshot the metrics with the extra fields and queue them for the sinks."""
+        now = time.time()
+        elapsed = now - self._last_publish_time
+        record = {"time": now, "elapsed seconds": now - self._start_time}
+        record.update(fields)
+        record.update(self.counters)
+
+        for name, value in self.counters.items():
+            previous = self._last_publish_counters.get(name, 0)
+            record[f"{name} per second"] = (value - previous) / elapsed if elapsed else 0.0
+        record["rolling win rate"] = self.rolling_win_rate()
+        record.update(self.gauges)
+        if self.text:
+            record["text"] = dict(self.text)
+
+        self._last_publish_time = now
+        self._last_publish_counters = dict(self.counters)
+        self._records.put(record)
+        return record
+
+    def _write(self):
+        while True:
+            record = self._records.get()
+            if record is not None:
+                for sink in self.sinks:
+                    sink.write(record)
+            self._records.task_done()
+            if record is None:
+                return
+
+    def close(self):
+        """Write out everything published so far and close the sinks."""
+        self._records.put(None)
+        self._writer.join()
+        for sink in self.sinks:
+            sink.close()
+
+
+class ConsoleSink:
+    """Print records in the same spirit as the old heartbeat."""
+
+    def write(self, record):
+        if "episode" in record:
+            print(f"Episode {record['episode']:,}/{record.get('episodes', 0):,}")
+        for name, value in record.items():
+            if name in ("time", "episode", "episodes", "text"):
+                continue
+            if isinstance(value, float):
+                print(f"{name}: {value:,.4f}")
+            elif isinstance(value, int):
+                print(f"{name}: {value:,}")
+            else:
+                print(f"{name}: {value}")
+        for lines in record.get("text", {}).values():
+            print("\n".join(lines))
+        print("\n")
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """Append every record as a line of JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+
+    def __getstate__(self):
+        # pickled with training checkpoints, the file is opened again on load
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink:
+    """
+    Write numeric fields of the records as CSV.
+
+    Columns come from fields, or from the first record if not given, fields
+    that show up in later records only (i.e. loss) are left out then.
+    A sink loaded from a training checkpoint appends to the file with the same columns.
+    """
+
+    def __init__(self, path, fields=None):
+        self.path = path
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.fields = fields
+        self.writer = None
+
+    def __getstate__(self):
+        fields = self.fields if self.writer is None else self.writer.fieldnames
+        return {"path": self.path, "fields": fields, "header": self.writer is not None}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self.fields = state["fields"]
+        self.writer = None
+        if not state["header"]:
+            self.file = open(self.path, "w", newline="", encoding="utf-8")
+            return
+        self.file = open(self.path, "a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(
+            self.file, fieldnames=self.fields, extrasaction="ignore"
+        )
+
+    def write(self, record):
+        row = {
+            name: value
+            for name, value in record.items()
+            if isinstance(value, (int, float))
+        }
+        if self.writer is None:
+            self.writer = csv.DictWriter(
+                self.file, fieldnames=self.fields or list(row), extrasaction="ignore"
+            )
+            self.writer.writeheader()
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,755 @@
+"""Utility to train agents against each other on multiple cores."""
+
+import os
+import random
+import time
+import datetime
+import multiprocessing
+import queue
+import numpy as np
+import training.agent_trainer as agent_trainer
+from agents.q_tables import SharedQTable
+from training.transitions import TransitionRecorder, TransitionBuffer
+from utils.play_game import PlayingAgent, GameRules
+
+WINS, LOSSES, DRAWS, MOVES = range(4)
+
+
+def is_tabular_learner(player: PlayingAgent):
+    """Players that learn into a table the workers can share."""
+    return player.reward_func is not None and hasattr(player.agent.model, "items")
+
+
+def count_result(local, game_engine, move_counter):
+    """Add the result and moves of a finished game to the [wins, losses, draws, moves] counters."""
+    winner = game_engine.winner
+    if winner == 0:
+        local[WINS] += 1
+    elif winner == 1:
+        local[LOSSES] += 1
+    else:
+        local[DRAWS] += 1
+    local[MOVES] += move_counter
+
+
+def exploration_rate_after(agent, initial_exploration_rate, learn_steps):
+    """Exploration rate the agent would have after learn_steps single process updates."""
+    return max(
+        agent.min_exploration_rate,
+        initial_exploration_rate * agent.exploration_decay**learn_steps,
+    )
+
+
+def train_agents_hogwild(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    episodes=1000,
+    workers=None,
+    table_capacity=1 << 24,
+    sync_every=1000,
+    heartbeat_seconds=60,
+):
+    """
+    Train agents with Hogwild style parallelism.
+
+    Tabular agents get their Q-table moved into shared memory and each of the
+    worker processes plays its own games against its own copy of the opponent,
+    updating the shared table without locks. Workers add their win/loss/draw
+    counters to shared counters every sync_every episodes and take the
+    exploration rate from the global number of moves, so the schedule matches
+    a single process run of the same length.
+
+    :param workers: number of worker processes, defaults to the number of cores.
+    :param table_capacity: number of states the shared tables can hold.
+    :param sync_every: episodes between updates of the shared counters.
+    :param heartbeat_seconds: seconds between progress prints.
+    :return: wins, losses, draws of player 1
+    """
+    workers = workers or os.cpu_count()
+    perf_timer_total_run = time.time()
+
+    shared_players = [
+        player for player in (player_1, player_2) if is_tabular_learner(player)
+    ]
+    original_models = {}
+    initial_exploration_rates = {
+        player: player.agent.exploration_rate
+        for player in shared_players
+        if hasattr(player.agent, "exploration_decay")
+    }
+    for player in shared_players:
+        original_models[player] = player.agent.model
+        shared_table = SharedQTable(table_capacity)
+        shared_table.update(player.agent.model)
+        player.agent.model = shared_table
+
+    counters = multiprocessing.Array("q", 4)
+    stop = multiprocessing.Value("b", 0)
+    # split the episodes as evenly as possible
+    worker_episodes = [
+        episodes // workers + (1 if i < episodes % workers else 0)
+        for i in range(workers)
+    ]
+    base_seed = random.randrange(2**32)
+    processes = [
+        multiprocessing.Process(
+            target=_hogwild_worker,
+            args=(
+                player_1,
+                player_2,
+                game_rules,
+                worker_episodes[i],
+                sync_every,
+                counters,
+                stop,
+                base_seed + i,
+            ),
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        while any(process.is_alive() for process in processes):
+            for process in processes:
+                process.join(timeout=heartbeat_seconds / len(processes))
+            # the table is left half trained if a worker failed, don't save it
+            check_exit_codes(processes)
+            if agent_trainer.interrupted:
+                stop.value = 1
+            print_heartbeat(
+                player_1, player_2, counters, episodes, perf_timer_total_run
+            )
+        check_exit_codes(processes)
+    finally:
+        stop.value = 1
+        for process in processes:
+            process.join()
+
+        for player in shared_players:
+            shared_table = player.agent.model
+            model = original_models[player]
+            for state, values in shared_table.items():
+                model[state] = values
+            player.agent.model = model
+            shared_table.close()
+
+        for player, initial_exploration_rate in initial_exploration_rates.items():
+            player.agent.exploration_rate = exploration_rate_after(
+                player.agent, initial_exploration_rate, counters[MOVES] // 2
+            )
+
+    wins, losses, draws = counters[WINS], counters[LOSSES], counters[DRAWS]
+    print(
+        f"Total time taken: {time.time() - perf_timer_total_run} for {wins+draws+losses:,} episodes on {workers} workers"
+    )
+    if player_1.model_name is not None:
+        player_1.agent.save_model(f"./models/{player_1.model_name}.pkl")
+
+    if player_2.model_name is not None:
+        player_2.agent.save_model(f"./models/{player_2.model_name}.pkl")
+
+    print(
+        f"Training completed. {player_1.agent.nickname} Wins: {wins:,}, {player_2.agent.nickname} Wins: {losses:,}, Draws: {draws:,}"
+    )
+
+    return wins, losses, draws
+
+
+def _hogwild_worker(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    episodes,
+    sync_every,
+    counters,
+    stop,
+    seed,
+):
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    learners = [
+        player.agent
+        for player in (player_1, player_2)
+        if is_tabular_learner(player) and hasattr(player.agent, "exploration_decay")
+    ]
+    initial_exploration_rates = [agent.exploration_rate for agent in learners]
+    recorder = TransitionRecorder()
+    local = [0, 0, 0, 0]
+
+    for episode in range(episodes):
+        game_engine, move_counter = agent_trainer.play_episode(
+            player_1, player_2, game_rules, recorder=recorder
+        )
+        count_result(local, game_engine, move_counter)
+
+        if (episode + 1) % sync_every == 0 or episode + 1 == episodes:
+            with counters.get_lock():
+                for i, value in enumerate(local):
+                    counters[i] += value
+                total_moves = counters[MOVES]
+            local = [0, 0, 0, 0]
+
+            # each player makes about half of the moves, one learn step per move
+            for agent, initial_exploration_rate in zip(
+                learners, initial_exploration_rates
+            ):
+                agent.exploration_rate = exploration_rate_after(
+                    agent, initial_exploration_rate, total_moves // 2
+                )
+
+            if stop.value or agent_trainer.interrupted:
+                break
+
+
+class TrackingQTable:
+    """
+    Wraps a worker's private Q-table and records what changed since the last merge.
+
+    get() hands out copies, so the value a state had at the last merge is still
+    in the wrapped table when the first update of the state is written.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._base = {}
+        self._visits = {}
+
+    def get(self, state, default=None):
+        values = self.table.get(state)
+        if values is None:
+            return default
+        return list(values)
+
+    def __getitem__(self, state):
+        return list(self.table[state])
+
+    def __setitem__(self, state, values):
+        if state not in self._base:
+            base = self.table.get(state)
+            self._base[state] = (
+                list(base) if base is not None else [0.0] * len(values)
+            )
+            self._visits[state] = 0
+        self._visits[state] += 1
+        self.table[state] = values
+
+    def __contains__(self, state):
+        return state in self.table
+
+    def __len__(self):
+        return len(self.table)
+
+    def items(self):
+        return self.table.items()
+
+    def take_delta(self):
+        """
+        Changes since the last call.
+
+        :return: states (int64), summed updates per action (float64) and visit counts (uint32)
+        """
+        states = list(self._base)
+        updates = np.zeros((len(states), 0))
+        if states:
+            updates = np.array(
+                [self.table.get(state) for state in states], dtype=np.float64
+            ) - np.array([self._base[state] for state in states], dtype=np.float64)
+        visits = np.fromiter(
+            (self._visits[state] for state in states), dtype=np.uint32, count=len(states)
+        )
+        self._base = {}
+        self._visits = {}
+        return np.array(states, dtype=np.int64), updates, visits
+
+    def apply(self, states, values):
+        """Overwrite states with merged values, without tracking them as changes."""
+        for state, state_values in zip(states.tolist(), values.tolist()):
+            self.table[state] = state_values
+
+
+def merge_deltas(table, deltas, action_size=3):
+    """
+    Merge the changes of several workers into table.
+
+    Every state gets the visit weighted average of the workers' summed updates
+    added to its value in table, so a worker that visited a state more often
+    has a bigger say in where it ends up.
+
+    :param table: Q-table holding the values from the last merge, updated in place.
+    :param deltas: list of (states, updates, visits) from TrackingQTable.take_delta.
+    :return: merged states and their new values, to be broadcast to the workers
+    """
+    deltas = [delta for delta in deltas if len(delta[0])]
+    if not deltas:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, action_size))
+
+    states = np.concatenate([delta[0] for delta in deltas])
+    updates = np.concatenate([delta[1] for delta in deltas])
+    visits = np.concatenate([delta[2] for delta in deltas]).astype(np.float64)
+
+    merged_states, inverse = np.unique(states, return_inverse=True)
+    weighted_updates = np.zeros((len(merged_states), updates.shape[1]))
+    np.add.at(weighted_updates, inverse, updates * visits[:, None])
+    total_visits = np.zeros(len(merged_states))
+    np.add.at(total_visits, inverse, visits)
+
+    merged_values = weighted_updates / total_visits[:, None]
+    for i, state in enumerate(merged_states.tolist()):
+        base = table.get(state)
+        if base is not None:
+            merged_values[i] += base
+        table[state] = merged_values[i].tolist()
+
+    return merged_states, merged_values
+
+
+def train_agents_sharded(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    episodes=1000,
+    workers=None,
+    merge_every=10 * 1000,
+    seed=None,
+):
+    """
+    Train agents on multiple processes that each keep a private Q-table.
+
+    Workers play on disjoint seed streams and every merge_every episodes send
+    what changed in their tables to this process, which merges the changes
+    into the players' tables (see merge_deltas) and broadcasts the merged
+    values back. Works with any table that has get/items, i.e. dict or ArrayQTable.
+
+    :param workers: number of worker processes, defaults to the number of cores.
+    :param merge_every: episodes each worker plays between merges.
+    :param seed: seed the workers' seed streams are derived from.
+    :return: wins, losses, draws of player 1
+    """
+    workers = workers or os.cpu_count()
+    perf_timer_total_run = time.time()
+
+    learner_indexes = [
+        i for i, player in enumerate((player_1, player_2)) if is_tabular_learner(player)
+    ]
+    players = (player_1, player_2)
+    initial_exploration_rates = {
+        i: players[i].agent.exploration_rate
+        for i in learner_indexes
+        if hasattr(players[i].agent, "exploration_decay")
+    }
+
+    worker_episodes = [
+        episodes // workers + (1 if i < episodes % workers else 0)
+        for i in range(workers)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    connections = []
+    processes = []
+    for i in range(workers):
+        connection, worker_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_sharded_worker,
+            args=(
+                player_1,
+                player_2,
+                game_rules,
+                worker_episodes[i],
+                merge_every,
+                learner_indexes,
+                worker_connection,
+                int(seeds[i].generate_state(1)[0]),
+            ),
+            daemon=True,
+        )
+        process.start()
+        # only the worker holds its end, so a worker that dies shows up as EOF
+        worker_connection.close()
+        connections.append(connection)
+        processes.append(process)
+
+    counters = [0, 0, 0, 0]
+    active = list(connections)
+    try:
+        while active:
+            deltas = {i: [] for i in learner_indexes}
+            finished = []
+            for connection in active:
+                worker_deltas, worker_counters, done = receive(
+                    connection, processes[connections.index(connection)]
+                )
+                for i, delta in worker_deltas.items():
+                    deltas[i].append(delta)
+                for i, value in enumerate(worker_counters):
+                    counters[i] += value
+                if done:
+                    finished.append(connection)
+
+            broadcast = {
+                i: merge_deltas(players[i].agent.model, deltas[i])
+                for i in learner_indexes
+            }
+            stop = agent_trainer.interrupted
+            for connection in active:
+                connection.send((broadcast, counters[MOVES], stop))
+            active = [
+                connection
+                for connection in active
+                if connection not in finished and not stop
+            ]
+            print_heartbeat(
+                player_1, player_2, counters, episodes, perf_timer_total_run
+            )
+    finally:
+        # workers still waiting for a broadcast get EOF and exit
+        for connection in connections:
+            connection.close()
+        for process in processes:
+            process.join()
+
+    for i, initial_exploration_rate in initial_exploration_rates.items():
+        players[i].agent.exploration_rate = exploration_rate_after(
+            players[i].agent, initial_exploration_rate, counters[MOVES] // 2
+        )
+
+    wins, losses, draws = counters[WINS], counters[LOSSES], counters[DRAWS]
+    print(
+        f"Total time taken: {time.time() - perf_timer_total_run} for {wins+draws+losses:,} episodes on {workers} workers"
+    )
+    if player_1.model_name is not None:
+        player_1.agent.save_model(f"./models/{player_1.model_name}.pkl")
+
+    if player_2.model_name is not None:
+        player_2.agent.save_model(f"./models/{player_2.model_name}.pkl")
+
+    print(
+        f"Training completed. {player_1.agent.nickname} Wins: {wins:,}, {player_2.agent.nickname} Wins: {losses:,}, Draws: {draws:,}"
+    )
+
+    return wins, losses, draws
+
+
+def _sharded_worker(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    episodes,
+    merge_every,
+    learner_indexes,
+    connection,
+    seed,
+):
+    random.seed(seed)
+    np.random.seed(seed)
+    players = (player_1, player_2)
+    for i in learner_indexes:
+        players[i].agent.model = TrackingQTable(players[i].agent.model)
+    learners = {
+        i: players[i].agent
+        for i in learner_indexes
+        if hasattr(players[i].agent, "exploration_decay")
+    }
+    initial_exploration_rates = {
+        i: agent.exploration_rate for i, agent in learners.items()
+    }
+    recorder = TransitionRecorder()
+
+    played = 0
+    while True:
+        local = [0, 0, 0, 0]
+        for _ in range(min(merge_every, episodes - played)):
+            game_engine, move_counter = agent_trainer.play_episode(
+                player_1, player_2, game_rules, recorder=recorder
+            )
+            count_result(local, game_engine, move_counter)
+        played += sum(local[:MOVES])
+        done = played >= episodes
+
+        connection.send(
+            (
+                {i: players[i].agent.model.take_delta() for i in learner_indexes},
+                local,
+                done,
+            )
+        )
+        broadcast, total_moves, stop = connection.recv()
+        for i, (states, values) in broadcast.items():
+            players[i].agent.model.apply(states, values)
+        for i, agent in learners.items():
+            agent.exploration_rate = exploration_rate_after(
+                agent, initial_exploration_rates[i], total_moves // 2
+            )
+
+        if done or stop:
+            break
+
+
+class ActorAgent:
+    """
+    Stands in for a learning agent inside an actor process.
+
+    Moves are selected by the wrapped agent, which plays from the learner's
+    snapshot of the table, and learn() only records the transition.
+    """
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.nickname = agent.nickname
+        self.model = agent.model
+        self._transitions = TransitionBuffer()
+
+    def select_move(self, game_engine):
+        return self.agent.select_move(game_engine)
+
+    def convert_state(self, board_state, dice_value):
+        return self.agent.convert_state(board_state, dice_value)
+
+    def learn(self, prev_state, action, reward, next_state, game_over, winner=None):
+        self._transitions.append(
+            prev_state, action, reward, next_state, game_over, winner
+        )
+
+    def __len__(self):
+        return len(self._transitions)
+
+    def take_batch(self):
+        """Recorded transitions as compact arrays, see TransitionBuffer."""
+        return self._transitions.take()
+
+
+def train_agents_actor_learner(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    episodes=1000,
+    actors=None,
+    batch_size=10 * 1000,
+    publish_every=100 * 1000,
+    table_capacity=1 << 24,
+    heartbeat_seconds=60,
+):
+    """
+    Train agents with actor processes playing and this process learning.
+
+    Actors select moves from a snapshot of each learner's table in shared
+    memory and stream their transitions in batches over a queue. This process
+    owns the real tables, applies the updates with the agent's learn and every
+    publish_every transitions copies the changed states into the snapshot,
+    together with the current exploration rate.
+
+    :param actors: number of actor processes, defaults to the number of cores minus the learner.
+    :param batch_size: transitions an actor collects before sending them.
+    :param publish_every: transitions learned between snapshot updates.
+    :param table_capacity: number of states the snapshot tables can hold.
+    :param heartbeat_seconds: seconds between progress prints.
+    :return: wins, losses, draws of player 1
+    """
+    actors = actors or max(1, os.cpu_count() - 1)
+    perf_timer_total_run = time.time()
+    players = (player_1, player_2)
+    learner_indexes = [i for i, player in enumerate(players) if is_tabular_learner(player)]
+
+    snapshots = {}
+    exploration_rates = multiprocessing.Array("d", 2)
+    for i in learner_indexes:
+        snapshots[i] = SharedQTable(table_capacity)
+        snapshots[i].update(players[i].agent.model)
+        exploration_rates[i] = getattr(players[i].agent, "exploration_rate", 0.0)
+        players[i].agent.model = TrackingQTable(players[i].agent.model)
+
+    transitions = multiprocessing.Queue(maxsize=actors * 4)
+    stop = multiprocessing.Value("b", 0)
+    actor_episodes = [
+        episodes // actors + (1 if i < episodes % actors else 0)
+        for i in range(actors)
+    ]
+    base_seed = random.randrange(2**32)
+    processes = [
+        multiprocessing.Process(
+            target=_actor,
+            args=(
+                player_1,
+                player_2,
+                game_rules,
+                actor_episodes[i],
+                learner_indexes,
+                snapshots,
+                exploration_rates,
+                batch_size,
+                transitions,
+                stop,
+                base_seed + i,
+            ),
+            daemon=True,
+        )
+        for i in range(actors)
+    ]
+    for process in processes:
+        process.start()
+
+    counters = [0, 0, 0, 0]
+    running_actors = actors
+    learned = 0
+    last_publish = 0
+    last_heartbeat = time.time()
+    try:
+        while running_actors:
+            try:
+                message = transitions.get(timeout=1)
+            except queue.Empty:
+                check_workers(processes)
+                continue
+            if message is None:
+                running_actors -= 1
+                continue
+
+            batches, results = message
+            for i, batch in batches.items():
+                players[i].agent.learn_batch(batch)
+                learned += len(batch["actions"])
+            for i, value in enumerate(results):
+                counters[i] += value
+
+            if learned - last_publish >= publish_every:
+                publish_snapshots(players, snapshots, exploration_rates)
+                last_publish = learned
+
+            if agent_trainer.interrupted:
+                stop.value = 1
+            if time.time() - last_heartbeat >= heartbeat_seconds:
+                print_heartbeat(
+                    player_1, player_2, counters, episodes, perf_timer_total_run
+                )
+                last_heartbeat = time.time()
+    finally:
+        stop.value = 1
+        for process in processes:
+            process.join()
+        for i in learner_indexes:
+            players[i].agent.model = players[i].agent.model.table
+            snapshots[i].close()
+
+    wins, losses, draws = counters[WINS], counters[LOSSES], counters[DRAWS]
+    print(
+        f"Total time taken: {time.time() - perf_timer_total_run} for {wins+draws+losses:,} episodes on {actors} actors"
+    )
+    if player_1.model_name is not None:
+        player_1.agent.save_model(f"./models/{player_1.model_name}.pkl")
+
+    if player_2.model_name is not None:
+        player_2.agent.save_model(f"./models/{player_2.model_name}.pkl")
+
+    print(
+        f"Training completed. {player_1.agent.nickname} Wins: {wins:,}, {player_2.agent.nickname} Wins: {losses:,}, Draws: {draws:,}"
+    )
+
+    return wins, losses, draws
+
+
+def check_exit_codes(processes):
+    """Raise if one of the processes failed."""
+    for process in processes:
+        if process.exitcode:
+            raise RuntimeError(f"{process.name} exited with code {process.exitcode}")
+
+
+def check_workers(processes):
+    """Raise if a worker or actor died, this process would wait for its results forever."""
+    check_exit_codes(processes)
+    if not any(process.is_alive() for process in processes):
+        raise RuntimeError("All workers exited without finishing their episodes")
+
+
+def receive(connection, process):
+    """Next message from the worker process at the other end of connection."""
+    while not connection.poll(1):
+        check_workers([process])
+    try:
+        return connection.recv()
+    except EOFError:
+        # the worker closed its end without sending, it died
+        process.join()
+        raise RuntimeError(f"{process.name} exited with code {process.exitcode}") from None
+
+
+def publish_snapshots(players, snapshots, exploration_rates):
+    """Copy states learned since the last publish into the actors' snapshots."""
+    for i, snapshot in snapshots.items():
+        tracking_table = players[i].agent.model
+        states, _, _ = tracking_table.take_delta()
+        for state in states.tolist():
+            snapshot[state] = tracking_table.table.get(state)
+        exploration_rates[i] = getattr(players[i].agent, "exploration_rate", 0.0)
+
+
+def _actor(
+    player_1: PlayingAgent,
+    player_2: PlayingAgent,
+    game_rules: GameRules,
+    episodes,
+    learner_indexes,
+    snapshots,
+    exploration_rates,
+    batch_size,
+    transitions,
+    stop,
+    seed,
+):
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    players = [player_1, player_2]
+    actor_agents = {}
+    for i in learner_indexes:
+        agent = players[i].agent
+        agent.model = snapshots[i]
+        actor_agents[i] = ActorAgent(agent)
+        players[i] = PlayingAgent(actor_agents[i], players[i].reward_func)
+    recorder = TransitionRecorder()
+
+    local = [0, 0, 0, 0]
+    for episode in range(episodes):
+        for i, actor_agent in actor_agents.items():
+            actor_agent.agent.exploration_rate = exploration_rates[i]
+
+        game_engine, move_counter = agent_trainer.play_episode(
+            players[0], players[1], game_rules, recorder=recorder
+        )
+        count_result(local, game_engine, move_counter)
+
+        last_episode = episode + 1 == episodes or stop.value or agent_trainer.interrupted
+        if last_episode or sum(len(agent) for agent in actor_agents.values()) >= batch_size:
+            transitions.put(
+                (
+                    {
+                        i: agent.take_batch()
+                        for i, agent in actor_agents.items()
+                        if len(agent)
+                    },
+                    local,
+                )
+            )
+            local = [0, 0, 0, 0]
+        if last_episode:
+            break
+
+    # tell the learner this actor is done
+    transitions.put(None)
+
+
+def print_heartbeat(player_1, player_2, counters, episodes, perf_timer):
+    wins, losses, draws = counters[WINS], counters[LOSSES], counters[DRAWS]
+    played = wins + losses + draws
+    elapsed = time.time() - perf_timer
+    print(f"Episode {played:,}/{episodes:,}")
+    print(
+        f"Time taken: {str(datetime.timedelta(seconds=int(elapsed)))}, episodes per second: {played / elapsed if elapsed else 0:,.0f}"
+    )
+    for player in (player_1, player_2):
+        if is_tabular_learner(player):
+            print(f"keys in {player.agent.nickname} model: {len(player.agent.model):,}")
+    print(
+        f"{player_1.agent.nickname} Wins: {wins:,}, {player_2.agent.nickname} Wins: {losses:,}, Draws: {draws:,}\n"
+    )
@@ -0,0 +1,81 @@
+"""
+Sampled timings of the phases of a training game.
+
+Only every sample_every-th game is timed, so leaving the timer on costs
+little, and training without a timer only pays for a None check per phase.
+"""
+
+from time import perf_counter_ns
+
+# log2 buckets of nanoseconds, 2**40ns is about 18 minutes
+BUCKETS = 41
+
+
+class PhaseTimer:
+    """Per agent, per phase histograms of sampled durations."""
+
+    def __init__(self, sample_every=100):
+        """
+        :param sample_every: time one out of this many games.
+        """
+        self.sample_every = sample_every
+        self._games = 0
+        self._histograms = {}
+        self._totals = {}
+
+    def sample(self):
+        """Should the next game be timed."""
+        self._games += 1
+        return self._games % self.sample_every == 0
+
+    def add(self, agent_name, phase, nanoseconds):
+        key = (agent_name, phase)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = [0] * BUCKETS
+            self._totals[key] = 0
+        histogram[min(nanoseconds.bit_length(), BUCKETS - 1)] += 1
+        self._totals[key] += nanoseconds
+
+    def report(self):
+        """
+        Summary of the timings since the last report, and start over.
+
+        :return: dict of (agent name, phase) -> count, mean, p50 and p99 in microseconds.
+            Percentiles are upper bounds of the log2 bucket they fall in.
+        """
+        report = {}
+        for key, histogram in self._histograms.items():
+            count = sum(histogram)
+            report[key] = {
+                "count": count,
+                "mean": self._totals[key] / count / 1000,
+                "p50": _percentile(histogram, count, 0.5) / 1000,
+                "p99": _percentile(histogram, count, 0.99) / 1000,
+            }
+        self._histograms = {}
+        self._totals = {}
+        return report
+
+
+def _percentile(histogram, count, quantile):
+    seen = 0
+    for bucket, bucket_count in enumerate(histogram):
+        seen += bucket_count
+        if seen >= quantile * count:
+            return 2**bucket
+    return 2 ** (len(histogram) - 1)
+
+
+class Stopwatch:
+    """Times consecutive phases for a single agent, i.e. stopwatch.lap("learn")."""
+
+    def __init__(self, timer: PhaseTimer, agent_name):
+        self.timer = timer
+        self.agent_name = agent_name
+        self.start = perf_counter_ns()
+
+    def lap(self, phase):
+        now = perf_counter_ns()
+        self.timer.add(self.agent_name, phase, now - self.start)
+        self.start = now
@@ -0,0 +1,121 @@
+"""
+Append-only log of training game results.
+
+Every game is one int8 in the results file: 1 when player 1 won, -1 when
+player 2 won and 0 for a draw. Optionally the final scores go to a second
+file as int16 pairs (player 1, player 2). Results are buffered and written in
+chunks, so a crashed run keeps everything up to its last chunk, and the files
+are read back with np.memmap without loading them into memory.
+"""
+
+import os
+import numpy as np
+
+
+def scores_path(path):
+    return f"{path}.scores"
+
+
+class ResultLog:
+    """Writer of a result log."""
+
+    def __init__(self, path, with_scores=False, chunk_size=64 * 1024, games=None):
+        """
+        :param with_scores: also log the final scores of every game.
+        :param games: continue a log that holds at least this many games, later games are dropped,
+            i.e. the ones played after the checkpoint a run is resumed from.
+        """
+        self.path = path
+        self.with_scores = with_scores
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if games is not None:
+            _truncate(path, games)
+            if with_scores:
+                _truncate(scores_path(path), games * 4)
+        self._results_file = open(path, "ab")
+        self._scores_file = open(scores_path(path), "ab") if with_scores else None
+        self._results = np.empty(chunk_size, dtype=np.int8)
+        self._scores = None
+        if with_scores:
+            self._scores = np.empty((chunk_size, 2), dtype=np.int16)
+        self._buffered = 0
+        self._written = os.path.getsize(path)
+
+    def append(self, result, scores=None):
+        self._results[self._buffered] = result
+        if self._scores is not None:
+            self._scores[self._buffered] = scores
+        self._buffered += 1
+        if self._buffered == len(self._results):
+            self.flush()
+
+    def __len__(self):
+        return self._written + self._buffered
+
+    def flush(self):
+        """Write out the buffered games."""
+        if self._buffered == 0:
+            return
+        self._results_file.write(self._results[: self._buffered].tobytes())
+        self._results_file.flush()
+        if self._scores_file is not None:
+            self._scores_file.write(self._scores[: self._buffered].tobytes())
+            self._scores_file.flush()
+        self._written += self._buffered
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+        self._results_file.close()
+        if self._scores_file is not None:
+            self._scores_file.close()
+
+
+def _truncate(path, size):
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        with open(path, "r+b") as file:
+            file.truncate(size)
+
+
+def read_results(path):
+    """Results of a log as a read only int8 array backed by the file."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.int8)
+    return np.memmap(path, dtype=np.int8, mode="r")
+
+
+def read_scores(path):
+    """Final scores of a log as a read only (games, 2) int16 array backed by the file."""
+    path = scores_path(path)
+    if os.path.getsize(path) == 0:
+        return np.zeros((0, 2), dtype=np.int16)
+    return np.memmap(path, dtype=np.int16, mode="r").reshape(-1, 2)
+
+
+def rolling_win_rate(
+    results, window=10 * 1000, step=1000, chunk_size=10 * 1000 * 1000
+):
+    """
+    Win rate of player 1 over the last window games, every step games.
+
+    Works through the results in chunks, so a memmap of a long run is never
+    loaded into memory as a whole.
+
+    :param window: number of games the rate is calculated over, a multiple of step.
+    :return: array of rates, the i-th over the games up to (i + window / step) * step
+    """
+    if window % step != 0:
+        raise ValueError("window has to be a multiple of step")
+    chunk_size -= chunk_size % step
+    usable = len(results) - len(results) % step
+    block_wins = [
+        (np.asarray(results[start : min(start + chunk_size, usable)]) == 1)
+        .reshape(-1, step)
+        .sum(axis=1)
+        for start in range(0, usable, chunk_size)
+    ]
+    cumulative = np.concatenate(([0], np.cumsum(np.concatenate(block_wins or [[]]))))
+    blocks = window // step
+    return (cumulative[blocks:] - cumulative[:-blocks]) / window
@@ -0,0 +1,192 @@
+"""
+Rules that end a training run once its answer is known.
+
+train_agents checks its stopping_rules at every heartbeat. A rule is any
+object with check(metrics, player_1, player_2) that returns the reason to
+stop, or None to keep going.
+"""
+
+import math
+import random
+from statistics import NormalDist
+
+
+def wilson_interval(wins, games, confidence=0.95):
+    """Wilson score interval of a win rate."""
+    if games == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = wins / games
+    denominator = 1 + z**2 / games
+    center = (rate + z**2 / (2 * games)) / denominator
+    spread = math.sqrt(rate * (1 - rate) / games + z**2 / (4 * games**2))
+    margin = z * spread / denominator
+    return center - margin, center + margin
+
+
+def player_1_results(metrics, player_1):
+    """Wins of player 1 and games played so far."""
+    return (
+        metrics.counters.get(f"{player_1.agent.nickname} wins", 0),
+        metrics.counters.get("episodes played", 0),
+    )
+
+
+class WinRateConfidence:
+    """
+    Stop once the win rate of player 1 is known to within half_width.
+
+    With windowed, the rate over the rolling window of recent games is used,
+    and it also has to stay inside its own confidence interval between
+    patience consecutive heartbeats, so a learning agent isn't stopped while
+    it's still improving. Otherwise all games of the run are counted, which
+    suits runs where nothing learns, i.e. random vs random.
+
+    The window of TrainingMetrics holds 10,000 games, which narrows a win
+    rate around 0.5 to about ±0.0098, so the default half_width is 0.01. A
+    half_width the window can't reach is refused at the first check.
+    """
+
+    def __init__(self, half_width=0.01, confidence=0.95, windowed=True, patience=3):
+        self.half_width = half_width
+        self.confidence = confidence
+        self.windowed = windowed
+        self.patience = patience
+        self._previous_rate = None
+        self._stable = 0
+
+    def check(self, metrics, player_1, player_2):
+        if self.windowed:
+            self._check_window(metrics.window)
+            wins, games = metrics.rolling_results()
+        else:
+            wins, games = player_1_results(metrics, player_1)
+        low, high = wilson_interval(wins, games, self.confidence)
+        if (high - low) / 2 > self.half_width:
+            self._stable = 0
+            self._previous_rate = wins / games if games else None
+            return None
+
+        rate = wins / games
+        if not self.windowed:
+            return (
+                f"win rate {rate:.4f} is within ±{self.half_width} "
+                f"({self.confidence:.0%} confidence)"
+            )
+
+        if self._previous_rate is not None and low <= self._previous_rate <= high:
+            self._stable += 1
+        else:
+            self._stable = 0
+        self._previous_rate = rate
+        if self._stable >= self.patience:
+            return f"rolling win rate settled at {rate:.4f} ±{self.half_width}"
+        return None
+
+    def _check_window(self, window):
+        # a rate of 0.5 has the widest interval
+        low, high = wilson_interval(window // 2, window, self.confidence)
+        if (high - low) / 2 > self.half_width:
+            raise ValueError(
+                f"half_width {self.half_width} can't be reached over the rolling window of "
+                f"{window:,} games, it's at least {(high - low) / 2:.4f} there"
+            )
+
+
+class SPRT:
+    """
+    Sequential probability ratio test of "player 1 wins more than baseline by delta".
+
+    Wins are tested against losses and draws. Both answers stop the run: the
+    agent beats the baseline by delta, or it doesn't beat it. The test assumes
+    a fixed win rate, so it fits evaluation runs or the end of a training run
+    better than its start.
+    """
+
+    def __init__(self, baseline=0.5, delta=0.02, alpha=0.05, beta=0.05):
+        """
+        :param alpha: chance to wrongly conclude the agent beats the baseline.
+        :param beta: chance to miss an agent that does.
+        """
+        self.null_rate = baseline
+        self.alternative_rate = baseline + delta
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.log_likelihood_ratio = 0.0
+        self._wins = 0
+        self._games = 0
+
+    def check(self, metrics, player_1, player_2):
+        wins, games = player_1_results(metrics, player_1)
+        new_wins = wins - self._wins
+        new_other = games - self._games - new_wins
+        self._wins, self._games = wins, games
+        self.log_likelihood_ratio += new_wins * math.log(
+            self.alternative_rate / self.null_rate
+        )
+        self.log_likelihood_ratio += new_other * math.log(
+            (1 - self.alternative_rate) / (1 - self.null_rate)
+        )
+
+        if self.log_likelihood_ratio >= self.upper:
+            return f"win rate is above {self.alternative_rate:.4f} (SPRT)"
+        if self.log_likelihood_ratio <= self.lower:
+            return f"win rate is not above {self.alternative_rate:.4f} (SPRT)"
+        return None
+
+
+class QValuePlateau:
+    """
+    Stop once the Q-values of tabular agents barely change between heartbeats.
+
+    At every check a random sample of states is taken from each learning table and
+    compared with the same states at the next check. Agents without a table
+    are ignored. The sample is drawn in one pass over the states of the table,
+    with its own random generator, so checking doesn't change the games played.
+    """
+
+    def __init__(self, tolerance=1e-3, patience=3, sample_size=10 * 1000, seed=None):
+        """
+        :param tolerance: mean absolute change of a Q-value between heartbeats.
+        :param seed: seed of the generator picking the sampled states.
+        """
+        self.tolerance = tolerance
+        self.patience = patience
+        self.sample_size = sample_size
+        self._random = random.Random(seed)
+        self._samples = {}
+        self._flat = 0
+
+    def check(self, metrics, player_1, player_2):
+        changes = []
+        for index, player in enumerate((player_1, player_2)):
+            model = getattr(player.agent, "model", None)
+            if player.reward_func is None or not hasattr(model, "items"):
+                continue
+            sample = self._samples.get(index)
+            if sample:
+                for state, values in sample.items():
+                    current = model.get(state)
+                    if current is not None:
+                        changes.extend(abs(a - b) for a, b in zip(current, values))
+            self._samples[index] = self._take_sample(model)
+
+        if not changes:
+            return None
+        change = sum(changes) / len(changes)
+        self._flat = self._flat + 1 if change < self.tolerance else 0
+        if self._flat >= self.patience:
+            return f"mean Q-value change {change:.6f} stayed below {self.tolerance}"
+        return None
+
+    def _take_sample(self, model):
+        # reservoir sampling, the states of the table are never all in memory at once
+        states = []
+        for count, state in enumerate(model.keys()):
+            if count < self.sample_size:
+                states.append(state)
+                continue
+            index = self._random.randrange(count + 1)
+            if index < self.sample_size:
+                states[index] = state
+        return {state: list(model.get(state)) for state in states}
@@ -0,0 +1,269 @@
+"""
+Hyperparameter sweeps with successive halving.
+
+A sweep takes a base run config (see training.config) and the parameters to
+tune, addressed by dotted paths into the run config, i.e.
+"players.0.params.learning_rate". Grid search tries every combination of the
+listed values, random search draws trials from lists or low/high ranges.
+
+All trials train for min_episodes on a process pool, are evaluated against a
+fixed opponent and only the best 1/reduction_factor of them keep training,
+with reduction_factor times the episodes, until max_episodes. Every
+evaluation is appended to a JSONL results file.
+
+python -m training.sweep training/configs/sweep_simple_q.toml
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import math
+import pickle
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import game.player_actions_v2 as pa
+import training.agent_trainer as agent_trainer
+from training.config import build_player, read_config_file, validate_config
+from utils.play_game import PlayingAgent, GameRules
+
+
+def expand_trials(parameters, search="grid", trials=None, seed=None):
+    """
+    Parameter overrides of every trial.
+
+    :param parameters: dotted path -> list of values, or for random search a dict with low, high and optional log.
+    :param search: "grid" or "random".
+    :param trials: number of random trials.
+    :return: list of dicts of dotted path -> value
+    """
+    paths = sorted(parameters)
+    if search == "grid":
+        for path in paths:
+            if not isinstance(parameters[path], list):
+                raise ValueError(f"Grid search needs a list of values for {path}")
+        return [
+            dict(zip(paths, values))
+            for values in itertools.product(*(parameters[path] for path in paths))
+        ]
+    if search != "random":
+        raise ValueError(f"Unknown search {search}, expected grid or random")
+    if not trials:
+        raise ValueError("Random search needs the number of trials")
+
+    rng = np.random.default_rng(seed)
+    expanded = []
+    for _ in range(trials):
+        trial = {}
+        for path in paths:
+            space = parameters[path]
+            if isinstance(space, list):
+                trial[path] = space[rng.integers(len(space))]
+            elif space.get("log", False):
+                low, high = math.log(space["low"]), math.log(space["high"])
+                trial[path] = float(math.exp(rng.uniform(low, high)))
+            else:
+                trial[path] = float(rng.uniform(space["low"], space["high"]))
+        expanded.append(trial)
+    return expanded
+
+
+def apply_overrides(config, overrides):
+    """Copy of the run config with the dotted paths set, list items are addressed by index."""
+    config = copy.deepcopy(config)
+    for path, value in overrides.items():
+        keys = path.split(".")
+        target = config
+        for key in keys[:-1]:
+            if isinstance(target, list):
+                target = target[int(key)]
+            else:
+                target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return config
+
+
+def rung_budgets(min_episodes, max_episodes, reduction_factor=3):
+    """Episodes each surviving trial has trained for at every rung."""
+    budgets = [min_episodes]
+    while budgets[-1] < max_episodes:
+        budgets.append(min(budgets[-1] * reduction_factor, max_episodes))
+    return budgets
+
+
+def evaluate(
+    player: PlayingAgent,
+    opponent: PlayingAgent,
+    game_rules: GameRules,
+    games=1000,
+    concurrent_games=256,
+):
+    """
+    Win rate of player against opponent, without learning or exploring.
+    Neural agents pick their moves with a compiled copy of their network.
+
+    :param concurrent_games: games played side by side, see agent_trainer.play_episodes_batched.
+    """
+    agent = player.agent
+    exploration_rate = getattr(agent, "exploration_rate", None)
+    if exploration_rate is not None:
+        agent.exploration_rate = 0.0
+    compiled_inference = getattr(agent, "compiled_inference", None)
+    if compiled_inference is not None:
+        agent.compiled_inference = True
+    wins = 0
+    try:
+        for start in range(0, games, concurrent_games):
+            played = agent_trainer.play_episodes_batched(
+                PlayingAgent(agent),
+                PlayingAgent(opponent.agent),
+                game_rules,
+                min(concurrent_games, games - start),
+            )
+            wins += sum(pa.get_winner(game_engine) == 0 for game_engine, _ in played)
+    finally:
+        if exploration_rate is not None:
+            agent.exploration_rate = exploration_rate
+        if compiled_inference is not None:
+            agent.compiled_inference = compiled_inference
+    return wins / games
+
+
+def _train_and_evaluate(base, overrides, state, episodes, opponent, games, seed):
+    """
+    Continue a trial for episodes and evaluate player 1, runs on the pool.
+
+    :param state: pickled players of the previous rung, None to build them from the config.
+    :return: pickled players and the win rate
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    config = apply_overrides(base, overrides)
+    game_rules = GameRules(**config.get("game_rules", {}))
+    if state is None:
+        player_1, player_2 = (build_player(player) for player in config["players"])
+        # trials must not overwrite saved models
+        player_1.model_name = None
+        player_2.model_name = None
+    else:
+        player_1, player_2 = pickle.loads(state)
+
+    agent_trainer.train_agents(
+        player_1,
+        player_2,
+        game_rules,
+        episodes=episodes,
+        metrics_sinks=[],
+        **config.get("options", {}),
+    )
+    win_rate = evaluate(player_1, build_player(opponent), game_rules, games)
+    return pickle.dumps((player_1, player_2)), win_rate
+
+
+def run_sweep(sweep, workers=None):
+    """
+    Run a sweep config.
+
+    :param sweep: dict with base (a run config), parameters, search, trials, seed,
+        min_episodes, max_episodes, reduction_factor, opponent (player config, random by default),
+        evaluation_games and results (path of the JSONL file).
+    :param workers: size of the process pool, defaults to the number of cores.
+    :return: the record of the best trial at the last rung
+    """
+    base = sweep["base"]
+    validate_config(base)
+    if base.get("mode", "single") != "single":
+        raise ValueError("Sweeps train every trial in single mode")
+    seed = sweep.get("seed", 0)
+    trials = expand_trials(
+        sweep["parameters"], sweep.get("search", "grid"), sweep.get("trials"), seed
+    )
+    reduction_factor = sweep.get("reduction_factor", 3)
+    budgets = rung_budgets(
+        sweep["min_episodes"], sweep["max_episodes"], reduction_factor
+    )
+    opponent = sweep.get("opponent", {"agent": "random"})
+    games = sweep.get("evaluation_games", 1000)
+    trial_seeds = np.random.SeedSequence(seed).generate_state(len(trials)).tolist()
+    print(f"Sweep of {len(trials)} trials over rungs of {budgets} episodes")
+
+    states = {trial: None for trial in range(len(trials))}
+    alive = list(range(len(trials)))
+    trained = 0
+    best = None
+    results_path = sweep.get("results", "./models/sweep.jsonl")
+    with open(results_path, "a", encoding="utf-8") as results, ProcessPoolExecutor(
+        workers
+    ) as pool:
+        for rung, budget in enumerate(budgets):
+            futures = {
+                pool.submit(
+                    _train_and_evaluate,
+                    base,
+                    trials[trial],
+                    states[trial],
+                    budget - trained,
+                    opponent,
+                    games,
+                    (trial_seeds[trial] + rung) % 2**32,
+                ): trial
+                for trial in alive
+            }
+            win_rates = {}
+            for future in as_completed(futures):
+                trial = futures[future]
+                states[trial], win_rates[trial] = future.result()
+            trained = budget
+
+            ranked = sorted(alive, key=lambda trial: win_rates[trial], reverse=True)
+            last_rung = rung == len(budgets) - 1
+            keep = len(ranked) if last_rung else max(1, len(ranked) // reduction_factor)
+            promoted = ranked[:keep]
+            for trial in ranked:
+                record = {
+                    "time": time.time(),
+                    "trial": trial,
+                    "rung": rung,
+                    "episodes": budget,
+                    "params": trials[trial],
+                    "win rate": win_rates[trial],
+                    "promoted": trial in promoted and not last_rung,
+                }
+                results.write(json.dumps(record) + "\n")
+            results.flush()
+
+            best = {
+                "trial": ranked[0],
+                "rung": rung,
+                "episodes": budget,
+                "params": trials[ranked[0]],
+                "win rate": win_rates[ranked[0]],
+            }
+            print(
+                f"Rung {rung}, {budget:,} episodes: best trial {ranked[0]} {best['params']} "
+                f"win rate {best['win rate']:.4f}, {len(promoted)}/{len(ranked)} continue"
+            )
+
+            for trial in alive:
+                if trial not in promoted:
+                    del states[trial]
+            alive = promoted
+            if agent_trainer.interrupted:
+                print("Stop requested. Exiting sweep.")
+                break
+
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a hyperparameter sweep.")
+    parser.add_argument("sweep", help="sweep config, .json, .toml or .yaml")
+    parser.add_argument("--workers", type=int, help="size of the process pool")
+    args = parser.parse_args()
+    run_sweep(read_config_file(args.sweep), args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 import training.agent_trainer as agent_trainer
+import training.parallel_trainer as parallel_trainer
 import training.reward_models_v2 as rm
 from agents.random_agent_v2 import RandomAgent
 from agents.simple_q_learning_v2 import QLearningAgent
+from agents.q_tables import TieredQTable
 from agents.deep_q_learning import DeepQLearningAgent
 from agents.simple_q_win_reinforcment import SimpleQWinReinforcementAgent
 from utils.play_game import PlayingAgent, GameRules
 from agents.policy_gradient_agent import PolicyGradientAgent
+from training.stopping import WinRateConfidence
 
 
 # python -c 'from training import trainer_runner; trainer_runner.train_simple_vs_random()'
@@ -30,6 +33,28 @@ def train_simple_vs_random():
     )
 
 
+# python -c 'from training import trainer_runner; trainer_runner.train_simple_vs_random_hogwild()'
+def train_simple_vs_random_hogwild():
+    # same as train_simple_vs_random, but on every core
+    player_1 = PlayingAgent(
+        QLearningAgent(
+            nickname="Quickly Learns, quickly forgets, all at once",
+            learning_rate=0.2,
+            discount_factor=0.95,
+            exploration_rate=1.0,
+            exploration_decay=0.9999,
+            min_exploration_rate=0.1,
+        ),
+        rm.calculate_for_own_score_only,
+        "simple_q_by_score_vs_random_game_no_removal_hogwild",
+    )
+    player_2 = PlayingAgent(RandomAgent(), None)
+    game_rules = GameRules(max_dice_value=6, should_remove_opponents_dice=False)
+    parallel_trainer.train_agents_hogwild(
+        player_1, player_2, game_rules, episodes=100 * 1000 * 1000
+    )
+
+
 # python -c 'from training import trainer_runner; trainer_runner.train_simple_vs_random_multiply_only()'
 # Training completed. Doesn't get out from the bed for less than 10k Wins: 48,951,522, Wild Card Wins: 48,949,752, Draws: 2,098,726
 def train_simple_vs_random_multiply_only():
@@ -274,6 +299,32 @@ def train_simple_selective_memory_vs_random():
     )
 
 
+# python -c 'from training import trainer_runner; trainer_runner.train_simple_full_game_vs_random()'
+def train_simple_full_game_vs_random():
+    # with removal rules the state space doesn't fit in memory, so keep only hot states there
+    player_1 = PlayingAgent(
+        QLearningAgent(
+            nickname="Remembers only what matters",
+            learning_rate=0.2,
+            discount_factor=0.95,
+            exploration_rate=1.0,
+            exploration_decay=0.9999,
+            min_exploration_rate=0.1,
+            q_table=TieredQTable(
+                "./models/simple_q_full_game_vs_random.sqlite",
+                cache_size=5 * 1000 * 1000,
+            ),
+        ),
+        rm.calculate_for_multiples_and_removals_score,
+        "simple_q_full_game_vs_random",
+    )
+    player_2 = PlayingAgent(RandomAgent(), None)
+    game_rules = GameRules(should_remove_opponents_dice=True)
+    agent_trainer.train_agents(
+        player_1, player_2, game_rules, episodes=100 * 1000 * 1000
+    )
+
+
 # python -c 'from training import trainer_runner; trainer_runner.random_vs_random()'
 def random_vs_random():
     # this is a control group to see if the agents are learning anything
@@ -281,6 +332,11 @@ def random_vs_random():
     player_1 = PlayingAgent(RandomAgent(), None)
     player_2 = PlayingAgent(RandomAgent("Mad Contender"), None)
     game_rules = GameRules(max_dice_value=6, should_remove_opponents_dice=False)
+    # nothing learns, so stop as soon as the win rate is known to three digits
     agent_trainer.train_agents(
-        player_1, player_2, game_rules, episodes=100 * 1000 * 1000
+        player_1,
+        player_2,
+        game_rules,
+        episodes=100 * 1000 * 1000,
+        stopping_rules=[WinRateConfidence(half_width=0.0005, windowed=False)],
     )
@@ -0,0 +1,88 @@
+"""Bookkeeping of the moves agents learn from during a training game."""
+
+import numpy as np
+
+
+class TransitionRecorder:
+    """
+    Last observation and action of every player of a game.
+
+    A move only becomes a complete transition (state, action, reward, next
+    state, done) once the player sees its outcome, on their next turn or when
+    the game ends. Slots are indexed by player and reused for every move and
+    game. States and scores come fresh from convert_state and get_score, so
+    they're kept without copying.
+    """
+
+    def __init__(self, players=2):
+        self.states = [None] * players
+        self.scores = [None] * players
+        self.dice = [0] * players
+        self.actions = [None] * players
+        self.pending = [False] * players
+
+    def reset(self):
+        """Forget the moves of the previous game."""
+        for player in range(len(self.pending)):
+            self.pending[player] = False
+
+    def observe(self, player, state, scores, dice):
+        """Record what player sees before moving, after its previous move was learned from."""
+        self.states[player] = state
+        self.scores[player] = scores
+        self.dice[player] = dice
+        self.pending[player] = False
+
+    def act(self, player, action):
+        """Record the move, it's pending until the player observes the outcome."""
+        self.actions[player] = action
+        self.pending[player] = True
+
+
+class TransitionBuffer:
+    """
+    Complete transitions waiting for a learn_batch call.
+
+    take() hands them out as a dict of arrays, one row per transition:
+    prev_states, actions, rewards, next_states, game_overs and winners, where
+    a winner of None is stored as -2.
+    """
+
+    def __init__(self):
+        self._transitions = []
+
+    def append(self, prev_state, action, reward, next_state, game_over, winner=None):
+        self._transitions.append(
+            (
+                prev_state,
+                action,
+                reward,
+                next_state,
+                game_over,
+                -2 if winner is None else winner,
+            )
+        )
+
+    def __len__(self):
+        return len(self._transitions)
+
+    def extend(self, buffer):
+        """Move the transitions of another buffer to the end of this one."""
+        self._transitions.extend(buffer._transitions)
+        buffer._transitions = []
+
+    def take(self):
+        """Buffered transitions as arrays, the buffer is empty afterwards."""
+        prev_states, actions, rewards, next_states, game_overs, winners = zip(
+            *self._transitions
+        )
+        self._transitions = []
+        return {
+            # state ids of tabular agents, rows of features for neural ones
+            "prev_states": np.array(prev_states, dtype=np.int64),
+            "actions": np.array(actions, dtype=np.int8),
+            "rewards": np.array(rewards, dtype=np.float32),
+            "next_states": np.array(next_states, dtype=np.int64),
+            "game_overs": np.array(game_overs, dtype=bool),
+            "winners": np.array(winners, dtype=np.int8),
+        }